@@ -1,43 +1,49 @@
 import streamlit as st
 import pandas as pd
 import os
-# import time
+import time
 # from rbr_logic import run_analysis, analyze_security
 # from dbd_logic import analyze_security_dbd
-from patterns_logic import analyze_security_patterns, find_retests_rbr, find_retests_dbd
+from patterns_logic import find_retests_rbr, find_retests_dbd
+from scrip_index import load_scrip_index
+from chart_logic import get_renderer
+from batch_analysis import get_batch_analyzer
+from detector_core import DIRECTION_SPECS
+from zone_stats import get_stats_store
+from prewarm import get_prewarmer
 
 st.set_page_config(page_title="Supply & Demand Pattern Analyzer", layout="wide")
 
 st.title("📈 Stocks Patterns Analyzer")
 st.markdown(
     "Discover and analyze **technical patterns** for stocks. "
-    "Use the sidebar to configure thresholds and analyze a single stock."
+    "Use the sidebar to configure thresholds and analyze a single stock or a batch of stocks."
 )
 
 # --- Load CSV for symbol lookup ---
 csv_default = os.path.join(os.path.dirname(__file__), "api-scrip-master.csv")
 csv_path = csv_default
 
-scrips = None
-symbol_col = None
+# index, token and watchlist analyses are warmed once per process, in the background
+prewarm = get_prewarmer(csv_path)
+
+scrip_idx = None
 if os.path.exists(csv_path):
     try:
-        scrips = pd.read_csv(csv_path, dtype=str)
-        candidates = ["SM_SYMBOL_NAME", "SEM_SMST_SECURITY_NAME", "SM_SYMBOL", "SYMBOL", "symbol"]
-        for c in candidates:
-            if c in scrips.columns:
-                symbol_col = c
-                break
-        if symbol_col is None and "SEM_SMST_SECURITY_ID" in scrips.columns:
-            scrips["_symbol_label"] = scrips["SEM_SMST_SECURITY_ID"]
-            symbol_col = "_symbol_label"
+        # parsed once and cached on disk; rebuilt only when the CSV changes
+        scrip_idx = load_scrip_index(csv_path)
     except Exception:
-        scrips = None
+        scrip_idx = None
 
 # --- Sidebar Controls ---
 st.sidebar.title("Controls")
 st.sidebar.markdown("Search & analyze a single stock symbol.")
 st.sidebar.caption(f"Scrip master: {os.path.basename(csv_path)}")
+prewarm_status = prewarm.status()
+if prewarm_status["ready"]:
+    st.sidebar.caption(f"Warm start: ready ({prewarm_status['warmed']} watchlist analyses cached)")
+else:
+    st.sidebar.caption(f"Warming up: {prewarm_status['warmed']}/{prewarm_status['total']} watchlist analyses")
 
 # Pattern mode selection
 mode = st.sidebar.selectbox("Mode", ["RBR", "DBD", "RBD", "DBR"], index=0, help="Choose pattern type to analyze")
@@ -67,35 +73,49 @@ max_bases = st.sidebar.slider(
 analyze_single_clicked = False
 sidebar_sel_label = None
 sidebar_selected_id = None
+analyze_batch_clicked = False
+batch_labels = []
 
-if scrips is None:
+if scrip_idx is None:
     st.sidebar.info("Scrip master CSV not found.")
 else:
-    sb_filtered = scrips[
-        (scrips.get("SEM_EXM_EXCH_ID") == "NSE") &
-        (scrips.get("SEM_INSTRUMENT_NAME") == "EQUITY") &
-        (scrips.get("SEM_SEGMENT") == "E") &
-        (scrips.get("SEM_EXCH_INSTRUMENT_TYPE") == "ES")
-    ]
-    sb_labels = sb_filtered[symbol_col].astype(str).tolist()
-    sb_ids = sb_filtered["SEM_SMST_SECURITY_ID"].astype(str).tolist()
-    sb_mapping = dict(zip(sb_labels, sb_ids))
+    sb_rows = scrip_idx.subset(instrument_type="ES")
+    sb_mapping = scrip_idx.mapping(sb_rows)
 
     sb_search = st.sidebar.text_input("Search symbol", value="")
     if sb_search:
-        sb_filtered_labels = [l for l in sb_labels if sb_search.lower() in l.lower()]
+        sb_filtered_labels = scrip_idx.labels(scrip_idx.search(sb_search, instrument_type="ES"))
     else:
-        sb_filtered_labels = sb_labels
+        sb_filtered_labels = scrip_idx.labels(sb_rows)
 
     sidebar_sel_label = st.sidebar.selectbox("Select symbol", options=sb_filtered_labels)
     analyze_single_clicked = st.sidebar.button("Analyze Selected Symbol")
     sidebar_selected_id = sb_mapping.get(sidebar_sel_label)
 
+    # --- Batch selection ---
+    st.sidebar.markdown("### Batch")
+    batch_labels = st.sidebar.multiselect("Symbols to analyze", options=scrip_idx.labels(sb_rows))
+    analyze_batch_clicked = st.sidebar.button("Analyze Batch", disabled=not batch_labels)
+
+MODE_DIRECTIONS = {"RBR": "bullish", "DBD": "bearish", "RBD": "rbd", "DBR": "dbr"}
+
+if analyze_batch_clicked and batch_labels:
+    # runs on a background pool; the job survives reruns in session state
+    st.session_state["batch_job"] = get_batch_analyzer().submit(
+        {label: sb_mapping[label] for label in batch_labels if label in sb_mapping},
+        MODE_DIRECTIONS[mode], body_percent / 100.0, wick_percent / 100.0, max_bases,
+    )
+    st.session_state["batch_params"] = f"{mode} | Body ≥ {body_percent}% | Wick ≤ {wick_percent}% | Bases ≤ {max_bases}"
+
 st.markdown("---")
 col_left, col_center, col_right = st.columns([1, 3, 1])
 
 display_df = None
 display_title = None
+chart_df = None
+chart_pending = False
+CHART_POLL_SECONDS = 0.5
+single_key = (sidebar_selected_id, mode, body_percent, wick_percent, max_bases)
 
 with col_right:
     st.header("Single Analysis")
@@ -108,28 +128,46 @@ with col_right:
                     body_threshold = body_percent / 100.0
                     wick_threshold = wick_percent / 100.0
 
-                    if mode == "RBR":
-                        df, retests = analyze_security_patterns(sidebar_selected_id, "bullish", body_threshold, wick_threshold, max_bases)
-                    elif mode == "DBD":
-                        df, retests = analyze_security_patterns(sidebar_selected_id, "bearish", body_threshold, wick_threshold, max_bases)
-                    elif mode == "RBD":
-                        df, retests = analyze_security_patterns(sidebar_selected_id, "rbd", body_threshold, wick_threshold, max_bases)
-                    elif mode == "DBR":
-                        df, retests = analyze_security_patterns(sidebar_selected_id, "dbr", body_threshold, wick_threshold, max_bases)
-                    else:
-                        df, retests = None, pd.DataFrame()
+                    # served from the shared result store when prewarmed (or analyzed) recently
+                    df, retests = get_batch_analyzer().analyze(
+                        sidebar_selected_id, MODE_DIRECTIONS[mode], body_threshold, wick_threshold, max_bases)
                 except Exception as e:
                     st.error(f"Error fetching data for {sidebar_selected_id}: {e}")
                     df, retests = None, pd.DataFrame()
 
             if df is None or df.empty:
                 st.warning("No data available for selected security.")
+                st.session_state.pop("single_analysis", None)
             else:
                 st.success("✅ Analysis complete")
-                display_df = retests if retests is not None else pd.DataFrame()
-                display_title = f"📋 Detected zones for {sidebar_sel_label}"
+                st.session_state["single_analysis"] = {
+                    "key": single_key, "label": sidebar_sel_label, "df": df,
+                    "retests": retests if retests is not None else pd.DataFrame(),
+                }
                 st.caption(f"Using thresholds: Body ≥ {body_percent}% | Wick ≤ {wick_percent}%")
 
+    # the last single analysis stays on screen across reruns (e.g. while its chart renders)
+    single = st.session_state.get("single_analysis")
+    if single is not None and single["key"] == single_key:
+        display_df = single["retests"]
+        display_title = f"📋 Detected zones for {single['label']}"
+        chart_df = single["df"]
+
+    # stored statistics from earlier scans: one lookup, no history is reprocessed
+    if sidebar_selected_id:
+        edge = get_stats_store().get(sidebar_selected_id, DIRECTION_SPECS[MODE_DIRECTIONS[mode]],
+                                     body_percent / 100.0, wick_percent / 100.0, max_bases)
+        st.subheader("Historical edge")
+        if edge is None or not edge["zones"]:
+            st.caption("No statistics stored yet for this symbol and thresholds.")
+        else:
+            st.metric("Retest hit rate", f"{edge['hit_rate']:.0%}", help=f"{edge['retested']} of {edge['zones']} zones retested")
+            st.metric("Invalidation rate", f"{edge['invalidation_rate']:.0%}")
+            if edge["avg_retest_days"] is not None:
+                st.metric("Avg. time to retest", f"{edge['avg_retest_days']:.1f} days",
+                          help=f"{edge['avg_retest_bars']:.1f} bars")
+            st.caption(f"{edge['open']} zone(s) still open")
+
 with col_left:
     st.header("Result")
     if display_df is None:
@@ -138,3 +176,47 @@ with col_left:
         if display_title:
             st.subheader(display_title)
         st.dataframe(display_df)
+
+        if chart_df is not None:
+            # rendered on a background thread and cached per (symbol, mode, thresholds, last bar);
+            # never waited for here: a placeholder is shown and the next rerun picks up the PNG
+            renderer = get_renderer()
+            chart_png = renderer.cached(single_key, chart_df)
+            chart_error = renderer.error(single_key, chart_df)
+            if chart_png is not None:
+                st.image(chart_png, use_container_width=True)
+            elif chart_error is not None and not analyze_single_clicked:
+                # retried when the symbol is analyzed again, not on every poll
+                st.warning(f"Chart unavailable: {chart_error}")
+            else:
+                renderer.submit(single_key, chart_df, display_df, title=f"{single['label']} ({mode})")
+                st.info("Rendering chart...")
+                chart_pending = True
+
+with col_center:
+    st.header("Batch Analysis")
+    batch_job = st.session_state.get("batch_job")
+    if batch_job is None:
+        st.info("Select symbols under Batch in the sidebar and click Analyze Batch.")
+    else:
+        st.caption(st.session_state.get("batch_params", ""))
+        if batch_job.cached:
+            st.caption(f"{batch_job.cached} symbol(s) served from recent results.")
+        batch_progress = st.progress(0.0)
+        batch_status_slot = st.empty()
+        batch_table_slot = st.empty()
+        # redraw after every finished symbol; widget changes rerun the script
+        # while the pool keeps working, and the next run resumes from here
+        while True:
+            n_done = batch_job.completed()
+            batch_progress.progress(n_done / max(len(batch_job), 1), text=f"{n_done}/{len(batch_job)} symbols analyzed")
+            batch_status_slot.dataframe(batch_job.status_frame(), use_container_width=True)
+            batch_table_slot.dataframe(batch_job.results_frame(), use_container_width=True)
+            if batch_job.done():
+                break
+            batch_job.wait(timeout=1.0)
+
+# the page is complete; come back for the chart once it had time to render
+if chart_pending:
+    time.sleep(CHART_POLL_SECONDS)
+    st.rerun()
@@ -0,0 +1,233 @@
+"""Concurrent multi-symbol analysis for app.py's batch mode.
+
+`analyze_security_patterns` is one fetch + detection per symbol. Run serially
+for a 50-symbol watchlist, the user waits for every round trip before seeing
+anything. BatchAnalyzer submits each symbol to a small background thread pool.
+Fetches are already paced by the shared adaptive rate limiter in rbr_logic. The
+returned BatchJob collects results as they complete, so the UI can redraw its
+table after each symbol.
+
+Finished results are kept per (security, direction, thresholds) for
+`ttl` seconds. A symbol analyzed recently is served from this store without a
+fetch: its future is already complete when the job is created. Expired
+entries are dropped on the next submit / analyze, so the store holds at
+most the last `ttl` seconds of results plus the in-flight ones. The pool and
+the store are process-wide, so a job started in one Streamlit rerun keeps
+running (and can be picked up again) after the next rerun.
+
+`analyze` (the app's single-symbol view) does not queue behind batch and
+prewarm work. It reuses a stored result, or a batch run that is already
+executing; otherwise it runs on a small interactive pool of its own. A batch
+run of the same symbol that starts later picks up the interactive result
+instead of fetching again.
+
+Example:
+    >>> from batch_analysis import get_batch_analyzer
+    >>> job = get_batch_analyzer().submit({"TCS": "11536", "INFY": "1594"}, "bullish")
+    >>> while not job.done():
+    ...     job.wait(timeout=0.5)
+    >>> job.results_frame()
+"""
+
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from patterns_logic import analyze_security_patterns
+
+MAX_WORKERS = 4
+INTERACTIVE_WORKERS = 2
+RESULT_TTL_SECONDS = 15 * 60
+
+
+class BatchJob:
+    """Futures for one batch request, in the order the symbols were given."""
+
+    def __init__(self, labels: List[str], security_ids: List[str], futures: List[Future], cached: int):
+        self.labels = labels
+        self.security_ids = security_ids
+        self.futures = futures
+        self.cached = cached
+        self.started = time.time()
+
+    def __len__(self) -> int:
+        return len(self.futures)
+
+    def completed(self) -> int:
+        return sum(1 for f in self.futures if f.done())
+
+    def done(self) -> bool:
+        return all(f.done() for f in self.futures)
+
+    def wait(self, timeout: Optional[float] = None) -> int:
+        """Block until at least one more symbol finishes (or timeout); returns completed count."""
+        pending = [f for f in self.futures if not f.done()]
+        if pending:
+            wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        return self.completed()
+
+    def cancel(self) -> None:
+        for f in self.futures:
+            f.cancel()
+
+    def _finished(self):
+        for label, sid, fut in zip(self.labels, self.security_ids, self.futures):
+            if fut.done() and not fut.cancelled():
+                yield label, sid, fut.result()
+
+    def status_frame(self) -> pd.DataFrame:
+        """One row per symbol: status, zone count and open (not invalidated) zones."""
+        rows = []
+        for label, sid, fut in zip(self.labels, self.security_ids, self.futures):
+            row = {"symbol": label, "security_id": sid, "status": "pending", "zones": None, "open_zones": None}
+            if fut.cancelled():
+                row["status"] = "cancelled"
+            elif fut.done():
+                df, retests = fut.result()
+                if df is None or df.empty:
+                    row["status"] = "no data"
+                else:
+                    row["status"] = "done"
+                    row["zones"] = len(retests)
+                    if "invalidated" in retests.columns:
+                        row["open_zones"] = int((~retests["invalidated"].astype(bool)).sum())
+            rows.append(row)
+        return pd.DataFrame(rows).astype({"zones": "Int64", "open_zones": "Int64"})
+
+    def results_frame(self) -> pd.DataFrame:
+        """Detected zones of all finished symbols, with symbol / security_id columns first."""
+        frames = []
+        for label, sid, (df, retests) in self._finished():
+            if retests is None or retests.empty:
+                continue
+            frames.append(retests.assign(symbol=label, security_id=sid)[
+                ["symbol", "security_id"] + [c for c in retests.columns if c not in ("symbol", "security_id")]
+            ])
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+
+class BatchAnalyzer:
+    """Background pool plus short-lived store of per-symbol results."""
+
+    def __init__(self, max_workers: int = MAX_WORKERS, ttl: float = RESULT_TTL_SECONDS,
+                 interactive_workers: int = INTERACTIVE_WORKERS):
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="batch")
+        self._interactive_executor = ThreadPoolExecutor(max_workers=interactive_workers,
+                                                        thread_name_prefix="interactive")
+        self._results: Dict[tuple, Tuple[float, Future]] = {}
+        self._interactive: Dict[tuple, Tuple[float, Future]] = {}
+        self._lock = threading.Lock()
+
+    def _prune(self, now: float) -> None:
+        """Drop finished results older than ttl (caller holds the lock)."""
+        for store in (self._results, self._interactive):
+            expired = [k for k, (stamp, fut) in store.items() if fut.done() and now - stamp >= self.ttl]
+            for k in expired:
+                del store[k]
+
+    def _usable(self, hit: Optional[Tuple[float, Future]], now: float) -> bool:
+        """True for an in-flight future or a fresh, successful result."""
+        if hit is None:
+            return False
+        stamp, fut = hit
+        if not fut.done():
+            return True
+        # failed fetches come back as (None, empty) and are retried
+        return (not fut.cancelled() and fut.exception() is None
+                and now - stamp < self.ttl and fut.result()[0] is not None)
+
+    def _run_batch(self, key: tuple) -> Tuple[Optional[pd.DataFrame], pd.DataFrame]:
+        """Batch task: reuse an interactive run of the same key started meanwhile, else analyze."""
+        with self._lock:
+            hit = self._interactive.get(key)
+        if self._usable(hit, time.time()):
+            try:
+                return hit[1].result()
+            except Exception:
+                pass
+        return analyze_security_patterns(*key)
+
+    def _future_for(self, key: tuple, now: float) -> Tuple[Future, bool]:
+        """Reusable (fresh or in-flight) future for key, else a new one; second item is True when reused."""
+        with self._lock:
+            hit = self._results.get(key)
+            if self._usable(hit, now):
+                return hit[1], True
+            hit = self._interactive.get(key)
+            if self._usable(hit, now) and hit[1].done():
+                return hit[1], True
+            fut = self._executor.submit(self._run_batch, key)
+            self._results[key] = (now, fut)
+            return fut, False
+
+    def analyze(
+        self,
+        security_id: str,
+        direction: str,
+        body_threshold: float = 0.65,
+        wick_threshold: float = 0.35,
+        max_bases: int = 4,
+        timeout: Optional[float] = None,
+    ) -> Tuple[Optional[pd.DataFrame], pd.DataFrame]:
+        """(df, retests) for one symbol: a stored or running result (e.g. prewarmed), else an interactive run.
+
+        A batch run of the symbol that is still queued is not waited for.
+        """
+        key = (str(security_id), direction, float(body_threshold), float(wick_threshold), int(max_bases))
+        now = time.time()
+        with self._lock:
+            self._prune(now)
+            hit = self._results.get(key)
+            if not (self._usable(hit, now) and (hit[1].done() or hit[1].running())):
+                hit = self._interactive.get(key)
+                if not self._usable(hit, now):
+                    hit = (now, self._interactive_executor.submit(analyze_security_patterns, *key))
+                    self._interactive[key] = hit
+        return hit[1].result(timeout=timeout)
+
+    def submit(
+        self,
+        symbols: Dict[str, str],
+        direction: str,
+        body_threshold: float = 0.65,
+        wick_threshold: float = 0.35,
+        max_bases: int = 4,
+    ) -> BatchJob:
+        """Start (or reuse) the analysis of every label -> security_id in `symbols`."""
+        labels, ids, futures = [], [], []
+        cached = 0
+        now = time.time()
+        with self._lock:
+            self._prune(now)
+        for label, sid in symbols.items():
+            key = (str(sid), direction, float(body_threshold), float(wick_threshold), int(max_bases))
+            fut, reused = self._future_for(key, now)
+            cached += reused and fut.done()
+            labels.append(label)
+            ids.append(str(sid))
+            futures.append(fut)
+        return BatchJob(labels, ids, futures, cached)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._results = {k: v for k, v in self._results.items() if not v[1].done()}
+            self._interactive = {k: v for k, v in self._interactive.items() if not v[1].done()}
+
+
+_analyzer: Optional[BatchAnalyzer] = None
+_analyzer_lock = threading.Lock()
+
+
+def get_batch_analyzer() -> BatchAnalyzer:
+    """Process-wide analyzer (shared across Streamlit reruns and sessions)."""
+    global _analyzer
+    with _analyzer_lock:
+        if _analyzer is None:
+            _analyzer = BatchAnalyzer()
+        return _analyzer
@@ -0,0 +1,98 @@
+"""Benchmark the detector backends on synthetic candles.
+
+Compares the pure-Python kernel (default) with the Numba-compiled kernel from
+detector_jit, and checks that both return identical zones and retests.
+--allocations also reports the tracemalloc peak of one full run.
+
+    python bench_detectors.py --sizes 1000 10000 100000 --repeat 5 --allocations
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import detector_jit
+from detector_core import SPECS, detect_retests, detect_zones
+
+
+def synthetic_candles(n: int, seed: int = 0) -> pd.DataFrame:
+    """Random-walk daily candles with a mix of strong and small-body candles."""
+    rng = np.random.default_rng(seed)
+    close = np.abs(100 + np.cumsum(rng.normal(0, 1.5, n))) + 5
+    open_ = close + rng.normal(0, 1.2, n)
+    wide = rng.integers(0, 4, n) == 0
+    pad_hi = np.where(wide, rng.uniform(0.5, 2, n), rng.uniform(0, 0.2, n))
+    pad_lo = np.where(wide, rng.uniform(0.5, 2, n), rng.uniform(0, 0.2, n))
+    df = pd.DataFrame({
+        "open": open_.round(2),
+        "high": (np.maximum(open_, close) + pad_hi).round(2),
+        "low": (np.minimum(open_, close) - pad_lo).round(2),
+        "close": close.round(2),
+        "timestamp": 1609459200 + np.arange(n, dtype=np.int64) * 86400,
+    })
+    df["high"] = df[["open", "high", "close"]].max(axis=1)
+    df["low"] = df[["open", "low", "close"]].min(axis=1)
+    df["date"] = pd.to_datetime(df["timestamp"], unit="s", utc=True).dt.tz_convert("Asia/Kolkata")
+    return df
+
+
+def run_once(df: pd.DataFrame, backend: str) -> list:
+    out = []
+    for name in ("RBR", "DBD", "RBD", "DBR", "RBR_LEGACY", "DBD_LEGACY"):
+        spec = SPECS[name]
+        zones = detect_zones(df, spec, backend=backend)
+        out.append(detect_retests(df, zones, spec, backend=backend) if not zones.empty else zones)
+    return out
+
+
+def best_time(df: pd.DataFrame, backend: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run_once(df, backend)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def peak_allocation(df: pd.DataFrame, backend: str) -> float:
+    """Peak memory traced by tracemalloc during one run_once, in KiB."""
+    run_once(df, backend)  # warm caches and lazy imports outside the trace
+    tracemalloc.start()
+    try:
+        run_once(df, backend)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--allocations", action="store_true", help="report tracemalloc peak per size")
+    args = parser.parse_args()
+
+    backends = ["python"] + (["numba"] if detector_jit.AVAILABLE else [])
+    if not detector_jit.AVAILABLE:
+        print("Numba not installed; benchmarking the Python backend only.")
+    else:
+        run_once(synthetic_candles(100), "numba")  # compile (or load the cache) outside the timings
+
+    print(f"{'candles':>10} " + " ".join(f"{b:>12}" for b in backends) + "   (best of %d, 6 specs)" % args.repeat)
+    for n in args.sizes:
+        df = synthetic_candles(n)
+        if len(backends) > 1:
+            for a, b in zip(run_once(df, "python"), run_once(df, "numba")):
+                pd.testing.assert_frame_equal(a, b)
+        times = [best_time(df, b, args.repeat) for b in backends]
+        print(f"{n:>10} " + " ".join(f"{t * 1000:>10.1f}ms" for t in times))
+        if args.allocations:
+            print(f"{'':>10} peak {peak_allocation(df, backends[-1]):,.0f} KiB traced ({backends[-1]})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""Append-only local store of daily candles, one directory per security.
+
+Every scan used to re-download each security's full history from FROM_DATE.
+The store keeps what was already fetched as raw little-endian column files:
+
+    .cache/candles/<security_id>/timestamp.i64   open.f64  high.f64  low.f64  close.f64
+    .cache/candles/<security_id>/meta.json       {"rows": ..., "last_timestamp": ..., ...}
+
+`meta.json` is written last (atomically), and its row count is the
+authority. A crash between appending the columns and updating meta leaves
+some extra bytes, which readers ignore and the next append truncates.
+Columns are read through np.memmap, so loading a long history does not copy
+it.
+
+`sync` asks the API only for bars from the last stored date onwards. It
+compares the overlapping bar and appends the rest. When the overlap
+disagrees (e.g. a corporate action revised history), it re-fetches and
+rewrites the security.
+
+Example:
+    >>> from candle_store import get_candle_store
+    >>> store = get_candle_store()
+    >>> new_bars = store.sync("21238")
+    >>> df = store.load("21238")
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import date
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "candles")
+TIMEZONE = "Asia/Kolkata"
+COLUMNS = {
+    "timestamp": np.dtype("<i8"),
+    "open": np.dtype("<f8"),
+    "high": np.dtype("<f8"),
+    "low": np.dtype("<f8"),
+    "close": np.dtype("<f8"),
+}
+SUFFIX = {"timestamp": "i64", "open": "f64", "high": "f64", "low": "f64", "close": "f64"}
+# derived column sets (adjusted series, features) are built this many rows at a time
+BUILD_CHUNK_ROWS = 100_000
+
+
+def _suffix(col: str, dtype: np.dtype) -> str:
+    return SUFFIX.get(col) or f"{dtype.kind}{dtype.itemsize * 8}"
+
+
+def candles_frame(arrays: Dict[str, np.ndarray]) -> pd.DataFrame:
+    """Column arrays -> DataFrame in fetch_for's layout (no copy of the prices)."""
+    if len(arrays["timestamp"]) == 0:
+        return pd.DataFrame()
+    df = pd.DataFrame({
+        "open": arrays["open"],
+        "high": arrays["high"],
+        "low": arrays["low"],
+        "close": arrays["close"],
+        "timestamp": arrays["timestamp"],
+    }, copy=False)
+    df["date"] = pd.to_datetime(df["timestamp"], unit="s", utc=True).dt.tz_convert(TIMEZONE)
+    return df
+
+
+def _write_json(path: str, data: dict) -> None:
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _empty_meta() -> dict:
+    return {"rows": 0, "first_timestamp": None, "last_timestamp": None, "updated": None}
+
+
+class CandleStore:
+    """Raw column files + meta.json per security (see module docstring).
+
+    columns: {name: dtype} of the column files. It must include an int64
+    "timestamp", which orders appends. feature_store uses the same layout for
+    derived per-candle columns.
+    """
+
+    def __init__(self, root: str = STORE_DIR, columns: Optional[Dict[str, np.dtype]] = None):
+        self.root = root
+        self.columns = {k: np.dtype(v) for k, v in (columns or COLUMNS).items()}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def _lock(self, security_id: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(security_id, threading.Lock())
+
+    def _dir(self, security_id: str) -> str:
+        return os.path.join(self.root, str(security_id))
+
+    def _path(self, security_id: str, col: str) -> str:
+        return os.path.join(self._dir(security_id), f"{col}.{_suffix(col, self.columns[col])}")
+
+    # ----- metadata -----
+    def meta(self, security_id: str) -> dict:
+        try:
+            with open(os.path.join(self._dir(security_id), "meta.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return _empty_meta()
+
+    def _write_meta(self, security_id: str, meta: dict) -> None:
+        _write_json(os.path.join(self._dir(security_id), "meta.json"), meta)
+
+    def read_sidecar(self, security_id: str, name: str) -> dict:
+        """JSON file `name` in the security's directory ({} when missing or unreadable)."""
+        try:
+            with open(os.path.join(self._dir(security_id), name)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def write_sidecar(self, security_id: str, name: str, data: dict) -> None:
+        """Atomically replace JSON file `name` in the security's directory (e.g. a derived cache's source digest)."""
+        _write_json(os.path.join(self._dir(security_id), name), data)
+
+    def rows(self, security_id: str) -> int:
+        return int(self.meta(security_id)["rows"])
+
+    def last_timestamp(self, security_id: str) -> Optional[int]:
+        return self.meta(security_id)["last_timestamp"]
+
+    def securities(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(d for d in os.listdir(self.root) if os.path.exists(os.path.join(self.root, d, "meta.json")))
+
+    # ----- reading -----
+    def arrays(self, security_id: str, start: int = 0, stop: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Read-only memmapped columns for rows [start, stop)."""
+        n = self.rows(security_id)
+        stop = n if stop is None else min(stop, n)
+        start = max(0, min(start, stop))
+        out = {}
+        for col, dtype in self.columns.items():
+            if stop == 0:
+                out[col] = np.empty(0, dtype=dtype)
+                continue
+            mm = np.memmap(self._path(security_id, col), dtype=dtype, mode="r", shape=(n,))
+            out[col] = np.asarray(mm[start:stop])  # plain ndarray view, no copy
+        return out
+
+    def load(self, security_id: str, start: int = 0, stop: Optional[int] = None) -> pd.DataFrame:
+        """Candles in fetch_for's layout: open, high, low, close, timestamp, date."""
+        return candles_frame(self.arrays(security_id, start, stop))
+
+    # ----- writing -----
+    def append(self, security_id: str, df: pd.DataFrame) -> int:
+        """Append bars newer than the stored last bar; returns how many were added."""
+        if df is None or df.empty:
+            return 0
+        security_id = str(security_id)
+        with self._lock(security_id):
+            meta = self.meta(security_id)
+            ts = df["timestamp"].to_numpy(dtype=np.int64)
+            if meta["last_timestamp"] is not None:
+                keep = ts > meta["last_timestamp"]
+                df, ts = df[keep], ts[keep]
+            if len(ts) == 0:
+                return 0
+            os.makedirs(self._dir(security_id), exist_ok=True)
+            for col, dtype in self.columns.items():
+                values = ts if col == "timestamp" else df[col].to_numpy(dtype=dtype)
+                with open(self._path(security_id, col), "ab") as f:
+                    f.truncate(meta["rows"] * dtype.itemsize)  # drop bytes of an interrupted append
+                    f.write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+            meta.update({
+                "rows": meta["rows"] + len(ts),
+                "first_timestamp": meta["first_timestamp"] if meta["first_timestamp"] is not None else int(ts[0]),
+                "last_timestamp": int(ts[-1]),
+                "updated": time.time(),
+            })
+            self._write_meta(security_id, meta)
+            return len(ts)
+
+    def replace(self, security_id: str, df: pd.DataFrame) -> int:
+        """Rewrite the security's candles with `df`; returns the row count."""
+        security_id = str(security_id)
+        with self._lock(security_id):
+            meta = self.meta(security_id)
+            if meta["rows"]:
+                generation = meta.get("generation", 0) + 1
+                meta = _empty_meta()
+                meta["generation"] = generation  # lets derived caches notice the rewrite
+                self._write_meta(security_id, meta)
+        return self.append(security_id, df)
+
+    # ----- fetching -----
+    def sync(self, security_id: str, fetch: Optional[Callable[..., pd.DataFrame]] = None,
+             to_date: Optional[str] = None) -> int:
+        """Fetch bars after the stored ones and append them.
+
+        Returns the number of bars added; after a history rewrite every bar
+        counts as new.
+
+        fetch: fetch_for-compatible callable (security_id, from_date=, to_date=)
+        """
+        if fetch is None:
+            from rbr_logic import fetch_for as fetch
+        security_id = str(security_id)
+        to_date = to_date or date.today().isoformat()
+        meta = self.meta(security_id)
+        if not meta["rows"]:
+            return self.append(security_id, fetch(security_id, to_date=to_date))
+
+        last_ts = int(meta["last_timestamp"])
+        from_date = pd.Timestamp(last_ts, unit="s", tz="UTC").tz_convert(TIMEZONE).date().isoformat()
+        fresh = fetch(security_id, from_date=from_date, to_date=to_date)
+        if fresh is None or fresh.empty:
+            return 0
+        overlap = fresh[fresh["timestamp"] == last_ts]
+        if not overlap.empty:
+            stored = self.arrays(security_id, meta["rows"] - 1)
+            same = all(float(overlap[c].iloc[0]) == float(stored[c][0]) for c in ("open", "high", "low", "close"))
+            if not same:
+                print(f"History changed for {security_id}; refetching all candles.")
+                return self.replace(security_id, fetch(security_id, to_date=to_date))
+        return self.append(security_id, fresh)
+
+
+_default_store: Optional[CandleStore] = None
+_default_store_lock = threading.Lock()
+
+
+def get_candle_store() -> CandleStore:
+    """Process-wide store under .cache/candles/."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = CandleStore()
+        return _default_store
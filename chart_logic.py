@@ -0,0 +1,191 @@
+"""Candlestick charts with zone / retest overlays for app.py.
+
+Five years of daily candles is more bars than a chart is pixels wide, and
+plotting them with mplfinance on every Streamlit rerun is slow. This module:
+
+  - downsamples OHLC to the screen width by merging consecutive candles into
+    buckets (first open, max high, min low, last close), so every wick
+    extreme of the raw series is still visible
+  - draws zones from find_pattern / find_retests_* as rectangles from the
+    continuation candle to the right edge, and retests as markers
+  - renders PNG bytes on a single background thread (matplotlib's pyplot
+    state is not thread-safe) and caches them by
+    (security, mode, thresholds, last bar, width)
+
+Example:
+    >>> from chart_logic import get_renderer
+    >>> fut = get_renderer().submit(("21238", "RBR", 0.65, 0.35, 4), df, retests)
+    >>> png = fut.result()
+    >>> get_renderer().cached(("21238", "RBR", 0.65, 0.35, 4), df)  # bytes once rendered, else None
+"""
+
+import io
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt  # noqa: E402
+import mplfinance as mpf  # noqa: E402
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+from matplotlib.patches import Rectangle  # noqa: E402
+
+DEFAULT_WIDTH_PX = 1200
+PX_PER_CANDLE = 3
+MAX_CACHED_CHARTS = 64
+
+
+def downsample_ohlc(df: pd.DataFrame, max_bars: int) -> Tuple[pd.DataFrame, int]:
+    """Merge consecutive candles so at most `max_bars` remain.
+
+    Returns (bars, step): bars has columns open/high/low/close/date, where each
+    bucket keeps the first open, highest high, lowest low, last close and the
+    first date; candle k of the input lands in bucket k // step.
+    """
+    n = len(df)
+    step = max(1, -(-n // max(1, max_bars)))
+    if step == 1:
+        return df[["open", "high", "low", "close", "date"]].reset_index(drop=True), 1
+    starts = np.arange(0, n, step)
+    ends = np.minimum(starts + step, n) - 1
+    bars = pd.DataFrame({
+        "open": df["open"].to_numpy()[starts],
+        "high": np.maximum.reduceat(df["high"].to_numpy(dtype=np.float64), starts),
+        "low": np.minimum.reduceat(df["low"].to_numpy(dtype=np.float64), starts),
+        "close": df["close"].to_numpy()[ends],
+        "date": df["date"].iloc[starts].to_numpy(),
+    })
+    return bars, step
+
+
+def _zone_columns(zones: pd.DataFrame) -> Tuple[str, str, str]:
+    if "zone_low" in zones.columns:
+        return "zone_low", "zone_high", "continuation_idx"
+    idx_col = "rally2_idx" if "rally2_idx" in zones.columns else "drop2_idx"
+    return "demand_zone_low", "demand_zone_high", idx_col
+
+
+def render_chart(
+    df: pd.DataFrame,
+    zones: Optional[pd.DataFrame] = None,
+    title: str = "",
+    width_px: int = DEFAULT_WIDTH_PX,
+    height_px: int = 600,
+    dpi: int = 100,
+) -> bytes:
+    """Render candles plus zone/retest overlays to PNG bytes."""
+    bars, step = downsample_ohlc(df, width_px // PX_PER_CANDLE)
+    plot_df = bars.rename(columns={"open": "Open", "high": "High", "low": "Low", "close": "Close"})
+    plot_df.index = pd.DatetimeIndex(plot_df.pop("date"))
+
+    fig, axes = mpf.plot(
+        plot_df,
+        type="candle",
+        style="yahoo",
+        returnfig=True,
+        figsize=(width_px / dpi, height_px / dpi),
+        title=title,
+        warn_too_much_data=len(plot_df) + 1,
+    )
+    ax = axes[0]
+    n_bars = len(plot_df)
+
+    if zones is not None and not zones.empty:
+        low_col, high_col, idx_col = _zone_columns(zones)
+        signal_col = next((c for c in ("buy_signal", "sell_signal") if c in zones.columns), None)
+        supply = signal_col == "sell_signal" or zones.get("pattern_type", pd.Series(dtype=str)).isin(["DBD", "RBD"]).any()
+        color = "tab:red" if supply else "tab:green"
+        dates = df["date"]
+        for z in zones.itertuples(index=False):
+            z = z._asdict()
+            x0 = int(z[idx_col]) // step if idx_col in z else 0
+            low, high = float(z[low_col]), float(z[high_col])
+            invalid = bool(z.get("invalidated", False))
+            ax.add_patch(Rectangle(
+                (x0 - 0.5, low), n_bars - x0, max(high - low, 1e-9),
+                facecolor="grey" if invalid else color, alpha=0.12 if invalid else 0.25,
+                edgecolor="none", zorder=0,
+            ))
+            retest_date = z.get("retest_date")
+            if signal_col and z.get(signal_col) and retest_date is not None and not pd.isna(retest_date):
+                k = int(dates.searchsorted(retest_date))
+                price = z.get(signal_col.replace("_signal", "_price"))
+                ax.scatter([k // step], [price], marker="^" if signal_col == "buy_signal" else "v",
+                           color=color, edgecolors="black", s=40, zorder=3)
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", dpi=dpi, bbox_inches="tight")
+    plt.close(fig)
+    return buf.getvalue()
+
+
+class ChartRenderer:
+    """Renders charts on one background thread and caches the PNG bytes.
+
+    Keys are caller-defined tuples; the last candle timestamp and the width
+    are appended so a new bar or a different screen size re-renders.
+    """
+
+    def __init__(self, max_cached: int = MAX_CACHED_CHARTS):
+        self.max_cached = max_cached
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chart")
+        self._futures: "OrderedDict[tuple, Future]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _full_key(self, key: tuple, df: pd.DataFrame, width_px: int) -> tuple:
+        last = int(df["timestamp"].iloc[-1]) if "timestamp" in df.columns and len(df) else len(df)
+        return tuple(key) + (last, len(df), width_px)
+
+    def submit(self, key: tuple, df: pd.DataFrame, zones: Optional[pd.DataFrame] = None,
+               title: str = "", width_px: int = DEFAULT_WIDTH_PX) -> Future:
+        """Future for the PNG of this chart; cached or in-flight work is reused."""
+        full_key = self._full_key(key, df, width_px)
+        with self._lock:
+            fut = self._futures.get(full_key)
+            if fut is not None and not (fut.done() and fut.exception() is not None):
+                self._futures.move_to_end(full_key)
+                return fut
+            fut = self._executor.submit(render_chart, df, zones, title, width_px)
+            self._futures[full_key] = fut
+            while len(self._futures) > self.max_cached:
+                self._futures.popitem(last=False)
+            return fut
+
+    def cached(self, key: tuple, df: pd.DataFrame, width_px: int = DEFAULT_WIDTH_PX) -> Optional[bytes]:
+        """PNG bytes if this chart is already rendered, else None."""
+        with self._lock:
+            fut = self._futures.get(self._full_key(key, df, width_px))
+        if fut is not None and fut.done() and fut.exception() is None:
+            return fut.result()
+        return None
+
+    def error(self, key: tuple, df: pd.DataFrame, width_px: int = DEFAULT_WIDTH_PX) -> Optional[BaseException]:
+        """The exception of a finished, failed render of this chart, else None (submit retries it)."""
+        with self._lock:
+            fut = self._futures.get(self._full_key(key, df, width_px))
+        if fut is not None and fut.done() and not fut.cancelled():
+            return fut.exception()
+        return None
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            done = sum(1 for f in self._futures.values() if f.done())
+            return {"charts": len(self._futures), "rendered": done, "pending": len(self._futures) - done}
+
+
+_renderer: Optional[ChartRenderer] = None
+_renderer_lock = threading.Lock()
+
+
+def get_renderer() -> ChartRenderer:
+    """Process-wide renderer (shared across Streamlit reruns and sessions)."""
+    global _renderer
+    with _renderer_lock:
+        if _renderer is None:
+            _renderer = ChartRenderer()
+        return _renderer
@@ -1,17 +1,22 @@
 import os
 from dotenv import load_dotenv
 from pathlib import Path
-import streamlit as st
 
 # Load environment variables from .env file if it exists
 env_path = Path(__file__).parent / '.env'
 load_dotenv(dotenv_path=env_path)
 
-# Credentials (prefer environment variables)
-# INITIAL_ACCESS_TOKEN = os.getenv("DHAN_ACCESS_TOKEN")
-# DHAN_CLIENT_ID = os.getenv("DHAN_CLIENT_ID")
-INITIAL_ACCESS_TOKEN = st.secrets["DHAN_ACCESS_TOKEN"]
-DHAN_CLIENT_ID = st.secrets["DHAN_CLIENT_ID"]
+# Credentials (prefer environment variables; fall back to Streamlit secrets,
+# so headless tools such as detection_service.py do not need Streamlit)
+INITIAL_ACCESS_TOKEN = os.getenv("DHAN_ACCESS_TOKEN")
+DHAN_CLIENT_ID = os.getenv("DHAN_CLIENT_ID")
+if not INITIAL_ACCESS_TOKEN or not DHAN_CLIENT_ID:
+    try:
+        import streamlit as st
+        INITIAL_ACCESS_TOKEN = INITIAL_ACCESS_TOKEN or st.secrets["DHAN_ACCESS_TOKEN"]
+        DHAN_CLIENT_ID = DHAN_CLIENT_ID or st.secrets["DHAN_CLIENT_ID"]
+    except Exception:  # Streamlit missing, no secrets.toml, or key not set
+        pass
 
 if not INITIAL_ACCESS_TOKEN or not DHAN_CLIENT_ID:
     raise ValueError(
@@ -19,12 +24,9 @@ if not INITIAL_ACCESS_TOKEN or not DHAN_CLIENT_ID:
         "either in your .env file or as environment variables."
     )
 
-# API URLs
-# API_URL = os.getenv("DHAN_API_URL", "https://api.dhan.co/v2/charts/historical")
-# TOKEN_RENEWAL_URL = os.getenv("DHAN_TOKEN_RENEWAL_URL", "https://api.dhan.co/v2/RenewToken")
-
-API_URL = "https://api.dhan.co/v2/charts/historical"
-TOKEN_RENEWAL_URL = "https://api.dhan.co/v2/RenewToken"
+# API URLs (override to point at a local fixture_server.py)
+API_URL = os.getenv("DHAN_API_URL") or "https://api.dhan.co/v2/charts/historical"
+TOKEN_RENEWAL_URL = os.getenv("DHAN_TOKEN_RENEWAL_URL") or "https://api.dhan.co/v2/RenewToken"
 
 # Exchange settings
 # EXCHANGE_SEGMENT = os.getenv("DHAN_EXCHANGE_SEGMENT", "NSE_EQ")
@@ -0,0 +1,269 @@
+"""Corporate-action adjustment between fetching candles and detecting zones.
+
+Dhan returns unadjusted daily candles. A 1:2 split halves the price
+overnight. The detectors see that gap as a huge impulse candle, and every
+zone formed before it lies far away from the new prices. This stage
+back-adjusts the prices using factors from a local table:
+
+    corporate_actions.csv   security_id,ex_date,factor,kind,note
+                            1333,2019-09-19,0.5,split,1:2 face value split
+
+`factor` multiplies every price before `ex_date` (0.5 for a 1:2 split or a
+1:1 bonus, 2/3 for a 1:2 bonus). Actions of one security compound.
+
+For securities in the candle store, the adjusted series is cached next to
+the raw one (.cache/candles/<id>/adjusted/, same column-file layout). A
+sidecar holds a digest of the security's actions. The adjusted series is
+rebuilt only when that digest changes, i.e. when an action is recorded (or
+when candle_store rewrote the raw history).
+Newly appended raw bars are adjusted and appended on their own, so the
+detectors read ready-adjusted, memmapped candles. Rebuilds run over
+BUILD_CHUNK_ROWS raw bars at a time, so building the cache of a long
+history needs no more memory than one chunk.
+
+Discontinuities that look like unrecorded actions (an overnight gap close
+to a common split / bonus ratio) are reported when an adjusted series is
+built. They are never applied automatically:
+
+    python corporate_actions.py suspects               # scan the candle store
+    python corporate_actions.py record 1333 2019-09-19 0.5 --kind split
+"""
+
+import argparse
+import csv
+import hashlib
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from candle_store import BUILD_CHUNK_ROWS, TIMEZONE, CandleStore, candles_frame, get_candle_store
+
+ACTIONS_CSV = os.getenv("CORPORATE_ACTIONS_CSV") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "corporate_actions.csv"
+)
+FIELDS = ["security_id", "ex_date", "factor", "kind", "note"]
+PRICE_COLUMNS = ("open", "high", "low", "close")
+ADJUSTED = "adjusted"
+
+# price factors of common splits / bonus issues, used to flag suspect gaps
+COMMON_FACTORS = (1 / 2, 1 / 3, 1 / 4, 1 / 5, 1 / 10, 2 / 3, 2.0, 5.0, 10.0)
+GAP_TOLERANCE = 0.04
+
+
+def ex_timestamp(ex_date: str) -> int:
+    """Epoch seconds of local midnight on the ex-date."""
+    return int(pd.Timestamp(ex_date, tz=TIMEZONE).timestamp())
+
+
+class ActionTable:
+    """The local action table, re-read only when the file changes."""
+
+    def __init__(self, path: str = ACTIONS_CSV):
+        self.path = path
+        self._stamp = None
+        self._by_security: Dict[str, List[Tuple[int, float]]] = {}
+        self._lock = threading.Lock()
+
+    def _refresh(self) -> None:
+        try:
+            st_ = os.stat(self.path)
+            stamp = (st_.st_mtime_ns, st_.st_size)
+        except OSError:
+            stamp = None
+        if stamp == self._stamp:
+            return
+        by_security: Dict[str, List[Tuple[int, float]]] = {}
+        if stamp is not None:
+            with open(self.path, newline="") as f:
+                for row in csv.DictReader(f):
+                    try:
+                        item = (ex_timestamp(row["ex_date"]), float(row["factor"]))
+                    except (KeyError, TypeError, ValueError):
+                        print(f"Skipping malformed corporate action row: {row}")
+                        continue
+                    by_security.setdefault(str(row["security_id"]).strip(), []).append(item)
+        for items in by_security.values():
+            items.sort()
+        self._by_security = by_security
+        self._stamp = stamp
+
+    def for_security(self, security_id: str) -> List[Tuple[int, float]]:
+        """[(ex_timestamp, factor), ...] sorted by ex-date."""
+        with self._lock:
+            self._refresh()
+            return list(self._by_security.get(str(security_id), ()))
+
+    def digest(self, security_id: str) -> str:
+        return hashlib.blake2b(repr(self.for_security(security_id)).encode(), digest_size=8).hexdigest()
+
+    def record(self, security_id: str, ex_date: str, factor: float, kind: str = "split", note: str = "") -> None:
+        """Append an action; adjusted series of this security are rebuilt on next use."""
+        ex_timestamp(ex_date)  # validate before writing
+        if not factor > 0:
+            raise ValueError(f"factor must be positive, got {factor}")
+        with self._lock:
+            new_file = not os.path.exists(self.path)
+            with open(self.path, "a", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=FIELDS)
+                if new_file:
+                    writer.writeheader()
+                writer.writerow({"security_id": str(security_id), "ex_date": ex_date,
+                                 "factor": repr(float(factor)), "kind": kind, "note": note})
+            self._stamp = None
+
+
+def price_multipliers(timestamps: np.ndarray, actions: List[Tuple[int, float]]) -> np.ndarray:
+    """Per-bar multiplier: product of the factors of every action after that bar."""
+    if not actions:
+        return np.ones(len(timestamps))
+    ex = np.asarray([a[0] for a in actions], dtype=np.int64)
+    factors = np.asarray([a[1] for a in actions], dtype=np.float64)
+    suffix = np.append(np.cumprod(factors[::-1])[::-1], 1.0)
+    return suffix[np.searchsorted(ex, timestamps, side="right")]
+
+
+def adjust_arrays(arrays: Dict[str, np.ndarray], actions: List[Tuple[int, float]]) -> Dict[str, np.ndarray]:
+    """Adjusted copies of the price columns (timestamps shared)."""
+    mult = price_multipliers(arrays["timestamp"], actions)
+    out = {"timestamp": arrays["timestamp"]}
+    for col in PRICE_COLUMNS:
+        out[col] = arrays[col] * mult
+    return out
+
+
+def adjust_candles(security_id: str, df: pd.DataFrame, table: Optional["ActionTable"] = None) -> pd.DataFrame:
+    """Adjust a freshly fetched frame in memory (unchanged when no actions are recorded)."""
+    if df is None or df.empty:
+        return df
+    actions = (table or get_action_table()).for_security(security_id)
+    if not actions:
+        return df
+    mult = price_multipliers(df["timestamp"].to_numpy(dtype=np.int64), actions)
+    out = df.copy()
+    for col in PRICE_COLUMNS:
+        out[col] = out[col].to_numpy(dtype=np.float64) * mult
+    return out
+
+
+def suspect_gaps(arrays: Dict[str, np.ndarray], actions: List[Tuple[int, float]] = (),
+                 tolerance: float = GAP_TOLERANCE) -> pd.DataFrame:
+    """Overnight gaps close to a common split / bonus ratio and not covered by an action.
+
+    Returns a DataFrame with ex_date, gap (open / previous close) and the
+    nearest common factor.
+    """
+    ts, o, c = arrays["timestamp"], arrays["open"], arrays["close"]
+    if len(ts) < 2:
+        return pd.DataFrame(columns=["ex_date", "gap", "factor"])
+    gap = o[1:] / np.where(c[:-1] == 0, np.nan, c[:-1])
+    common = np.asarray(COMMON_FACTORS)
+    nearest = common[np.argmin(np.abs(gap[:, None] / common[None, :] - 1), axis=1)]
+    hit = np.abs(gap / nearest - 1) <= tolerance
+    known = np.asarray([a[0] for a in actions], dtype=np.int64)
+    rows = []
+    for k in np.flatnonzero(hit):
+        bar_ts = int(ts[k + 1])
+        if len(known) and np.any((known > ts[k]) & (known <= bar_ts)):
+            continue
+        rows.append({
+            "ex_date": pd.Timestamp(bar_ts, unit="s", tz="UTC").tz_convert(TIMEZONE).date().isoformat(),
+            "gap": round(float(gap[k]), 4),
+            "factor": round(float(nearest[k]), 4),
+        })
+    return pd.DataFrame(rows, columns=["ex_date", "gap", "factor"])
+
+
+# ---------- cached adjusted series in the candle store ----------
+SIDECAR = "adjusted.json"
+
+
+def _warn_suspects(security_id: str, arrays: Dict[str, np.ndarray], actions) -> None:
+    suspects = suspect_gaps(arrays, actions)
+    for row in suspects.itertuples(index=False):
+        print(f"Possible unrecorded corporate action for {security_id} on {row.ex_date}: "
+              f"gap {row.gap} ~ factor {row.factor}")
+
+
+def adjusted_arrays(security_id: str, store: Optional[CandleStore] = None,
+                    table: Optional[ActionTable] = None) -> Dict[str, np.ndarray]:
+    """Adjusted (memmapped) columns of a stored security, building/extending the cache if needed."""
+    store = store or get_candle_store()
+    table = table or get_action_table()
+    security_id = str(security_id)
+    actions = table.for_security(security_id)
+    if not actions:
+        return store.arrays(security_id)
+
+    raw_rows = store.rows(security_id)
+    adj = CandleStore(os.path.join(store.root, security_id))
+    digest = table.digest(security_id)
+    # a raw history rewrite (candle_store.sync after a revision) bumps the generation
+    generation = store.meta(security_id).get("generation", 0)
+    side = store.read_sidecar(security_id, SIDECAR)
+    adj_rows = adj.rows(ADJUSTED)
+    fresh = side.get("digest") == digest and side.get("generation") == generation and adj_rows <= raw_rows
+
+    if not fresh:
+        store.write_sidecar(security_id, SIDECAR, {})  # a rebuild cut short is not taken as fresh
+        for start in range(0, raw_rows, BUILD_CHUNK_ROWS):
+            stop = start + BUILD_CHUNK_ROWS
+            # one bar of overlap, so a gap across the chunk boundary is checked too
+            _warn_suspects(security_id, store.arrays(security_id, max(start - 1, 0), stop), actions)
+            chunk = pd.DataFrame(adjust_arrays(store.arrays(security_id, start, stop), actions), copy=False)
+            if start == 0:
+                adj.replace(ADJUSTED, chunk)
+            else:
+                adj.append(ADJUSTED, chunk)
+        store.write_sidecar(security_id, SIDECAR, {"digest": digest, "generation": generation})
+    else:
+        for start in range(adj_rows, raw_rows, BUILD_CHUNK_ROWS):
+            adj.append(ADJUSTED, pd.DataFrame(
+                adjust_arrays(store.arrays(security_id, start, start + BUILD_CHUNK_ROWS), actions), copy=False))
+    return adj.arrays(ADJUSTED)
+
+
+def load_adjusted(security_id: str, store: Optional[CandleStore] = None,
+                  table: Optional[ActionTable] = None) -> pd.DataFrame:
+    """Adjusted candles of a stored security in fetch_for's layout."""
+    return candles_frame(adjusted_arrays(security_id, store, table))
+
+
+_default_table: Optional[ActionTable] = None
+_default_table_lock = threading.Lock()
+
+
+def get_action_table() -> ActionTable:
+    """Process-wide table for CORPORATE_ACTIONS_CSV (default: corporate_actions.csv)."""
+    global _default_table
+    with _default_table_lock:
+        if _default_table is None:
+            _default_table = ActionTable()
+        return _default_table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Corporate-action table and suspect-gap scan.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rec = sub.add_parser("record", help="record an action (prices before ex_date are multiplied by factor)")
+    rec.add_argument("security_id")
+    rec.add_argument("ex_date", help="YYYY-MM-DD")
+    rec.add_argument("factor", type=float)
+    rec.add_argument("--kind", default="split")
+    rec.add_argument("--note", default="")
+    sus = sub.add_parser("suspects", help="list gaps in the candle store that look like unrecorded actions")
+    sus.add_argument("security_ids", nargs="*")
+    args = parser.parse_args()
+
+    action_table = get_action_table()
+    if args.command == "record":
+        action_table.record(args.security_id, args.ex_date, args.factor, args.kind, args.note)
+        print(f"Recorded {args.kind} for {args.security_id} on {args.ex_date} (factor {args.factor})")
+    else:
+        candle_store = get_candle_store()
+        for sid in args.security_ids or candle_store.securities():
+            found = suspect_gaps(candle_store.arrays(sid), action_table.for_security(sid))
+            for item in found.itertuples(index=False):
+                print(f"{sid},{item.ex_date},{item.factor},gap={item.gap}")
@@ -0,0 +1,454 @@
+"""Headless HTTP service over the pattern detectors.
+
+Lets other systems query zones without Streamlit (config.py reads the
+credentials from the environment first):
+
+    GET  /analyze?security_id=21238&direction=bullish[&body=0.65&wick=0.35&max_bases=4]
+         -> retests of one security, as analyze_security_patterns returns them
+    POST /batch  {"security_ids": [...], "direction": "bullish", ...}
+         -> {"results": {id: [...]}, "errors": {id: message}}
+    GET  /zones?run_date=2024-06-01&pattern_type=RBR[&security_id=1,2&open_only=1]
+         -> rows of the Parquet results dataset (results_store.load_results)
+    GET  /stats, GET /health
+
+The front end is a small asyncio HTTP/1.1 server (keep-alive, no extra
+dependencies). Candle fetches run on threads and are shared by concurrent
+requests for the same security. Detection runs on a process pool, through
+zone_cache in each worker.
+
+Responses carry an ETag derived from the last candle: security, parameters,
+row count, the last bar, and the security's corporate-action digest. A
+request with a matching If-None-Match gets 304 without detection. A repeat
+without the header is served from an LRU of rendered bodies, and concurrent
+misses for the same ETag share one detection. Candles are
+re-fetched at most every `candle_ttl` seconds per security.
+
+Example:
+    python detection_service.py --port 8080 --workers 4
+    python detection_service.py --load-test --requests 2000 --concurrency 32   # against fixture_server
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from detector_core import DIRECTION_SPECS
+
+SERVICE_PORT = 8080
+CANDLE_TTL = 60.0
+RESPONSE_CACHE_ENTRIES = 1024
+MAX_BODY_BYTES = 1 << 20
+LATENCY_WINDOW = 10000
+
+
+def _detect(security_id: str, arrays: Dict[str, np.ndarray], spec_name: str, max_bases: int,
+            body_threshold: float, wick_threshold: float) -> bytes:
+    """Worker process: detection through that process's zone_cache; returns JSON records."""
+    from candle_store import candles_frame
+    from zone_cache import analyze_cached
+
+    df = candles_frame(arrays)
+    _, retests = analyze_cached(security_id, df, spec_name, max_bases, body_threshold, wick_threshold)
+    if retests is None or retests.empty:
+        return b"[]"
+    return retests.to_json(orient="records", date_format="iso").encode("utf-8")
+
+
+def _percentile(values, q: float) -> Optional[float]:
+    return round(float(np.percentile(np.asarray(values), q)) * 1000, 2) if len(values) else None
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class DetectionService:
+    """Routes, caches and the worker pool; `serve` runs the HTTP front end."""
+
+    def __init__(self, workers: Optional[int] = None, candle_ttl: float = CANDLE_TTL, source: str = "api",
+                 results_dir: Optional[str] = None):
+        self.pool = ProcessPoolExecutor(max_workers=workers or os.cpu_count())
+        self.candle_ttl = candle_ttl
+        self.source = source
+        self.results_dir = results_dir
+        self._candles: Dict[str, Tuple[float, pd.DataFrame]] = {}
+        self._fetching: Dict[str, asyncio.Future] = {}
+        self._detecting: Dict[str, asyncio.Future] = {}
+        self._responses: "OrderedDict[str, bytes]" = OrderedDict()
+        self._latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        self.counts = {"requests": 0, "not_modified": 0, "response_cache_hits": 0, "detections": 0, "errors": 0}
+        self._started = time.time()
+
+    def close(self) -> None:
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    # ----- candles -----
+    def _load_candles(self, security_id: str) -> pd.DataFrame:
+        if self.source == "store":
+            from corporate_actions import load_adjusted
+            return load_adjusted(security_id)
+        from corporate_actions import adjust_candles
+        from rbr_logic import fetch_for
+        return adjust_candles(security_id, fetch_for(security_id))
+
+    async def candles(self, security_id: str) -> pd.DataFrame:
+        """Candles of a security, at most candle_ttl old; concurrent callers share one fetch."""
+        hit = self._candles.get(security_id)
+        if hit is not None and time.time() - hit[0] < self.candle_ttl:
+            return hit[1]
+        pending = self._fetching.get(security_id)
+        if pending is None:
+            loop = asyncio.get_running_loop()
+            pending = loop.run_in_executor(None, self._load_candles, security_id)
+            self._fetching[security_id] = pending
+            try:
+                df = await pending
+                if df is None:
+                    df = pd.DataFrame()
+                self._candles[security_id] = (time.time(), df)
+                return df
+            finally:
+                self._fetching.pop(security_id, None)
+        return await pending
+
+    # ----- analysis -----
+    @staticmethod
+    def _params(params: dict) -> Tuple[str, str, float, float, int]:
+        direction = params.get("direction", "bullish")
+        spec_name = DIRECTION_SPECS.get(direction)
+        if spec_name is None:
+            raise HTTPError(400, f"unknown direction '{direction}'")
+        try:
+            return (direction, spec_name, float(params.get("body", params.get("body_threshold", 0.65))),
+                    float(params.get("wick", params.get("wick_threshold", 0.35))),
+                    int(params.get("max_bases", 4)))
+        except (TypeError, ValueError) as e:
+            raise HTTPError(400, f"bad parameter: {e}")
+
+    @staticmethod
+    def candle_etag(security_id: str, df: pd.DataFrame, *params) -> str:
+        """ETag of a response computed from `df`: changes when a bar or an action changes the last candle."""
+        from corporate_actions import get_action_table
+
+        h = hashlib.blake2b(digest_size=12)
+        h.update(repr((security_id, params, len(df), get_action_table().digest(security_id))).encode())
+        if len(df):
+            last = df.iloc[-1]
+            h.update(repr([int(last["timestamp"])] + [float(last[c]) for c in ("open", "high", "low", "close")]).encode())
+        return f'"{h.hexdigest()}"'
+
+    async def analyze(self, security_id: str, params: dict, if_none_match: Optional[str] = None
+                      ) -> Tuple[str, Optional[bytes]]:
+        """(etag, JSON body); body is None when if_none_match already matches."""
+        direction, spec_name, body, wick, max_bases = self._params(params)
+        df = await self.candles(security_id)
+        etag = self.candle_etag(security_id, df, spec_name, body, wick, max_bases)
+        if if_none_match == etag:
+            self.counts["not_modified"] += 1
+            return etag, None
+        cached = self._responses.get(etag)
+        if cached is not None:
+            self._responses.move_to_end(etag)
+            self.counts["response_cache_hits"] += 1
+            return etag, cached
+        if df.empty:
+            return etag, b"[]"
+        pending = self._detecting.get(etag)
+        if pending is not None:  # same candles and parameters already on the pool
+            return etag, await pending
+        arrays = {c: df[c].to_numpy() for c in ("timestamp", "open", "high", "low", "close")}
+        pending = asyncio.get_running_loop().run_in_executor(self.pool, _detect, security_id, arrays, spec_name,
+                                                             max_bases, body, wick)
+        self._detecting[etag] = pending
+        try:
+            payload = await pending
+        finally:
+            self._detecting.pop(etag, None)
+        self.counts["detections"] += 1
+        self._remember(etag, payload)
+        return etag, payload
+
+    def _remember(self, etag: str, payload: bytes) -> None:
+        """Cache a response body under its ETag (LRU); only called on the event loop."""
+        self._responses[etag] = payload
+        while len(self._responses) > RESPONSE_CACHE_ENTRIES:
+            self._responses.popitem(last=False)
+
+    async def batch(self, request: dict) -> bytes:
+        ids = [str(s) for s in request.get("security_ids") or []]
+        if not ids:
+            raise HTTPError(400, "security_ids is required")
+        outcomes = await asyncio.gather(*(self.analyze(sid, request) for sid in ids), return_exceptions=True)
+        results, errors = [], {}
+        for sid, outcome in zip(ids, outcomes):
+            if isinstance(outcome, HTTPError):
+                raise outcome
+            if isinstance(outcome, Exception):
+                errors[sid] = str(outcome)
+            else:
+                results.append(json.dumps(sid).encode() + b":" + outcome[1])
+        return b'{"results":{' + b",".join(results) + b'},"errors":' + json.dumps(errors).encode() + b"}"
+
+    def _results_root(self) -> str:
+        from results_store import RESULTS_DIR
+        return self.results_dir or RESULTS_DIR
+
+    def _zones_etag(self, params: dict) -> str:
+        """ETag of a /zones response: the query plus the name, size and mtime of every dataset file."""
+        h = hashlib.blake2b(repr(sorted(params.items())).encode(), digest_size=12)
+        for folder, dirs, files in os.walk(self._results_root()):
+            dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+            for name in sorted(files):
+                st_ = os.stat(os.path.join(folder, name))
+                h.update(f"{folder}/{name}:{st_.st_mtime_ns}:{st_.st_size}".encode())
+        return f'"{h.hexdigest()}"'
+
+    def _load_zones(self, params: dict) -> bytes:
+        from results_store import load_results
+
+        ids = params.get("security_id")
+        frame = load_results(
+            self._results_root(), run_date=params.get("run_date"), pattern_type=params.get("pattern_type"),
+            security_ids=ids.split(",") if ids else None,
+            open_only=params.get("open_only", "0").lower() in ("1", "true", "yes"),
+        )
+        return frame.to_json(orient="records", date_format="iso").encode("utf-8") if not frame.empty else b"[]"
+
+    async def zones(self, params: dict, if_none_match: Optional[str] = None) -> Tuple[str, Optional[bytes]]:
+        """(etag, JSON body) of a results query; body is None when if_none_match already matches.
+
+        The dataset is only read when neither the client nor the response
+        cache has the current ETag; file I/O runs on the default executor.
+        """
+        loop = asyncio.get_running_loop()
+        etag = await loop.run_in_executor(None, self._zones_etag, params)
+        if if_none_match == etag:
+            self.counts["not_modified"] += 1
+            return etag, None
+        cached = self._responses.get(etag)
+        if cached is not None:
+            self._responses.move_to_end(etag)
+            self.counts["response_cache_hits"] += 1
+            return etag, cached
+        payload = await loop.run_in_executor(None, self._load_zones, params)
+        self._remember(etag, payload)
+        return etag, payload
+
+    def stats(self) -> dict:
+        window = list(self._latencies)
+        span = (window[-1][0] - window[0][0]) if len(window) > 1 else 0.0
+        latencies = [w[1] for w in window]
+        return {
+            **self.counts,
+            "uptime_s": round(time.time() - self._started, 1),
+            "throughput_rps": round(len(window) / span, 1) if span > 0 else None,
+            "p50_ms": _percentile(latencies, 50),
+            "p99_ms": _percentile(latencies, 99),
+            "cached_candles": len(self._candles),
+            "cached_responses": len(self._responses),
+        }
+
+    # ----- HTTP -----
+    async def route(self, method: str, target: str, headers: Dict[str, str], body: bytes
+                    ) -> Tuple[int, Dict[str, str], bytes]:
+        url = urlsplit(target)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        path = url.path.rstrip("/") or "/"
+        if path == "/health":
+            return 200, {}, b'{"status":"ok"}'
+        if path == "/stats":
+            return 200, {}, json.dumps(self.stats()).encode()
+        if path == "/analyze" and method == "GET":
+            if "security_id" not in params:
+                raise HTTPError(400, "security_id is required")
+            etag, payload = await self.analyze(params["security_id"], params, headers.get("if-none-match"))
+            return (304, {"ETag": etag}, b"") if payload is None else (200, {"ETag": etag}, payload)
+        if path == "/batch" and method == "POST":
+            try:
+                request = json.loads(body or b"{}")
+            except ValueError:
+                raise HTTPError(400, "body must be JSON")
+            return 200, {}, await self.batch(request)
+        if path == "/zones" and method == "GET":
+            etag, payload = await self.zones(params, headers.get("if-none-match"))
+            return (304, {"ETag": etag}, b"") if payload is None else (200, {"ETag": etag}, payload)
+        raise HTTPError(404, f"no route for {method} {path}")
+
+    async def _respond(self, writer, status: int, extra: Dict[str, str], payload: bytes, keep_alive: bool) -> None:
+        head = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+                "Content-Type: application/json",
+                f"Content-Length: {len(payload)}",
+                f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        head += [f"{k}: {v}" for k, v in extra.items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + payload)
+        await writer.drain()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """One client connection; serves requests until the client closes or asks to."""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                method, target, version = line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    raw = await reader.readline()
+                    if raw in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = raw.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, {}, b'{"error":"body too large"}', False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                started = time.perf_counter()
+                self.counts["requests"] += 1
+                try:
+                    status, extra, payload = await self.route(method, target, headers, body)
+                except HTTPError as e:
+                    status, extra, payload = e.status, {}, json.dumps({"error": str(e)}).encode()
+                except Exception as e:
+                    self.counts["errors"] += 1
+                    status, extra, payload = 500, {}, json.dumps({"error": str(e)}).encode()
+                await self._respond(writer, status, extra, payload, keep_alive)
+                self._latencies.append((time.time(), time.perf_counter() - started))
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = SERVICE_PORT) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self.handle, host, port)
+
+
+def start_service_thread(service: DetectionService, host: str = "127.0.0.1", port: int = 0) -> int:
+    """Run the service on a daemon thread with its own event loop; returns the bound port."""
+    ready: Dict[str, int] = {}
+    started = threading.Event()
+
+    def _run():
+        loop = asyncio.new_event_loop()
+        server = loop.run_until_complete(service.serve(host, port))
+        ready["port"] = server.sockets[0].getsockname()[1]
+        started.set()
+        loop.run_forever()
+
+    threading.Thread(target=_run, daemon=True, name="detection-service").start()
+    started.wait()
+    return ready["port"]
+
+
+# ---------- Load test ----------
+def run_load_test(total: int = 2000, concurrency: int = 32, securities: int = 100, workers: Optional[int] = None,
+                  conditional_share: float = 0.5, latency_ms: float = 20.0) -> dict:
+    """Service + fixture_server in this process; prints and returns throughput and latency.
+
+    Requests cycle over `securities` ids; `conditional_share` of them send the
+    ETag of an earlier response, as a polling client would.
+    """
+    import requests
+    from concurrent.futures import ThreadPoolExecutor
+
+    from fixture_server import fixture_token, start_fixture_server
+
+    fixtures = start_fixture_server(latency_ms=latency_ms, jitter_ms=latency_ms / 2)
+    base = f"http://127.0.0.1:{fixtures.server_address[1]}/v2"
+    os.environ.update({
+        "DHAN_API_URL": f"{base}/charts/historical",
+        "DHAN_TOKEN_RENEWAL_URL": f"{base}/RenewToken",
+        "DHAN_ACCESS_TOKEN": fixture_token(),
+        "DHAN_CLIENT_ID": "fixture",
+        "DHAN_RATE_LIMIT": "50",
+    })
+    service = DetectionService(workers=workers)
+    port = start_service_thread(service)
+    url = f"http://127.0.0.1:{port}/analyze"
+    etags: Dict[str, str] = {}
+    local = threading.local()
+
+    def one(k: int) -> Tuple[int, float]:
+        session = getattr(local, "session", None) or requests.Session()
+        local.session = session
+        sid = str(1000 + k % securities)
+        headers = {}
+        if sid in etags and (k * 2654435761 % 1000) / 1000 < conditional_share:
+            headers["If-None-Match"] = etags[sid]
+        started = time.perf_counter()
+        resp = session.get(url, params={"security_id": sid, "direction": "bullish"}, headers=headers, timeout=60)
+        elapsed = time.perf_counter() - started
+        if "ETag" in resp.headers:
+            etags[sid] = resp.headers["ETag"]
+        return resp.status_code, elapsed
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as clients:
+        results = list(clients.map(one, range(total)))
+    wall = time.perf_counter() - t0
+    latencies = [r[1] for r in results]
+    statuses: Dict[int, int] = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    report = {
+        "requests": total,
+        "concurrency": concurrency,
+        "throughput_rps": round(total / wall, 1),
+        "p50_ms": _percentile(latencies, 50),
+        "p99_ms": _percentile(latencies, 99),
+        "statuses": statuses,
+        "service": service.stats(),
+    }
+    print(json.dumps(report, indent=2))
+    service.close()
+    fixtures.shutdown()
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP service for the pattern detectors.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--workers", type=int, default=None, help="detection processes (default: CPU count)")
+    parser.add_argument("--source", choices=("api", "store"), default="api",
+                        help="candles from the Dhan API or the local candle store")
+    parser.add_argument("--candle-ttl", type=float, default=CANDLE_TTL)
+    parser.add_argument("--load-test", action="store_true", help="benchmark against a local fixture_server")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--securities", type=int, default=100)
+    args = parser.parse_args()
+
+    if args.load_test:
+        run_load_test(args.requests, args.concurrency, args.securities, args.workers)
+    else:
+        svc = DetectionService(args.workers, args.candle_ttl, args.source)
+
+        async def _main():
+            server = await svc.serve(args.host, args.port)
+            print(f"Detection service on http://{args.host}:{args.port} ({args.source} candles)")
+            async with server:
+                await server.serve_forever()
+
+        try:
+            asyncio.run(_main())
+        except KeyboardInterrupt:
+            svc.close()
@@ -0,0 +1,678 @@
+"""Shared detection core for every base/impulse pattern in the project.
+
+rbr_logic, dbd_logic and patterns_logic used to carry their own copies of the
+same scan: a strong impulse candle, 1..max_bases small-body base candles, a
+second impulse candle, a zone drawn from the bases, and a forward scan for a
+retest or a break. The only differences are captured by a `PatternSpec`:
+
+  - impulse colors of the first/second candle and the impulse rule
+  - an optional extra close condition on the second impulse (RBD / DBR)
+  - which candle edges form the zone high / low
+  - how a retest "touch" and a zone "break" are recognised
+  - output column names, so each wrapper keeps its historical schema
+
+The kernel works on plain NumPy arrays: per-candle ratios and masks are
+computed once, vectorized, and the sequential part (greedy base collection,
+skip to j + 1 after a zone) runs over those precomputed masks.
+
+Example:
+    >>> from detector_core import SPECS, detect_zones, detect_retests
+    >>> zones = detect_zones(df, SPECS["RBR"], max_bases=4)
+    >>> retests = detect_retests(df, zones, SPECS["RBR"])
+    >>> scored = detect_zones(df, SPECS["RBR"], scores=True)   # + quality columns
+    >>> best = top_zones(scored_frames, k=50)                     # best 50 across securities
+"""
+
+import heapq
+from dataclasses import dataclass
+from itertools import count
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import detector_jit
+from candle_store import TIMEZONE
+
+GREEN = 1
+RED = -1
+ATR_PERIOD = 14
+
+# quality columns added by zone_arrays(scores=True); see zone_scores
+SCORE_COLUMNS = ("freshness", "impulse_strength", "base_tightness", "departure_distance", "height_atr", "quality_score")
+
+
+@dataclass(frozen=True)
+class PatternSpec:
+    """Rules and output schema of one pattern.
+
+    impulse_rule:
+      "body_wick" -> body/size >= body_threshold and wick/size <= wick_threshold
+      "body_gt"   -> body/size >  body_threshold (rbr_logic)
+      "body_ge"   -> body/size >= body_threshold (dbd_logic)
+    confirm: None, "below_first_low" (2nd close < 1st low) or
+             "above_first_high" (2nd close > 1st high)
+    zone_high: "body_top" (max(open, close)) or "high"
+    zone_low:  "low" or "body_bottom" (min(open, close))
+    on_incomplete: "advance" to keep scanning when the bases run into the end
+                   of the series, "stop" to end the scan there
+    drop_broken: drop zones that are broken anywhere after the 2nd impulse
+    touch: "low_in_zone", "high_in_zone" or "high_reaches_low"
+           (high >= zone_low and low >= zone_low)
+    breaks: "low_below" (low < zone_low) or "high_above" (high > zone_high)
+    retest_order: "touch_then_break" keeps scanning after the touch until a
+                  break; "break_first" stops at whichever comes first and
+                  checks the break before the touch on each candle
+    price: "touch" (the touching low/high) or "zone_low"
+    """
+
+    name: str
+    first: int
+    second: int
+    zone_high: str
+    zone_low: str
+    touch: str
+    breaks: str
+    confirm: Optional[str] = None
+    impulse_rule: str = "body_wick"
+    on_incomplete: str = "advance"
+    drop_broken: bool = False
+    retest_order: str = "touch_then_break"
+    price: str = "touch"
+    # output schema
+    low_col: str = "zone_low"
+    high_col: str = "zone_high"
+    idx_col: str = "continuation_idx"
+    signal_prefix: str = "buy"
+    with_pattern_type: bool = True
+    retest_drop: Tuple[str, ...] = ()
+
+
+SPECS: Dict[str, PatternSpec] = {
+    # patterns_logic.find_pattern / find_retests_*
+    "RBR": PatternSpec("RBR", GREEN, GREEN, "body_top", "low", "low_in_zone", "low_below"),
+    "DBD": PatternSpec("DBD", RED, RED, "high", "body_bottom", "high_in_zone", "high_above",
+                       signal_prefix="sell"),
+    "RBD": PatternSpec("RBD", GREEN, RED, "high", "body_bottom", "high_in_zone", "high_above",
+                       confirm="below_first_low", signal_prefix="sell"),
+    "DBR": PatternSpec("DBR", RED, GREEN, "body_top", "low", "low_in_zone", "low_below",
+                       confirm="above_first_high"),
+    # rbr_logic.find_demand_zones / find_retests
+    "RBR_LEGACY": PatternSpec(
+        "RBR", GREEN, GREEN, "body_top", "low", "low_in_zone", "low_below",
+        impulse_rule="body_gt", on_incomplete="stop", drop_broken=True, retest_order="break_first",
+        low_col="demand_zone_low", high_col="demand_zone_high", idx_col="rally2_idx",
+        with_pattern_type=False, retest_drop=("zone_height", "rally2_idx"),
+    ),
+    # dbd_logic.find_drop_base_drop / find_retests_dbd
+    "DBD_LEGACY": PatternSpec(
+        "DBD", RED, RED, "high", "body_bottom", "high_reaches_low", "high_above",
+        impulse_rule="body_ge", on_incomplete="stop", drop_broken=True, retest_order="break_first",
+        price="zone_low", low_col="demand_zone_low", high_col="demand_zone_high", idx_col="drop2_idx",
+        with_pattern_type=False, retest_drop=("zone_height", "drop2_idx"),
+    ),
+}
+
+# find_pattern direction -> spec name
+DIRECTION_SPECS = {"bullish": "RBR", "bearish": "DBD", "rbd": "RBD", "dbr": "DBR"}
+
+
+def spec_for_direction(direction: str) -> Optional[PatternSpec]:
+    name = DIRECTION_SPECS.get(direction)
+    return SPECS[name] if name else None
+
+
+# ---------- Per-candle arrays ----------
+def candle_arrays(df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Return (open, high, low, close) as float64 arrays."""
+    return tuple(df[c].to_numpy(dtype=np.float64) for c in ("open", "high", "low", "close"))
+
+
+def candle_features(o: np.ndarray, h: np.ndarray, l: np.ndarray, c: np.ndarray) -> Dict[str, np.ndarray]:
+    """Per-candle values every detector needs, computed once per series.
+
+    Same arithmetic as the scalar helpers (candle_size / candle_body /
+    wick_sum / overall / wick_data), so ratios compare identically.
+    """
+    size = np.maximum(h - l, 1e-9)
+    body = np.abs(c - o)
+    wick = (h - np.maximum(o, c)) + (np.minimum(o, c) - l)
+    color = np.where(c > o, GREEN, np.where(o > c, RED, 0)).astype(np.int8)
+    return {"body_ratio": body / size, "wick_ratio": wick / size, "color": color}
+
+
+def impulse_mask(feats: Dict[str, np.ndarray], color: int, rule: str,
+                 body_threshold: float, wick_threshold: float) -> np.ndarray:
+    ok = feats["color"] == color
+    if rule == "body_wick":
+        return ok & (feats["body_ratio"] >= body_threshold) & (feats["wick_ratio"] <= wick_threshold)
+    if rule == "body_gt":
+        return ok & (feats["body_ratio"] > body_threshold)
+    if rule == "body_ge":
+        return ok & (feats["body_ratio"] >= body_threshold)
+    raise ValueError(f"Unknown impulse rule '{rule}'")
+
+
+def base_mask(feats: Dict[str, np.ndarray], body_threshold: float, wick_threshold: float) -> np.ndarray:
+    return (feats["body_ratio"] <= wick_threshold) & (feats["wick_ratio"] >= body_threshold)
+
+
+def true_range(h: np.ndarray, l: np.ndarray, c: np.ndarray) -> np.ndarray:
+    prev = np.r_[c[0], c[:-1]] if len(c) else c
+    return np.maximum(h - l, np.maximum(np.abs(h - prev), np.abs(l - prev)))
+
+
+def average_true_range(h: np.ndarray, l: np.ndarray, c: np.ndarray, period: int = ATR_PERIOD) -> np.ndarray:
+    """Rolling mean of the true range (expanding over the first `period` candles).
+
+    Each value only uses candles up to its own index and is summed per window,
+    so appending bars (feature_store) reproduces earlier values exactly.
+    """
+    n = len(c)
+    if n == 0:
+        return np.empty(0)
+    tr = true_range(h, l, c)
+    head = min(period - 1, n)
+    out = np.empty(n)
+    out[:head] = np.cumsum(tr[:head]) / np.arange(1, head + 1)
+    if n >= period:
+        out[head:] = np.lib.stride_tricks.sliding_window_view(tr, period).sum(axis=1) / period
+    return np.maximum(out, 1e-9)
+
+
+# ---------- Kernel ----------
+def _scan_range(first: list, base: list, second: list, lo: int, n: int, max_bases: int,
+                stop_on_incomplete: bool, confirm) -> Tuple[List[Tuple[int, int]], int]:
+    """scan_zones over positions lo .. n - 1 of mask lists (indices stay absolute)."""
+    if confirm is not None:
+        closes, ref, below = confirm
+    out = []
+    resume = -1
+    i = lo
+    while i < n - 2:
+        if not first[i]:
+            i += 1
+            continue
+        j = i + 1
+        while j < n and j - i - 1 < max_bases and base[j]:
+            j += 1
+        if j == i + 1:
+            i += 1
+            continue
+        if j >= n:
+            if resume < 0:
+                resume = i
+            if stop_on_incomplete:
+                break
+            i += 1
+            continue
+        if not second[j]:
+            i += 1
+            continue
+        if confirm is not None and (closes[j] >= ref[i] if below else closes[j] <= ref[i]):
+            i += 1
+            continue
+        out.append((i, j))
+        i = j + 1
+    return out, (i if resume < 0 else resume)
+
+
+def _confirm_lists(confirm):
+    return None if confirm is None else (confirm[0].tolist(), confirm[1].tolist(), confirm[2])
+
+
+def scan_zones(
+    first_ok: np.ndarray,
+    base_ok: np.ndarray,
+    second_ok: np.ndarray,
+    max_bases: int,
+    stop_on_incomplete: bool = False,
+    confirm: Optional[Tuple[np.ndarray, np.ndarray, bool]] = None,
+) -> Tuple[List[Tuple[int, int]], int]:
+    """Greedy impulse/base/impulse scan over precomputed masks.
+
+    `confirm` is (close, reference, below): the 2nd impulse close must be below
+    (or above) the reference value of the 1st impulse candle. It depends on the
+    (i, j) pair, so it is the only test evaluated inside the loop.
+
+    Returns (pairs, resume). pairs is a list of (i, j): first impulse index and
+    second impulse index; bases are i + 1 .. j - 1. resume is the first scan
+    position whose outcome depended on the end of the series; when more
+    candles are appended, scanning again from `resume` reproduces a full scan.
+    """
+    return _scan_range(first_ok.tolist(), base_ok.tolist(), second_ok.tolist(), 0, len(first_ok), max_bases,
+                       stop_on_incomplete, _confirm_lists(confirm))
+
+
+def scan_zones_ragged(
+    first_ok: np.ndarray,
+    base_ok: np.ndarray,
+    second_ok: np.ndarray,
+    offsets: np.ndarray,
+    max_bases: int,
+    stop_on_incomplete: bool = False,
+    confirm: Optional[Tuple[np.ndarray, np.ndarray, bool]] = None,
+) -> Tuple[List[Tuple[int, int]], np.ndarray]:
+    """scan_zones over concatenated series; series k spans offsets[k] .. offsets[k + 1] - 1.
+
+    Each series is scanned as if it were alone: no base run or impulse pair
+    crosses a boundary. Returns (pairs, resumes) with absolute indices and one
+    resume position per series.
+    """
+    first, base, second = first_ok.tolist(), base_ok.tolist(), second_ok.tolist()
+    confirm = _confirm_lists(confirm)
+    pairs: List[Tuple[int, int]] = []
+    resumes = np.empty(len(offsets) - 1, dtype=np.int64)
+    for k in range(len(offsets) - 1):
+        found, resumes[k] = _scan_range(first, base, second, int(offsets[k]), int(offsets[k + 1]), max_bases,
+                                        stop_on_incomplete, confirm)
+        pairs.extend(found)
+    return pairs, resumes
+
+
+def confirm_arrays(spec: PatternSpec, h: np.ndarray, l: np.ndarray, c: np.ndarray):
+    """The `confirm` argument of scan_zones for a spec (None when it has no rule)."""
+    if spec.confirm is None:
+        return None
+    if spec.confirm == "below_first_low":
+        return c, l, True
+    return c, h, False
+
+
+def zone_edges(o, h, l, c, first_idx: np.ndarray, second_idx: np.ndarray, spec: PatternSpec) -> Tuple[np.ndarray, np.ndarray]:
+    """Zone (low, high) per zone from the base candles first_idx + 1 .. second_idx - 1."""
+    if len(first_idx) == 0:
+        return np.empty(0), np.empty(0)
+    top = np.maximum(o, c) if spec.zone_high == "body_top" else h
+    bottom = l if spec.zone_low == "low" else np.minimum(o, c)
+    # bases of successive zones are disjoint and increasing, so one reduceat
+    # over interleaved [start, stop) bounds covers all zones
+    bounds = np.empty(2 * len(first_idx), dtype=np.intp)
+    bounds[0::2] = first_idx + 1
+    bounds[1::2] = second_idx
+    highs = np.maximum.reduceat(top, bounds)[::2]
+    lows = np.minimum.reduceat(bottom, bounds)[::2]
+    return lows, highs
+
+
+def zone_scores(o, c, body_ratio: np.ndarray, atr: np.ndarray, zones: Dict[str, np.ndarray],
+                spec: PatternSpec, start: int = 0) -> Dict[str, np.ndarray]:
+    """Quality measures per zone, from arrays the scan already holds.
+
+    body_ratio covers the candles from `start` on (as scanned by zone_arrays).
+
+    ATR is taken at the first impulse candle (known before the zone formed):
+      impulse_strength:   body of the departure (2nd) impulse / ATR
+      base_tightness:     1 - mean body ratio of the base candles
+      departure_distance: departure close beyond the zone edge, in ATRs
+                          (above zone_high for demand, below zone_low for supply)
+      height_atr:         zone height / ATR
+      quality_score:      (impulse_strength + departure_distance) * base_tightness
+                          / (1 + height_atr); higher is better
+    `freshness` (bars since the departure candle) depends on the series end
+    and is added by zones_frame.
+    """
+    first, second = zones["first_idx"], zones["second_idx"]
+    if len(first) == 0:
+        return {name: np.empty(0) for name in SCORE_COLUMNS if name != "freshness"}
+    lows, highs = zones["zone_low"], zones["zone_high"]
+    atr = atr[first]
+    bounds = np.empty(2 * len(first), dtype=np.intp)
+    bounds[0::2] = first + 1 - start
+    bounds[1::2] = second - start
+    base_body = np.add.reduceat(body_ratio, bounds)[::2] / (second - first - 1)
+    impulse = np.abs(c[second] - o[second]) / atr
+    if spec.breaks == "low_below":
+        departure = (c[second] - highs) / atr
+    else:
+        departure = (lows - c[second]) / atr
+    tightness = 1.0 - base_body
+    height = np.abs(highs - lows) / atr
+    return {
+        "impulse_strength": impulse,
+        "base_tightness": tightness,
+        "departure_distance": departure,
+        "height_atr": height,
+        "quality_score": (impulse + departure) * tightness / (1.0 + height),
+    }
+
+
+def top_zones(frames: Iterable[pd.DataFrame], k: int = 50, by: str = "quality_score") -> pd.DataFrame:
+    """Best `k` rows by `by` across zone / retest frames, without sorting them all.
+
+    Frames are consumed one at a time (e.g. a generator over the universe);
+    a min-heap of size k holds the current best rows, and each frame only
+    contributes the rows that beat the heap's worst entry. k < 1 selects
+    nothing and returns an empty frame.
+    """
+    if k < 1:
+        return pd.DataFrame([])
+    heap: List[tuple] = []
+    seq = count()
+    for frame in frames:
+        if frame is None or frame.empty or by not in frame.columns:
+            continue
+        values = frame[by].to_numpy(dtype=np.float64)
+        candidates = np.flatnonzero(~np.isnan(values))
+        if len(heap) >= k:
+            candidates = candidates[values[candidates] > heap[0][0]]
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(values[candidates], -k)[-k:]]
+        for pos in candidates:
+            item = (values[pos], next(seq), frame.iloc[pos])
+            if len(heap) < k:
+                heapq.heappush(heap, item)
+            elif item[0] > heap[0][0]:
+                heapq.heapreplace(heap, item)
+    if not heap:
+        return pd.DataFrame([])
+    rows = [row for _, _, row in sorted(heap, key=lambda t: (-t[0], t[1]))]
+    return pd.DataFrame(rows).reset_index(drop=True)
+
+
+def broken_after(h, l, zone_low, zone_high, start_idx, breaks: str) -> np.ndarray:
+    """True for zones broken by any candle strictly after their start index."""
+    after = np.asarray(start_idx) + 1
+    if breaks == "low_below":
+        suffix = np.append(np.minimum.accumulate(l[::-1])[::-1], np.inf)
+        return suffix[after] < zone_low
+    suffix = np.append(np.maximum.accumulate(h[::-1])[::-1], -np.inf)
+    return suffix[after] > zone_high
+
+
+def _first_true(mask: np.ndarray) -> int:
+    k = int(np.argmax(mask)) if len(mask) else 0
+    return k if len(mask) and mask[k] else -1
+
+
+def resolve_retests(h, l, zone_low, zone_high, start_idx, spec: PatternSpec, end_idx=None):
+    """Forward retest/break resolution for each zone, starting after start_idx.
+
+    end_idx: per-zone exclusive end of the scan (default: the end of the
+    arrays); concatenated series pass the end of each zone's own series.
+    Returns arrays (signal, price, retest_idx, invalidated); price is NaN and
+    retest_idx -1 where there is no signal.
+    """
+    m = len(zone_low)
+    signal = np.zeros(m, dtype=bool)
+    invalid = np.zeros(m, dtype=bool)
+    price = np.full(m, np.nan)
+    retest_idx = np.full(m, -1, dtype=np.int64)
+    touch_src = l if spec.touch == "low_in_zone" else h
+    for z in range(m):
+        s = int(start_idx[z]) + 1
+        e = len(h) if end_idx is None else int(end_idx[z])
+        lo = zone_low[z]
+        hi = zone_high[z]
+        if spec.breaks == "low_below":
+            b = _first_true(l[s:e] < lo)
+        else:
+            b = _first_true(h[s:e] > hi)
+        if spec.touch == "high_reaches_low":
+            t = _first_true((h[s:e] >= lo) & (l[s:e] >= lo))
+        else:
+            seg = touch_src[s:e]
+            t = _first_true((seg >= lo) & (seg <= hi))
+        if spec.retest_order == "break_first":
+            has_signal = t >= 0 and (b < 0 or t < b)
+            invalid[z] = b >= 0 and not has_signal
+        else:
+            has_signal = t >= 0 and (b < 0 or t <= b)
+            invalid[z] = b >= 0
+        if has_signal:
+            signal[z] = True
+            retest_idx[z] = s + t
+            price[z] = lo if spec.price == "zone_low" else touch_src[s + t]
+    return signal, price, retest_idx, invalid
+
+
+def _kernels(backend: str):
+    if detector_jit.resolve_backend(backend) == "numba":
+        return detector_jit.scan_zones, detector_jit.resolve_retests
+    return scan_zones, resolve_retests
+
+
+def _ragged_scan(backend: str):
+    if detector_jit.resolve_backend(backend) == "numba":
+        return detector_jit.scan_zones_ragged
+    return scan_zones_ragged
+
+
+# ---------- Array-level detection ----------
+def zone_arrays(
+    o: np.ndarray,
+    h: np.ndarray,
+    l: np.ndarray,
+    c: np.ndarray,
+    spec: PatternSpec,
+    max_bases: int = 4,
+    body_threshold: float = 0.65,
+    wick_threshold: float = 0.35,
+    backend: str = "python",
+    start: int = 0,
+    scores: bool = False,
+    features: Optional[Dict[str, np.ndarray]] = None,
+) -> Tuple[Dict[str, np.ndarray], int]:
+    """Scan candles from `start` on and return (zones, resume).
+
+    zones holds arrays "first_idx", "second_idx", "zone_low", "zone_high"
+    (indices are positions in the full arrays); resume is the position to
+    restart from once more candles are appended (see scan_zones).
+    Specs with drop_broken look at the whole future of each zone, so their
+    results are only final for the full series.
+    With scores, zones also hold the zone_scores arrays (ATR over the full
+    series, body ratios from this scan's candle features).
+    features: precomputed per-candle columns of the full series
+    (feature_store.feature_arrays: body_ratio, wick_ratio, color, atr), used
+    instead of recomputing candle_features / the ATR.
+    """
+    scan, _ = _kernels(backend)
+    o_, h_, l_, c_ = o[start:], h[start:], l[start:], c[start:]
+    if features is not None:
+        feats = {k: features[k][start:] for k in ("body_ratio", "wick_ratio", "color")}
+    else:
+        feats = candle_features(o_, h_, l_, c_)
+    first_ok = impulse_mask(feats, spec.first, spec.impulse_rule, body_threshold, wick_threshold)
+    second_ok = first_ok if spec.second == spec.first else impulse_mask(
+        feats, spec.second, spec.impulse_rule, body_threshold, wick_threshold)
+    base_ok = base_mask(feats, body_threshold, wick_threshold)
+    pairs, resume = scan(first_ok, base_ok, second_ok, max_bases,
+                         stop_on_incomplete=spec.on_incomplete == "stop",
+                         confirm=confirm_arrays(spec, h_, l_, c_))
+
+    first_idx = np.array([p[0] for p in pairs], dtype=np.int64) + start
+    second_idx = np.array([p[1] for p in pairs], dtype=np.int64) + start
+    lows, highs = zone_edges(o, h, l, c, first_idx, second_idx, spec)
+    if spec.drop_broken and len(first_idx):
+        keep = ~broken_after(h, l, lows, highs, second_idx, spec.breaks)
+        first_idx, second_idx, lows, highs = first_idx[keep], second_idx[keep], lows[keep], highs[keep]
+    zones = {"first_idx": first_idx, "second_idx": second_idx, "zone_low": lows, "zone_high": highs}
+    if scores:
+        atr = features["atr"] if features is not None else average_true_range(h, l, c)
+        zones.update(zone_scores(o, c, feats["body_ratio"], atr, zones, spec, start))
+    return zones, resume + start
+
+
+def retest_arrays(h: np.ndarray, l: np.ndarray, zones: Dict[str, np.ndarray], spec: PatternSpec,
+                  backend: str = "python") -> Dict[str, np.ndarray]:
+    """Retest arrays "signal", "price", "retest_idx", "invalidated" for zone arrays."""
+    _, resolve = _kernels(backend)
+    signal, price, retest_idx, invalid = resolve(h, l, zones["zone_low"], zones["zone_high"], zones["second_idx"], spec)
+    return {"signal": signal, "price": price, "retest_idx": retest_idx, "invalidated": invalid}
+
+
+# ---------- Ragged (multi-series) detection ----------
+def series_of(offsets: np.ndarray, idx: np.ndarray) -> np.ndarray:
+    """Series number of each candle index, for series laid out by `offsets`."""
+    return np.searchsorted(offsets, idx, side="right") - 1
+
+
+def zone_arrays_ragged(
+    o: np.ndarray,
+    h: np.ndarray,
+    l: np.ndarray,
+    c: np.ndarray,
+    offsets: np.ndarray,
+    spec: PatternSpec,
+    max_bases: int = 4,
+    body_threshold: float = 0.65,
+    wick_threshold: float = 0.35,
+    backend: str = "python",
+) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+    """zone_arrays for many series in one pass; returns (zones, resumes).
+
+    The candles of all series are concatenated; series k spans offsets[k] ..
+    offsets[k + 1] - 1 (offsets starts at 0 and ends at the total length).
+    Candle features and masks are per candle, so they are computed once over
+    everything; the scan restarts at every boundary (scan_zones_ragged).
+    zones holds global indices plus "series" (k); each series' result equals
+    zone_arrays on that series alone, shifted by offsets[k]. Scores are not
+    computed here.
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    feats = candle_features(o, h, l, c)
+    first_ok = impulse_mask(feats, spec.first, spec.impulse_rule, body_threshold, wick_threshold)
+    second_ok = first_ok if spec.second == spec.first else impulse_mask(
+        feats, spec.second, spec.impulse_rule, body_threshold, wick_threshold)
+    base_ok = base_mask(feats, body_threshold, wick_threshold)
+    pairs, resumes = _ragged_scan(backend)(first_ok, base_ok, second_ok, offsets, max_bases,
+                                           stop_on_incomplete=spec.on_incomplete == "stop",
+                                           confirm=confirm_arrays(spec, h, l, c))
+
+    first_idx = np.array([p[0] for p in pairs], dtype=np.int64)
+    second_idx = np.array([p[1] for p in pairs], dtype=np.int64)
+    lows, highs = zone_edges(o, h, l, c, first_idx, second_idx, spec)
+    series = series_of(offsets, first_idx)
+    if spec.drop_broken and len(first_idx):
+        # breaks are looked up within each zone's own series (zones are ordered by series)
+        keep = np.ones(len(first_idx), dtype=bool)
+        cuts = np.flatnonzero(np.diff(series)) + 1
+        for a, b in zip(np.r_[0, cuts], np.r_[cuts, len(series)]):
+            lo, hi = offsets[series[a]], offsets[series[a] + 1]
+            keep[a:b] = ~broken_after(h[lo:hi], l[lo:hi], lows[a:b], highs[a:b], second_idx[a:b] - lo, spec.breaks)
+        first_idx, second_idx, lows, highs, series = (
+            first_idx[keep], second_idx[keep], lows[keep], highs[keep], series[keep])
+    zones = {"first_idx": first_idx, "second_idx": second_idx, "zone_low": lows, "zone_high": highs, "series": series}
+    return zones, resumes
+
+
+def retest_arrays_ragged(h: np.ndarray, l: np.ndarray, zones: Dict[str, np.ndarray], offsets: np.ndarray,
+                         spec: PatternSpec, backend: str = "python") -> Dict[str, np.ndarray]:
+    """retest_arrays for zone_arrays_ragged output; each zone's scan ends with its series."""
+    _, resolve = _kernels(backend)
+    end = np.asarray(offsets, dtype=np.int64)[zones["series"] + 1]
+    signal, price, retest_idx, invalid = resolve(h, l, zones["zone_low"], zones["zone_high"], zones["second_idx"],
+                                                 spec, end)
+    return {"signal": signal, "price": price, "retest_idx": retest_idx, "invalidated": invalid}
+
+
+# ----- result frames -----
+def to_dates(values) -> pd.Series:
+    """Per-zone dates as a 0-based tz-aware Series: a date Series is re-indexed, epoch seconds are converted."""
+    if isinstance(values, pd.Series):
+        return values.reset_index(drop=True)
+    return pd.Series(pd.to_datetime(np.asarray(values, dtype=np.int64), unit="s", utc=True)).dt.tz_convert(TIMEZONE)
+
+
+def _with_retests(zones: pd.DataFrame, retest_dates, spec: PatternSpec, retests: Dict[str, np.ndarray]) -> pd.DataFrame:
+    signal = np.asarray(retests["signal"], dtype=bool)
+    out = zones.reset_index(drop=True)
+    out[f"{spec.signal_prefix}_signal"] = signal
+    out[f"{spec.signal_prefix}_price"] = np.where(signal, retests["price"], np.nan)
+    out["retest_date"] = to_dates(retest_dates).where(signal)
+    out["invalidated"] = np.asarray(retests["invalidated"], dtype=bool)
+    if spec.retest_drop:
+        out = out.drop(columns=list(spec.retest_drop), errors="ignore")
+    return out
+
+
+def frames_from_arrays(dates, spec: PatternSpec, zones: Dict[str, np.ndarray],
+                       retests: Optional[Dict[str, np.ndarray]] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Zone (and retest) arrays -> (zones, retests) DataFrames in the spec's schema.
+
+    The one place the result schema is defined; zones_frame / retests_frame,
+    stream_detect and universe_detect all build their frames here.
+
+    Parameters:
+      dates: (base dates, retest dates), one per zone, each a date Series or
+        epoch seconds; retest dates are only read where retests["signal"]
+      zones: first_idx, second_idx (positions reported in spec.idx_col),
+        zone_low, zone_high, plus the SCORE_COLUMNS arrays when scored
+      retests: signal, price, retest_idx, invalidated (None: zones only)
+
+    Returns:
+      (zones, retests); without zones (DataFrame([]), DataFrame())
+    """
+    first = np.asarray(zones["first_idx"], dtype=np.int64)
+    second = np.asarray(zones["second_idx"], dtype=np.int64)
+    m = len(first)
+    if m == 0:
+        return pd.DataFrame([]), pd.DataFrame()
+    lows = np.asarray(zones["zone_low"], dtype=np.float64)
+    highs = np.asarray(zones["zone_high"], dtype=np.float64)
+    columns = {"pattern_type": [spec.name] * m} if spec.with_pattern_type else {}
+    columns.update({
+        "date_base": to_dates(dates[0]),
+        spec.low_col: lows,
+        spec.high_col: highs,
+        "zone_height": np.abs(highs - lows),
+        "num_base_candles": second - first - 1,
+        spec.idx_col: second,
+    })
+    if "quality_score" in zones:
+        columns.update({name: zones[name] for name in SCORE_COLUMNS})
+    zones_df = pd.DataFrame(columns)
+    if retests is None:
+        return zones_df, pd.DataFrame()
+    return zones_df, _with_retests(zones_df, dates[1], spec, retests)
+
+
+def zones_frame(df: pd.DataFrame, spec: PatternSpec, zones: Dict[str, np.ndarray]) -> pd.DataFrame:
+    """Zone arrays -> zone DataFrame in the spec's schema (see frames_from_arrays)."""
+    first, second = zones["first_idx"], zones["second_idx"]
+    if "quality_score" in zones:
+        zones = {**zones, "freshness": (len(df) - 1 - second).astype(np.int64)}
+    return frames_from_arrays((df["date"].iloc[first + 1], None), spec, zones)[0]
+
+
+def retests_frame(df: pd.DataFrame, zones: pd.DataFrame, spec: PatternSpec, retests: Dict[str, np.ndarray]) -> pd.DataFrame:
+    """Zone DataFrame + retest arrays -> retest DataFrame in the spec's schema.
+
+    Zones without a retest get NaN price and NaT retest_date.
+    """
+    rows = np.where(np.asarray(retests["signal"], dtype=bool), retests["retest_idx"], 0)
+    return _with_retests(zones, df["date"].iloc[rows], spec, retests)
+
+
+# ---------- DataFrame entry points ----------
+def detect_zones(
+    df: pd.DataFrame,
+    spec: PatternSpec,
+    max_bases: int = 4,
+    body_threshold: float = 0.65,
+    wick_threshold: float = 0.35,
+    backend: str = "python",
+    scores: bool = False,
+) -> pd.DataFrame:
+    """Run the zone scan for `spec` and return zones in the spec's schema.
+
+    backend: "python", "numba" or "auto" (see detector_jit); "numba" falls
+    back to Python when Numba is not installed.
+    scores: add the SCORE_COLUMNS quality measures (see zone_scores).
+    """
+    if df is None or len(df) < 3:
+        return pd.DataFrame([])
+    o, h, l, c = candle_arrays(df)
+    zones, _ = zone_arrays(o, h, l, c, spec, max_bases, body_threshold, wick_threshold, backend, scores=scores)
+    return zones_frame(df, spec, zones)
+
+
+def detect_retests(df: pd.DataFrame, zones: pd.DataFrame, spec: PatternSpec, backend: str = "python") -> pd.DataFrame:
+    """Resolve retests for zones produced by `detect_zones` with the same spec."""
+    _, h, l, _ = candle_arrays(df)
+    arrays = {
+        "zone_low": zones[spec.low_col].to_numpy(dtype=np.float64),
+        "zone_high": zones[spec.high_col].to_numpy(dtype=np.float64),
+        "second_idx": zones[spec.idx_col].to_numpy(dtype=np.int64),
+    }
+    return retests_frame(df, zones, spec, retest_arrays(h, l, arrays, spec, backend))
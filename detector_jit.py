@@ -0,0 +1,208 @@
+"""Optional Numba-compiled kernels for detector_core.
+
+The zone scan is inherently sequential (greedy base collection, then skip to
+j + 1 after a zone) and the retest resolution walks forward per zone, so
+neither vectorizes fully. When Numba is installed these loops are compiled to
+machine code over the same NumPy masks the pure-Python kernel uses; without
+Numba, `AVAILABLE` is False and detector_core keeps using its Python loops.
+
+Install the accelerator with:
+    pip install numba
+
+Select it per call, e.g. `find_pattern(df, "bullish", backend="numba")`, or
+use backend="auto" to take Numba when it is installed.
+"""
+
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:  # optional accelerator
+    numba = None
+
+AVAILABLE = numba is not None
+BACKENDS = ("python", "numba", "auto")
+
+TOUCH_CODES = {"low_in_zone": 0, "high_in_zone": 1, "high_reaches_low": 2}
+BREAK_CODES = {"low_below": 0, "high_above": 1}
+
+
+def resolve_backend(backend: str) -> str:
+    """Map a requested backend to the one that will actually run."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}'. Expected one of {list(BACKENDS)}")
+    if backend == "python" or not AVAILABLE:
+        return "python"
+    return "numba"
+
+
+def _scan_range(first, base, second, lo, n, max_bases, stop_on_incomplete, has_confirm, closes, ref, below,
+                starts, stops, count):
+    resume = -1
+    i = lo
+    while i < n - 2:
+        if not first[i]:
+            i += 1
+            continue
+        j = i + 1
+        while j < n and j - i - 1 < max_bases and base[j]:
+            j += 1
+        if j == i + 1:
+            i += 1
+            continue
+        if j >= n:
+            if resume < 0:
+                resume = i
+            if stop_on_incomplete:
+                break
+            i += 1
+            continue
+        if not second[j]:
+            i += 1
+            continue
+        if has_confirm:
+            if below:
+                if closes[j] >= ref[i]:
+                    i += 1
+                    continue
+            elif closes[j] <= ref[i]:
+                i += 1
+                continue
+        starts[count] = i
+        stops[count] = j
+        count += 1
+        i = j + 1
+    if resume < 0:
+        resume = i
+    return count, resume
+
+
+def _scan_kernel(first, base, second, max_bases, stop_on_incomplete, has_confirm, closes, ref, below):
+    n = first.shape[0]
+    starts = np.empty(n // 2 + 1, dtype=np.int64)
+    stops = np.empty(n // 2 + 1, dtype=np.int64)
+    count, resume = _scan_range(first, base, second, 0, n, max_bases, stop_on_incomplete, has_confirm,
+                                closes, ref, below, starts, stops, 0)
+    return starts[:count], stops[:count], resume
+
+
+def _scan_ragged_kernel(first, base, second, offsets, max_bases, stop_on_incomplete, has_confirm, closes, ref, below):
+    n = first.shape[0]
+    starts = np.empty(n // 2 + 1, dtype=np.int64)
+    stops = np.empty(n // 2 + 1, dtype=np.int64)
+    resumes = np.empty(offsets.shape[0] - 1, dtype=np.int64)
+    count = 0
+    for k in range(offsets.shape[0] - 1):
+        count, resumes[k] = _scan_range(first, base, second, offsets[k], offsets[k + 1], max_bases,
+                                        stop_on_incomplete, has_confirm, closes, ref, below, starts, stops, count)
+    return starts[:count], stops[:count], resumes
+
+
+def _retest_kernel(h, l, zone_low, zone_high, start_idx, end_idx, touch, brk, break_first, price_zone_low):
+    m = zone_low.shape[0]
+    signal = np.zeros(m, dtype=np.bool_)
+    invalid = np.zeros(m, dtype=np.bool_)
+    price = np.full(m, np.nan)
+    retest_idx = np.full(m, -1, dtype=np.int64)
+    for z in range(m):
+        lo = zone_low[z]
+        hi = zone_high[z]
+        for k in range(start_idx[z] + 1, end_idx[z]):
+            if brk == 0:
+                broke = l[k] < lo
+            else:
+                broke = h[k] > hi
+            if break_first and broke:
+                invalid[z] = True
+                break
+            if not signal[z]:
+                if touch == 0:
+                    touched = lo <= l[k] <= hi
+                elif touch == 1:
+                    touched = lo <= h[k] <= hi
+                else:
+                    touched = h[k] >= lo and l[k] >= lo
+                if touched:
+                    signal[z] = True
+                    retest_idx[z] = k
+                    if price_zone_low:
+                        price[z] = lo
+                    elif touch == 0:
+                        price[z] = l[k]
+                    else:
+                        price[z] = h[k]
+                    if break_first:
+                        break
+            if broke:
+                invalid[z] = True
+                break
+    return signal, price, retest_idx, invalid
+
+
+if AVAILABLE:
+    # _scan_range first: the kernels below resolve it when they are compiled
+    _scan_range = numba.njit(cache=True, nogil=True)(_scan_range)
+    _scan_kernel = numba.njit(cache=True, nogil=True)(_scan_kernel)
+    _scan_ragged_kernel = numba.njit(cache=True, nogil=True)(_scan_ragged_kernel)
+    _retest_kernel = numba.njit(cache=True, nogil=True)(_retest_kernel)
+
+
+def scan_zones(
+    first_ok: np.ndarray,
+    base_ok: np.ndarray,
+    second_ok: np.ndarray,
+    max_bases: int,
+    stop_on_incomplete: bool = False,
+    confirm: Optional[Tuple[np.ndarray, np.ndarray, bool]] = None,
+) -> Tuple[List[Tuple[int, int]], int]:
+    """Compiled twin of detector_core.scan_zones (same arguments and result)."""
+    if confirm is None:
+        empty = np.empty(0, dtype=np.float64)
+        closes, ref, below = empty, empty, False
+    else:
+        closes, ref, below = confirm
+    starts, stops, resume = _scan_kernel(
+        np.ascontiguousarray(first_ok), np.ascontiguousarray(base_ok), np.ascontiguousarray(second_ok),
+        int(max_bases), bool(stop_on_incomplete), confirm is not None,
+        np.ascontiguousarray(closes, dtype=np.float64), np.ascontiguousarray(ref, dtype=np.float64), bool(below),
+    )
+    return list(zip(starts.tolist(), stops.tolist())), int(resume)
+
+
+def scan_zones_ragged(
+    first_ok: np.ndarray,
+    base_ok: np.ndarray,
+    second_ok: np.ndarray,
+    offsets: np.ndarray,
+    max_bases: int,
+    stop_on_incomplete: bool = False,
+    confirm: Optional[Tuple[np.ndarray, np.ndarray, bool]] = None,
+) -> Tuple[List[Tuple[int, int]], np.ndarray]:
+    """Compiled twin of detector_core.scan_zones_ragged: every series in one kernel call."""
+    if confirm is None:
+        empty = np.empty(0, dtype=np.float64)
+        closes, ref, below = empty, empty, False
+    else:
+        closes, ref, below = confirm
+    starts, stops, resumes = _scan_ragged_kernel(
+        np.ascontiguousarray(first_ok), np.ascontiguousarray(base_ok), np.ascontiguousarray(second_ok),
+        np.ascontiguousarray(offsets, dtype=np.int64), int(max_bases), bool(stop_on_incomplete),
+        confirm is not None, np.ascontiguousarray(closes, dtype=np.float64),
+        np.ascontiguousarray(ref, dtype=np.float64), bool(below),
+    )
+    return list(zip(starts.tolist(), stops.tolist())), resumes
+
+
+def resolve_retests(h, l, zone_low, zone_high, start_idx, spec, end_idx=None):
+    """Compiled twin of detector_core.resolve_retests (same arguments and result)."""
+    if end_idx is None:
+        end_idx = np.full(len(zone_low), len(h), dtype=np.int64)
+    return _retest_kernel(
+        np.ascontiguousarray(h, dtype=np.float64), np.ascontiguousarray(l, dtype=np.float64),
+        np.ascontiguousarray(zone_low, dtype=np.float64), np.ascontiguousarray(zone_high, dtype=np.float64),
+        np.ascontiguousarray(start_idx, dtype=np.int64), np.ascontiguousarray(end_idx, dtype=np.int64),
+        TOUCH_CODES[spec.touch], BREAK_CODES[spec.breaks],
+        spec.retest_order == "break_first", spec.price == "zone_low",
+    )
@@ -0,0 +1,301 @@
+"""Coordinator / worker mode for scanning the universe on several hosts.
+
+The coordinator splits the security ids into work units of `unit_size`
+securities. It queues them as leased jobs in a shared SQLite queue
+(work_queue.py), on a filesystem every host can reach. Workers on any host:
+
+  - claim one unit at a time under a lease, renewed by a heartbeat thread
+    while the unit runs
+  - fetch and back-adjust the candles, then run detection through zone_cache,
+    exactly like run_analysis
+  - write the unit's rows to the Parquet dataset (results_store.py) under a
+    file name derived from (run id, unit key), then mark the unit done
+
+A worker that dies stops renewing its lease. The coordinator (or any worker)
+puts units with expired leases back to pending, and another worker redoes
+them. Writing the same unit again replaces its files rather than adding
+rows, so a retried unit neither loses nor duplicates zones.
+
+Each run has one spec and threshold set. Without --run-id the run id is
+derived from the run date, spec, thresholds and output directory, so a
+second submit with other settings queues a new run rather than matching the
+units of the first. When some fetches of a unit fail, the rows of the other
+securities are written anyway and the unit is failed back to the queue, to
+be retried up to the queue's max attempts. Once those are used up the unit
+stays failed, with the ids that could not be fetched in its error
+(`WorkQueue.failures`, printed by `coordinate --watch` and `status`).
+
+Example:
+    # on the coordinator (queue and results on a shared mount)
+    python distributed_scan.py coordinate --queue /mnt/scan/queue.sqlite --out-dir /mnt/scan/results --watch
+    # on every worker host
+    python distributed_scan.py work --queue /mnt/scan/queue.sqlite
+"""
+
+import argparse
+import datetime as dt
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+import pandas as pd
+
+from detector_core import SPECS
+from results_store import RESULTS_DIR, write_results
+from work_queue import LEASE_SECONDS, WorkQueue
+
+UNIT_KIND = "unit"
+UNIT_SIZE = 50
+POLL_SECONDS = 10.0
+
+
+def plan_units(security_ids: Sequence[str], unit_size: int = UNIT_SIZE) -> Dict[str, List[str]]:
+    """{unit key: security ids}, in order; keys are stable for the same input."""
+    ids = [str(s) for s in security_ids]
+    return {f"u{k // unit_size:05d}": ids[k:k + unit_size] for k in range(0, len(ids), unit_size)}
+
+
+def default_run_id(run_date: str, spec_name: str, max_bases: int, body_threshold: float,
+                   wick_threshold: float, out_dir: str) -> str:
+    """dist-<run date>-<spec>-<hash of the thresholds and output directory>; equal settings give equal ids."""
+    settings = [spec_name, max_bases, body_threshold, wick_threshold, os.path.abspath(out_dir)]
+    digest = hashlib.sha1(json.dumps(settings).encode()).hexdigest()[:8]
+    return f"dist-{run_date}-{spec_name}-{digest}"
+
+
+def open_queue(path: str, shared: bool = True) -> WorkQueue:
+    """The run queue; rollback journal when the file is shared between hosts (WAL is single-host)."""
+    return WorkQueue(path, journal_mode="DELETE" if shared else "WAL")
+
+
+# ---------- Coordinator ----------
+class Coordinator:
+    """Queues the units of a run and re-queues units of workers that died."""
+
+    def __init__(self, queue: WorkQueue, run_id: Optional[str] = None):
+        self.queue = queue
+        self.fixed_run_id = run_id
+        self.run_id = run_id  # default_run_id(...) of the last submit when not given
+
+    def submit(
+        self,
+        security_ids: Sequence[str],
+        spec_name: str = "RBR_LEGACY",
+        unit_size: int = UNIT_SIZE,
+        out_dir: str = RESULTS_DIR,
+        run_date: Optional[str] = None,
+        max_bases: int = 4,
+        body_threshold: float = 0.65,
+        wick_threshold: float = 0.35,
+        symbol_names: Optional[Dict[str, str]] = None,
+    ) -> int:
+        """Queue the run's units (already queued units are skipped); returns units added."""
+        if spec_name not in SPECS:
+            raise ValueError(f"Unknown spec '{spec_name}'")
+        names = symbol_names or {}
+        run_date = run_date or dt.date.today().isoformat()
+        self.run_id = self.fixed_run_id or default_run_id(
+            run_date, spec_name, max_bases, body_threshold, wick_threshold, out_dir)
+        units = {}
+        for key, ids in plan_units(security_ids, unit_size).items():
+            units[key] = {
+                "security_ids": ids,
+                "symbol_names": {s: names[s] for s in ids if s in names},
+                "spec": spec_name,
+                "max_bases": max_bases,
+                "body_threshold": body_threshold,
+                "wick_threshold": wick_threshold,
+                "run_date": run_date,
+                "out_dir": os.path.abspath(out_dir),
+            }
+        added = self.queue.enqueue_units(units, run_id=self.run_id, kind=UNIT_KIND)
+        print(f"Queued {added} of {len(units)} units for {self.run_id}")
+        return added
+
+    def watch(self, poll_seconds: float = POLL_SECONDS) -> Dict[str, int]:
+        """Re-queue expired leases until no unit is pending or running; returns final counts."""
+        while True:
+            requeued = self.queue.requeue_expired()
+            if requeued:
+                print(f"Re-queued {requeued} units with expired leases")
+            counts = self.queue.counts(self.run_id)
+            print(f"{self.run_id}: {counts}")
+            if counts["pending"] == 0 and counts["running"] == 0:
+                for job in self.queue.failures(self.run_id):
+                    print(f"Failed unit {job['security_id']} after {job['attempts']} attempts: {job['error']}")
+                return counts
+            time.sleep(poll_seconds)
+
+
+# ---------- Worker ----------
+class _Heartbeat:
+    """Renews a lease every lease_seconds / 3 until stopped; `lost` is set if renewal fails."""
+
+    def __init__(self, queue: WorkQueue, job_id: int, owner: str, lease_seconds: float):
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(queue, job_id, owner, lease_seconds), daemon=True)
+
+    def _run(self, queue, job_id, owner, lease_seconds):
+        while not self._stop.wait(lease_seconds / 3):
+            if not queue.renew(job_id, owner, lease_seconds):
+                self.lost.set()
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+class UnitFetchError(RuntimeError):
+    """Some securities of a unit could not be fetched; the unit must be retried, not completed.
+
+    `partial` holds the tagged retests of the securities that were fetched.
+    """
+
+    def __init__(self, failed: Dict[str, str], partial: pd.DataFrame):
+        self.failed = failed
+        self.partial = partial
+        super().__init__(f"fetch failed for {len(failed)} securities: " + ", ".join(sorted(failed)))
+
+
+def scan_unit(payload: dict) -> pd.DataFrame:
+    """Fetch, adjust and analyze the unit's securities; returns their tagged retests.
+
+    Raises UnitFetchError when any fetch failed (after trying the rest of the unit),
+    carrying the rows of the others.
+    """
+    from corporate_actions import adjust_candles
+    from rbr_logic import fetch_for
+    from zone_cache import analyze_cached
+
+    frames = []
+    failed: Dict[str, str] = {}
+    names = payload.get("symbol_names") or {}
+    for sid in payload["security_ids"]:
+        try:
+            df = fetch_for(sid)
+        except Exception as e:
+            print(f"Error fetching for {sid}: {e}")
+            failed[sid] = repr(e)
+            continue
+        if df is None or df.empty:
+            continue
+        df = adjust_candles(sid, df)
+        _, retests = analyze_cached(sid, df, payload["spec"], payload["max_bases"],
+                                    payload["body_threshold"], payload["wick_threshold"])
+        if retests is None or retests.empty:
+            continue
+        out = retests.assign(security_id=sid)
+        if sid in names:
+            out["symbol_name"] = names[sid]
+        frames.append(out)
+    final = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    if failed:
+        raise UnitFetchError(failed, final)
+    return final
+
+
+class Worker:
+    """Claims units from the shared queue and runs them until the queue is empty."""
+
+    def __init__(self, queue: WorkQueue, owner: Optional[str] = None, lease_seconds: float = LEASE_SECONDS):
+        self.queue = queue
+        self.owner = owner or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        self.stats = {"units": 0, "rows": 0, "failed": 0, "retried": 0, "fetch_errors": 0, "lost_leases": 0}
+
+    def run_unit(self, job: dict) -> None:
+        payload = job["payload"]
+        error: Optional[UnitFetchError] = None
+        with _Heartbeat(self.queue, job["id"], self.owner, self.lease_seconds) as beat:
+            try:
+                final = scan_unit(payload)
+            except UnitFetchError as e:
+                # keep what was fetched; a retry rewrites the same files
+                error, final = e, e.partial
+            if beat.lost.is_set():
+                # another worker owns the unit now; its write would replace ours anyway
+                self.stats["lost_leases"] += 1
+                print(f"Lease lost on {job['run_id']}/{job['security_id']}; dropping its results")
+                return
+            if not final.empty:
+                write_results(final, payload["out_dir"], run_date=payload["run_date"],
+                              pattern_type=SPECS[payload["spec"]].name,
+                              basename=f"{job['run_id']}-{job['security_id']}")
+        if error is not None:
+            raise error
+        if self.queue.complete(job["id"], owner=self.owner):
+            self.stats["units"] += 1
+            self.stats["rows"] += len(final)
+
+    def run(self, once: bool = False, poll_seconds: float = POLL_SECONDS) -> Dict[str, int]:
+        """Process units until none are pending (or keep polling unless once); returns stats."""
+        while True:
+            self.queue.requeue_expired()
+            jobs = self.queue.claim(1, kind=UNIT_KIND, owner=self.owner, lease_seconds=self.lease_seconds)
+            if not jobs:
+                if once:
+                    return self.stats
+                time.sleep(poll_seconds)
+                continue
+            job = jobs[0]
+            try:
+                self.run_unit(job)
+            except Exception as e:
+                if isinstance(e, UnitFetchError):
+                    self.stats["fetch_errors"] += len(e.failed)
+                status = self.queue.fail(job["id"], str(e) if isinstance(e, UnitFetchError) else repr(e))
+                self.stats["failed"] += status == "failed"
+                self.stats["retried"] += status == "pending"
+                print(f"Unit {job['security_id']} failed ({status}): {e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distributed universe scan over a shared SQLite queue.")
+    sub = parser.add_subparsers(dest="role", required=True)
+    co = sub.add_parser("coordinate", help="queue a run's units (and optionally watch it)")
+    co.add_argument("--run-id", default=None)
+    co.add_argument("--spec", default="RBR_LEGACY", choices=sorted(SPECS))
+    co.add_argument("--unit-size", type=int, default=UNIT_SIZE)
+    co.add_argument("--max-securities", type=int, default=None)
+    co.add_argument("--out-dir", default=RESULTS_DIR)
+    co.add_argument("--body-threshold", type=float, default=0.65)
+    co.add_argument("--wick-threshold", type=float, default=0.35)
+    co.add_argument("--max-bases", type=int, default=4)
+    co.add_argument("--watch", action="store_true", help="re-queue expired leases until the run finishes")
+    wk = sub.add_parser("work", help="claim and run units")
+    wk.add_argument("--lease", type=float, default=LEASE_SECONDS, help="lease length in seconds")
+    wk.add_argument("--once", action="store_true", help="exit when no unit is pending")
+    st_ = sub.add_parser("status", help="print queue counts")
+    st_.add_argument("--run-id", default=None)
+    for p in (co, wk, st_):
+        p.add_argument("--queue", required=True, help="queue file on a filesystem shared by all hosts")
+    args = parser.parse_args()
+
+    work_queue = open_queue(args.queue)
+    if args.role == "coordinate":
+        from scan_scheduler import _universe
+
+        universe, symbol_names = _universe(args.max_securities)
+        coordinator = Coordinator(work_queue, args.run_id)
+        coordinator.submit(universe, args.spec, args.unit_size, args.out_dir, max_bases=args.max_bases,
+                           body_threshold=args.body_threshold, wick_threshold=args.wick_threshold,
+                           symbol_names=symbol_names)
+        if args.watch:
+            coordinator.watch()
+    elif args.role == "work":
+        print(Worker(work_queue, lease_seconds=args.lease).run(once=args.once))
+    else:
+        print(work_queue.counts(args.run_id))
+        for failed_job in work_queue.failures(args.run_id):
+            print(f"Failed unit {failed_job['run_id']}/{failed_job['security_id']}: {failed_job['error']}")
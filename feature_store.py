@@ -0,0 +1,88 @@
+"""Per-candle feature columns stored next to the cached candles.
+
+Every scan recomputed the same per-candle values: body / size and wick / size
+ratios, candle color, and (for zone scores) the true range and its rolling
+mean. These never change once a candle has closed. The feature store keeps
+them next to the candle store, in the same column-file layout:
+
+    .cache/candles/<security_id>/features/timestamp.i64  body_ratio.f64  wick_ratio.f64
+                                          color.i8  atr.f64  meta.json
+    .cache/candles/<security_id>/features.json          {"digest": ..., "generation": ...}
+
+Features are computed from the series the detectors read, i.e. the
+corporate-action adjusted one (corporate_actions.adjusted_arrays). They use
+the same arithmetic as detector_core.candle_features / average_true_range.
+Bars appended to the candle store are featurized on their own; the ATR
+looks back ATR_PERIOD bars for context. The whole feature set is rebuilt
+when the sidecar no longer matches, i.e. when an action was recorded or
+the raw history was rewritten. Builds and extensions run BUILD_CHUNK_ROWS
+bars at a time, so memory does not grow with the history length. Detectors
+take the memmapped columns through `zone_arrays(..., features=...)`.
+
+Example:
+    >>> from feature_store import feature_arrays
+    >>> feats = feature_arrays("21238")          # builds / extends on first use
+    >>> zones, _ = zone_arrays(o, h, l, c, spec, features=feats)
+"""
+
+import os
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from candle_store import BUILD_CHUNK_ROWS, CandleStore, get_candle_store
+from corporate_actions import adjusted_arrays, get_action_table
+from detector_core import ATR_PERIOD, average_true_range, candle_features
+
+FEATURES = "features"
+SIDECAR = "features.json"
+FEATURE_COLUMNS = {
+    "timestamp": np.dtype("<i8"),
+    "body_ratio": np.dtype("<f8"),
+    "wick_ratio": np.dtype("<f8"),
+    "color": np.dtype("i1"),
+    "atr": np.dtype("<f8"),
+}
+
+
+def compute_features(candles: Dict[str, np.ndarray], start: int = 0, stop: Optional[int] = None) -> pd.DataFrame:
+    """Feature rows for candles[start:stop], with ATR context taken from the bars before `start`."""
+    o, h, l, c = (candles[k] for k in ("open", "high", "low", "close"))
+    feats = candle_features(o[start:stop], h[start:stop], l[start:stop], c[start:stop])
+    # the true range of the first bar of a window has no previous close, so the
+    # window starts one full ATR period early and that bar is never averaged
+    w = start - ATR_PERIOD if start >= ATR_PERIOD else 0
+    atr = average_true_range(h[w:stop], l[w:stop], c[w:stop])[start - w:]
+    return pd.DataFrame({"timestamp": candles["timestamp"][start:stop], **feats, "atr": atr}, copy=False)
+
+
+def feature_arrays(security_id: str, store: Optional[CandleStore] = None, table=None,
+                   candles: Optional[Dict[str, np.ndarray]] = None) -> Dict[str, np.ndarray]:
+    """Memmapped feature columns of a stored security, building / extending them if needed.
+
+    candles: the (adjusted) candle arrays, when the caller already has them.
+    """
+    store = store or get_candle_store()
+    table = table or get_action_table()
+    security_id = str(security_id)
+    if candles is None:
+        candles = adjusted_arrays(security_id, store, table)
+    n = len(candles["timestamp"])
+    feats = CandleStore(os.path.join(store.root, security_id), FEATURE_COLUMNS)
+    source = {"digest": table.digest(security_id), "generation": store.meta(security_id).get("generation", 0)}
+    rows = feats.rows(FEATURES)
+    fresh = store.read_sidecar(security_id, SIDECAR) == source and rows <= n and (
+        rows == 0 or feats.last_timestamp(FEATURES) == int(candles["timestamp"][rows - 1]))
+
+    if n == 0:
+        return {col: np.empty(0, dtype=dtype) for col, dtype in FEATURE_COLUMNS.items()}
+    if not fresh:
+        store.write_sidecar(security_id, SIDECAR, {})  # a rebuild cut short is not taken as fresh
+        feats.replace(FEATURES, compute_features(candles, 0, BUILD_CHUNK_ROWS))
+        rows = min(n, BUILD_CHUNK_ROWS)
+    for start in range(rows, n, BUILD_CHUNK_ROWS):
+        feats.append(FEATURES, compute_features(candles, start, start + BUILD_CHUNK_ROWS))
+    if not fresh:
+        store.write_sidecar(security_id, SIDECAR, source)
+    return feats.arrays(FEATURES)
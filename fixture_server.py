@@ -0,0 +1,307 @@
+"""Local stand-in for the Dhan endpoints used by fetch_for and the token manager.
+
+Serves the two contracts the code depends on:
+  POST .../charts/historical  {"securityId", "exchangeSegment", "instrument", "fromDate", "toDate"}
+                              -> {"open": [...], "high": [...], "low": [...], "close": [...],
+                                  "volume": [...], "timestamp": [...]}
+  POST .../RenewToken         -> {"accessToken": <JWT valid for 24h>, "expiryTime": ...}
+
+Candles come from recorded responses (<fixtures>/<segment>_<securityId>.json)
+when present, else from a deterministic synthetic daily series seeded by the
+security id. A given bar therefore has the same values in every run and for
+every requested date range.
+
+Realism knobs: per-request latency (+ jitter), a random 500 error rate, and a
+server-side rate limit that answers 429 with Retry-After. In record mode
+(--record --upstream https://api.dhan.co/v2) requests are forwarded with the
+caller's headers, and successful responses are written to the fixtures
+directory for later replay.
+
+Point the code at it through the environment (see config.py):
+    python fixture_server.py --port 8765 --latency-ms 80 --jitter-ms 40 --error-rate 0.01 --rate-limit 10
+    DHAN_API_URL=http://127.0.0.1:8765/v2/charts/historical \\
+    DHAN_TOKEN_RENEWAL_URL=http://127.0.0.1:8765/v2/RenewToken python rbr_logic.py
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+SYNTHETIC_START = "2015-01-01"
+TIMEZONE = "Asia/Kolkata"
+TOKEN_KEY = "fixture-server-signing-key-not-secret"
+MAX_CACHED_SERIES = 256
+
+
+def synthetic_series(security_id: str, start: str = SYNTHETIC_START, end: Optional[str] = None) -> Dict[str, np.ndarray]:
+    """Deterministic weekday candles for `security_id` from `start` to `end` (default: today)."""
+    days = pd.bdate_range(start, end or pd.Timestamp.now(tz=TIMEZONE).date().isoformat())
+    n = len(days)
+    seed = int.from_bytes(hashlib.blake2b(str(security_id).encode(), digest_size=8).digest(), "little")
+    rng = np.random.default_rng(seed)
+    base = 20 + (seed % 3000)
+    close = base * np.exp(np.cumsum(rng.normal(0.0002, 0.018, n)))
+    open_ = np.r_[close[0], close[:-1]] * np.exp(rng.normal(0, 0.006, n))
+    hi = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.008, n)))
+    lo = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.008, n)))
+    stamps = days.tz_localize(TIMEZONE).as_unit("s").asi8
+    return {
+        "open": open_.round(2),
+        "high": hi.round(2),
+        "low": lo.round(2),
+        "close": close.round(2),
+        "volume": rng.integers(10_000, 5_000_000, n).astype(np.float64),
+        "timestamp": stamps.astype(np.int64),
+    }
+
+
+def _slice(series: Dict[str, np.ndarray], from_date: str, to_date: str) -> Dict[str, list]:
+    lo = int(pd.Timestamp(from_date, tz=TIMEZONE).timestamp())
+    hi = int((pd.Timestamp(to_date, tz=TIMEZONE) + pd.Timedelta(days=1)).timestamp())
+    ts = np.asarray(series["timestamp"], dtype=np.int64)
+    keep = (ts >= lo) & (ts < hi)
+    return {k: np.asarray(v)[keep].tolist() for k, v in series.items()}
+
+
+def fixture_token(ttl_seconds: int = 86400) -> str:
+    """A JWT with an `exp` claim (rbr_logic decodes it without verifying the signature)."""
+    import jwt
+
+    now = int(time.time())
+    return jwt.encode({"iat": now, "exp": now + ttl_seconds, "iss": "fixture"}, TOKEN_KEY, algorithm="HS256")
+
+
+class FixtureState:
+    """Shared configuration, rate-limit bucket, series cache and counters."""
+
+    def __init__(self, fixtures_dir: str = FIXTURES_DIR, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 error_rate: float = 0.0, rate_limit: Optional[float] = None, seed: int = 0,
+                 record: bool = False, upstream: Optional[str] = None):
+        self.fixtures_dir = fixtures_dir
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.record = record
+        self.upstream = upstream.rstrip("/") if upstream else None
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._bucket = {"tokens": rate_limit or 0.0, "updated": time.time()}
+        self._series: "OrderedDict[str, dict]" = OrderedDict()
+        self.counts = {"requests": 0, "ok": 0, "throttled": 0, "errors": 0, "recorded": 0, "renewals": 0}
+
+    def count(self, key: str) -> None:
+        with self._lock:
+            self.counts[key] += 1
+
+    def delay(self) -> float:
+        with self._lock:
+            jitter = self._rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(0.0, self.latency_ms + jitter) / 1000.0
+
+    def throttled(self) -> bool:
+        if not self.rate_limit:
+            return False
+        with self._lock:
+            now = time.time()
+            b = self._bucket
+            b["tokens"] = min(self.rate_limit, b["tokens"] + (now - b["updated"]) * self.rate_limit)
+            b["updated"] = now
+            if b["tokens"] >= 1:
+                b["tokens"] -= 1
+                return False
+            return True
+
+    def failed(self) -> bool:
+        if not self.error_rate:
+            return False
+        with self._lock:
+            return self._rng.random() < self.error_rate
+
+    def _fixture_path(self, segment: str, security_id: str) -> str:
+        return os.path.join(self.fixtures_dir, f"{segment}_{security_id}.json")
+
+    def series(self, segment: str, security_id: str) -> Dict[str, np.ndarray]:
+        key = f"{segment}_{security_id}"
+        with self._lock:
+            hit = self._series.get(key)
+            if hit is not None:
+                self._series.move_to_end(key)
+                return hit
+        path = self._fixture_path(segment, security_id)
+        if os.path.exists(path):
+            with open(path) as f:
+                series = {k: np.asarray(v) for k, v in json.load(f).items() if isinstance(v, list)}
+        else:
+            series = synthetic_series(security_id)
+        with self._lock:
+            self._series[key] = series
+            while len(self._series) > MAX_CACHED_SERIES:
+                self._series.popitem(last=False)
+        return series
+
+    def save_recording(self, segment: str, security_id: str, data: dict) -> None:
+        """Merge a real response into the fixture file (bars keyed by timestamp)."""
+        os.makedirs(self.fixtures_dir, exist_ok=True)
+        path = self._fixture_path(segment, security_id)
+        with self._lock:
+            merged: Dict[int, dict] = {}
+            if os.path.exists(path):
+                with open(path) as f:
+                    old = json.load(f)
+                for k, ts in enumerate(old.get("timestamp", [])):
+                    merged[int(ts)] = {c: old[c][k] for c in old if isinstance(old[c], list)}
+            for k, ts in enumerate(data.get("timestamp", [])):
+                merged[int(ts)] = {c: data[c][k] for c in data if isinstance(data[c], list)}
+            cols = sorted({c for bar in merged.values() for c in bar})
+            out = {c: [merged[ts].get(c) for ts in sorted(merged)] for c in cols}
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(out, f)
+            os.replace(tmp, path)
+            self._series.pop(f"{segment}_{security_id}", None)
+            self.counts["recorded"] += 1
+
+
+def _make_handler(state: FixtureState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, status: int, body: dict, headers: Optional[Dict[str, str]] = None) -> None:
+            raw = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/stats"):
+                self._send(200, dict(state.counts))
+            else:
+                self._send(404, {"errorMessage": "not found"})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0) or 0)
+            raw = self.rfile.read(length) if length else b""
+            state.count("requests")
+            path = self.path.rstrip("/")
+
+            if not self.headers.get("access-token"):
+                self._send(401, {"errorType": "Invalid_Authentication", "errorMessage": "missing access-token"})
+                return
+            if state.record and state.upstream:
+                self._proxy(path, raw)
+                return
+
+            time.sleep(state.delay())
+            if state.throttled():
+                state.count("throttled")
+                self._send(429, {"errorType": "Rate_Limit", "errorMessage": "Too many requests"}, {"Retry-After": "1"})
+                return
+            if state.failed():
+                state.count("errors")
+                self._send(500, {"errorType": "Server", "errorMessage": "Injected fixture error"})
+                return
+
+            if path.endswith("/RenewToken"):
+                state.count("renewals")
+                token = fixture_token()
+                self._send(200, {"accessToken": token, "expiryTime": int(time.time()) + 86400})
+            elif path.endswith("/charts/historical"):
+                try:
+                    req = json.loads(raw or b"{}")
+                    series = state.series(req.get("exchangeSegment", "NSE_EQ"), str(req["securityId"]))
+                    body = _slice(series, req["fromDate"], req["toDate"])
+                except (KeyError, ValueError) as e:
+                    self._send(400, {"errorType": "Input_Exception", "errorMessage": f"bad request: {e}"})
+                    return
+                state.count("ok")
+                self._send(200, body)
+            else:
+                self._send(404, {"errorMessage": "not found"})
+
+        def _proxy(self, path: str, raw: bytes) -> None:
+            import requests
+
+            suffix = "/charts/historical" if path.endswith("/charts/historical") else "/RenewToken"
+            headers = {k: v for k, v in self.headers.items() if k.lower() in ("access-token", "dhanclientid", "content-type")}
+            try:
+                resp = requests.post(state.upstream + suffix, data=raw, headers=headers, timeout=30)
+            except requests.RequestException as e:
+                self._send(502, {"errorMessage": f"upstream error: {e}"})
+                return
+            try:
+                body = resp.json()
+            except ValueError:
+                body = {"errorMessage": resp.text}
+            if resp.status_code == 200 and suffix == "/charts/historical":
+                req = json.loads(raw or b"{}")
+                state.save_recording(req.get("exchangeSegment", "NSE_EQ"), str(req.get("securityId")), body)
+            extra = {"Retry-After": resp.headers["Retry-After"]} if "Retry-After" in resp.headers else None
+            self._send(resp.status_code, body, extra)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def start_fixture_server(host: str = "127.0.0.1", port: int = 0, **options) -> ThreadingHTTPServer:
+    """Start the server on a daemon thread; options are FixtureState's. Returns the server.
+
+    Example:
+        >>> server = start_fixture_server(latency_ms=50, rate_limit=20)
+        >>> base = f"http://127.0.0.1:{server.server_address[1]}/v2"
+        >>> server.state.counts
+    """
+    state = FixtureState(**options)
+    server = ThreadingHTTPServer((host, port), _make_handler(state))
+    server.daemon_threads = True
+    server.state = state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline stand-in for the Dhan historical and token endpoints.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fixtures", default=FIXTURES_DIR, help="directory of recorded responses")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    parser.add_argument("--rate-limit", type=float, default=None, help="requests/second before 429s")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--record", action="store_true", help="forward to --upstream and save responses")
+    parser.add_argument("--upstream", default="https://api.dhan.co/v2")
+    args = parser.parse_args()
+
+    srv = start_fixture_server(
+        args.host, args.port, fixtures_dir=args.fixtures, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate, rate_limit=args.rate_limit, seed=args.seed,
+        record=args.record, upstream=args.upstream,
+    )
+    base = f"http://{args.host}:{srv.server_address[1]}/v2"
+    print(f"Fixture server on {base} ({'recording from ' + args.upstream if args.record else 'replay/synthetic'})")
+    print(f"  DHAN_API_URL={base}/charts/historical")
+    print(f"  DHAN_TOKEN_RENEWAL_URL={base}/RenewToken")
+    try:
+        while True:
+            time.sleep(60)
+            print(f"stats: {srv.state.counts}")
+    except KeyboardInterrupt:
+        srv.shutdown()
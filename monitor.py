@@ -0,0 +1,481 @@
+"""Continuous monitoring loop for the supply/demand pattern detectors.
+
+Bars are pulled from a pluggable feed and pushed, one bar at a time, into
+per-security incremental detectors running on an asyncio event loop. Each
+detector reproduces `patterns_logic.find_pattern` + `find_retests_*` without
+re-scanning history: it keeps only the unfinished tail of the base scan and
+the zones that are still open (not yet invalidated).
+
+Events are published on a bounded asyncio.Queue, so a slow consumer applies
+backpressure to the feed instead of letting events pile up in memory:
+  - "zone"        a new zone was confirmed by its continuation candle
+  - "retest"      price came back into an open zone (buy/sell signal)
+  - "invalidated" price broke through an open zone; the zone is dropped
+
+Feeds:
+  - ReplayFeed:      CSV/JSONL bar file (or in-memory frames) for testing
+  - SocketFeed:      newline-delimited JSON bars over a local TCP socket
+  - DhanPollingFeed: polls the Dhan historical API through `fetch_for`
+
+Example (replay a file and print events):
+    python monitor.py --replay bars.csv --direction bullish --direction rbd
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+from typing import AsyncIterator, Dict, Iterable, List, Optional
+
+import pandas as pd
+
+from detector_core import DIRECTION_SPECS, spec_for_direction
+
+# Per-bar processing budget for one bar of the whole watched universe
+# (2,000 symbols x one direction). Batches slower than this are reported.
+LATENCY_BUDGET_MS = 200.0
+DEFAULT_QUEUE_SIZE = 10000
+LATENCY_WINDOW = 10000  # latency percentiles cover the most recent batches only
+
+BAR_FIELDS = ("security_id", "timestamp", "open", "high", "low", "close")
+
+
+def to_local_time(ts: int) -> pd.Timestamp:
+    """Convert an epoch-seconds bar timestamp to the app's Asia/Kolkata time."""
+    return pd.Timestamp(int(ts), unit="s", tz="UTC").tz_convert("Asia/Kolkata")
+
+
+# ---------- Incremental detector ----------
+class IncrementalDetector:
+    """Bar-by-bar equivalent of find_pattern + find_retests_* for one security.
+
+    Only the bars from the current scan position onward are kept (at most
+    `max_bases + 2` in steady state), plus the open zones. Zone indices in the
+    emitted events are global bar indices, matching `continuation_idx` of a
+    whole-series `find_pattern` run.
+    """
+
+    def __init__(
+        self,
+        security_id: str,
+        direction: str = "bullish",
+        max_bases: int = 4,
+        body_threshold: float = 0.65,
+        wick_threshold: float = 0.35,
+    ):
+        spec = spec_for_direction(direction)
+        if spec is None:
+            raise ValueError(f"Unknown direction '{direction}'. Expected one of {list(DIRECTION_SPECS)}")
+        self.security_id = str(security_id)
+        self.direction = direction
+        self.max_bases = max_bases
+        self.body_threshold = body_threshold
+        self.wick_threshold = wick_threshold
+        self.spec = spec
+        self.pattern_type = spec.name
+
+        self._bars = deque()    # (timestamp, open, high, low, close) from scan position on
+        self._offset = 0        # global index of self._bars[0]
+        self._i = 0             # global scan position
+        self.n = 0              # bars seen so far
+        self.open_zones = []    # dicts: zone_low, zone_high, continuation_idx, signal, ...
+
+    # ----- candle classification (same arithmetic as patterns_logic helpers) -----
+    def _ratios(self, bar):
+        _, o, h, l, c = bar
+        size = max(h - l, 1e-9)
+        body = abs(c - o)
+        wick = (h - max(o, c)) + (min(o, c) - l)
+        return body / size, wick / size
+
+    def _is_impulse(self, bar, color: int) -> bool:
+        _, o, _, _, c = bar
+        if color > 0 and not c > o:
+            return False
+        if color < 0 and not o > c:
+            return False
+        body_ratio, wick_ratio = self._ratios(bar)
+        return not (body_ratio < self.body_threshold or wick_ratio > self.wick_threshold)
+
+    def _is_base(self, bar) -> bool:
+        body_ratio, wick_ratio = self._ratios(bar)
+        return body_ratio <= self.wick_threshold and wick_ratio >= self.body_threshold
+
+    def _bar(self, idx: int):
+        return self._bars[idx - self._offset]
+
+    # ----- scanning -----
+    def _try_decide(self):
+        """Decide the scan position. Returns None when more bars are needed,
+        ("skip",) when the position holds no zone, or ("zone", j) on success."""
+        i = self._i
+        if i >= self.n:
+            return None
+        c1 = self._bar(i)
+        if not self._is_impulse(c1, self.spec.first):
+            return ("skip",)
+
+        j = i + 1
+        while j - i - 1 < self.max_bases:
+            if j >= self.n:
+                return None
+            if not self._is_base(self._bar(j)):
+                break
+            j += 1
+        if j == i + 1:
+            return ("skip",)
+        if j >= self.n:
+            return None
+
+        c2 = self._bar(j)
+        if not self._is_impulse(c2, self.spec.second):
+            return ("skip",)
+        if self.spec.confirm == "below_first_low" and c2[4] >= c1[3]:
+            return ("skip",)
+        if self.spec.confirm == "above_first_high" and c2[4] <= c1[2]:
+            return ("skip",)
+        return ("zone", j)
+
+    def _make_zone(self, j: int) -> dict:
+        bases = [self._bar(k) for k in range(self._i + 1, j)]
+        if self.spec.zone_high == "body_top":
+            zone_high = max(max(b[1], b[4]) for b in bases)
+        else:
+            zone_high = max(b[2] for b in bases)
+        if self.spec.zone_low == "low":
+            zone_low = min(b[3] for b in bases)
+        else:
+            zone_low = min(min(b[1], b[4]) for b in bases)
+        return {
+            "pattern_type": self.pattern_type,
+            "base_timestamp": bases[0][0],
+            "zone_low": float(zone_low),
+            "zone_high": float(zone_high),
+            "zone_height": float(abs(zone_high - zone_low)),
+            "num_base_candles": len(bases),
+            "continuation_idx": j,
+            "signal": False,
+        }
+
+    def _check_zone(self, zone: dict, idx: int, bar, events: List[dict]) -> bool:
+        """Apply the retest/break rules of find_retests_* to one bar.
+        Returns False once the zone is invalidated."""
+        ts, _, high, low, _ = bar
+        price = low if self.spec.touch == "low_in_zone" else high
+        low_edge, high_edge = zone["zone_low"], zone["zone_high"]
+        if not zone["signal"] and low_edge <= price <= high_edge:
+            zone["signal"] = True
+            events.append(self._event("retest", zone, idx, ts, price))
+        broken = low < low_edge if self.spec.breaks == "low_below" else high > high_edge
+        if broken:
+            events.append(self._event("invalidated", zone, idx, ts, price))
+            return False
+        return True
+
+    def _event(self, kind: str, zone: dict, idx: int, ts: int, price: Optional[float]) -> dict:
+        return {
+            "type": kind,
+            "security_id": self.security_id,
+            "pattern_type": zone["pattern_type"],
+            "zone_low": zone["zone_low"],
+            "zone_high": zone["zone_high"],
+            "base_timestamp": zone["base_timestamp"],
+            "continuation_idx": zone["continuation_idx"],
+            "bar_idx": idx,
+            "bar_timestamp": ts,
+            "price": price,
+        }
+
+    def update(self, timestamp: int, open_: float, high: float, low: float, close: float) -> List[dict]:
+        """Feed one closed bar; returns the events it produced (possibly empty)."""
+        bar = (int(timestamp), float(open_), float(high), float(low), float(close))
+        idx = self.n
+        self._bars.append(bar)
+        self.n += 1
+        events: List[dict] = []
+
+        # Existing zones first: a zone only starts retest scanning after its
+        # continuation candle, so zones confirmed by this bar must not see it.
+        if self.open_zones:
+            self.open_zones = [z for z in self.open_zones if self._check_zone(z, idx, bar, events)]
+
+        while True:
+            decision = self._try_decide()
+            if decision is None:
+                break
+            if decision[0] == "skip":
+                self._i += 1
+            else:
+                j = decision[1]
+                zone = self._make_zone(j)
+                events.append(self._event("zone", zone, j, self._bar(j)[0], None))
+                # catch the new zone up on bars that arrived after its continuation
+                alive = True
+                for k in range(j + 1, self.n):
+                    if not self._check_zone(zone, k, self._bar(k), events):
+                        alive = False
+                        break
+                if alive:
+                    self.open_zones.append(zone)
+                self._i = j + 1
+            while self._offset < min(self._i, self.n):
+                self._bars.popleft()
+                self._offset += 1
+        return events
+
+
+# ---------- Feeds ----------
+class ReplayFeed:
+    """Replays bars from a CSV/JSONL file (or in-memory frames) grouped by timestamp.
+
+    The file needs columns security_id, timestamp (epoch seconds), open, high,
+    low, close. `speed` is the wall-clock delay in seconds between bar batches
+    (0 replays as fast as the consumer allows).
+    """
+
+    def __init__(self, path: Optional[str] = None, frames: Optional[Dict[str, pd.DataFrame]] = None, speed: float = 0.0):
+        if path is None and frames is None:
+            raise ValueError("ReplayFeed needs a file path or a dict of candle frames")
+        self.path = path
+        self.frames = frames
+        self.speed = speed
+
+    def _load(self) -> pd.DataFrame:
+        if self.frames is not None:
+            parts = []
+            for sid, df in self.frames.items():
+                part = df[["timestamp", "open", "high", "low", "close"]].copy()
+                part["security_id"] = str(sid)
+                parts.append(part)
+            bars = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=list(BAR_FIELDS))
+        elif self.path.endswith((".jsonl", ".json")):
+            bars = pd.read_json(self.path, lines=True, dtype={"security_id": str})
+        else:
+            bars = pd.read_csv(self.path, dtype={"security_id": str})
+        missing = [c for c in BAR_FIELDS if c not in bars.columns]
+        if missing:
+            raise ValueError(f"Replay data is missing columns {missing}")
+        return bars.sort_values(["timestamp", "security_id"], kind="stable")
+
+    async def batches(self) -> AsyncIterator[List[tuple]]:
+        bars = self._load()
+        cols = [bars[c].to_numpy() for c in BAR_FIELDS]
+        ts = cols[1]
+        start = 0
+        n = len(bars)
+        while start < n:
+            stop = start
+            while stop < n and ts[stop] == ts[start]:
+                stop += 1
+            yield [tuple(col[k] for col in cols) for k in range(start, stop)]
+            start = stop
+            await asyncio.sleep(self.speed)
+
+
+class SocketFeed:
+    """Reads newline-delimited JSON bars from a local TCP socket.
+
+    Each line is an object with the BAR_FIELDS keys. Consecutive lines with the
+    same timestamp form one batch; a batch is flushed when the timestamp changes
+    or the stream goes idle for `flush_after` seconds.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 9009, flush_after: float = 0.05):
+        self.host = host
+        self.port = port
+        self.flush_after = flush_after
+
+    async def batches(self) -> AsyncIterator[List[tuple]]:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        batch: List[tuple] = []
+        try:
+            while True:
+                try:
+                    line = await asyncio.wait_for(reader.readline(), timeout=self.flush_after)
+                except asyncio.TimeoutError:
+                    if batch:
+                        yield batch
+                        batch = []
+                    continue
+                if not line:
+                    break
+                rec = json.loads(line)
+                bar = tuple(rec[f] if f != "security_id" else str(rec[f]) for f in BAR_FIELDS)
+                if batch and bar[1] != batch[-1][1]:
+                    yield batch
+                    batch = []
+                batch.append(bar)
+            if batch:
+                yield batch
+        finally:
+            writer.close()
+
+
+class DhanPollingFeed:
+    """Polls the Dhan historical endpoint and yields bars newer than the last seen.
+
+    Fetches run in the default thread pool so the event loop keeps processing
+    while requests are in flight.
+    """
+
+    def __init__(self, security_ids: Iterable[str], interval: float = 60.0, lookback_days: int = 5):
+        self.security_ids = [str(s) for s in security_ids]
+        self.interval = interval
+        self.lookback_days = lookback_days
+        self._last_seen: Dict[str, int] = {}
+
+    def _poll_one(self, sid: str) -> List[tuple]:
+        from rbr_logic import fetch_for
+
+        to_date = pd.Timestamp.today().date()
+        from_date = to_date - pd.Timedelta(days=self.lookback_days)
+        try:
+            df = fetch_for(sid, from_date=from_date.isoformat(), to_date=to_date.isoformat())
+        except Exception as e:
+            print(f"Error polling {sid}: {e}")
+            return []
+        if df is None or df.empty:
+            return []
+        last = self._last_seen.get(sid, -1)
+        new = df[df["timestamp"] > last]
+        if not new.empty:
+            self._last_seen[sid] = int(new["timestamp"].iloc[-1])
+        return [(sid, int(r.timestamp), r.open, r.high, r.low, r.close) for r in new.itertuples(index=False)]
+
+    async def batches(self) -> AsyncIterator[List[tuple]]:
+        loop = asyncio.get_running_loop()
+        while True:
+            results = await asyncio.gather(*(loop.run_in_executor(None, self._poll_one, sid) for sid in self.security_ids))
+            bars = sorted((b for res in results for b in res), key=lambda b: b[1])
+            if bars:
+                yield bars
+            await asyncio.sleep(self.interval)
+
+
+# ---------- Monitor loop ----------
+class Monitor:
+    """Drives incremental detectors from a feed and publishes events to a queue.
+
+    Parameters:
+      feed: object with an async `batches()` generator yielding lists of bars
+      directions: pattern directions to track per security
+      queue_size: bound of the event queue (producer waits when it is full)
+      latency_budget_ms: per-batch processing budget reported in `stats()`
+    """
+
+    def __init__(
+        self,
+        feed,
+        directions: Iterable[str] = ("bullish",),
+        max_bases: int = 4,
+        body_threshold: float = 0.65,
+        wick_threshold: float = 0.35,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        latency_budget_ms: float = LATENCY_BUDGET_MS,
+    ):
+        self.feed = feed
+        self.directions = list(directions)
+        self.params = dict(max_bases=max_bases, body_threshold=body_threshold, wick_threshold=wick_threshold)
+        self.events: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.latency_budget_ms = latency_budget_ms
+        self.detectors: Dict[str, List[IncrementalDetector]] = {}
+        self._latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        self._batches = 0
+        self._over_budget = 0
+        self._bars_processed = 0
+
+    def _detectors_for(self, sid: str) -> List[IncrementalDetector]:
+        dets = self.detectors.get(sid)
+        if dets is None:
+            dets = [IncrementalDetector(sid, d, **self.params) for d in self.directions]
+            self.detectors[sid] = dets
+        return dets
+
+    def process_batch(self, bars: List[tuple]) -> List[dict]:
+        """Run one batch of bars through the detectors (synchronous, CPU only)."""
+        started = time.perf_counter()
+        out: List[dict] = []
+        for sid, ts, o, h, l, c in bars:
+            for det in self._detectors_for(sid):
+                out.extend(det.update(ts, o, h, l, c))
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        self._latencies.append(elapsed_ms)
+        self._batches += 1
+        self._bars_processed += len(bars)
+        if elapsed_ms > self.latency_budget_ms:
+            self._over_budget += 1
+            print(f"Batch of {len(bars)} bars took {elapsed_ms:.1f} ms (budget {self.latency_budget_ms:.0f} ms)")
+        return out
+
+    async def run(self) -> None:
+        """Consume the feed until it is exhausted; a final None marks the end of events."""
+        try:
+            async for bars in self.feed.batches():
+                for event in self.process_batch(bars):
+                    await self.events.put(event)
+        finally:
+            await self.events.put(None)
+
+    def stats(self) -> Dict[str, float]:
+        lat = sorted(self._latencies)
+        if not lat:
+            return {"batches": 0, "bars": 0}
+        return {
+            "batches": self._batches,
+            "bars": self._bars_processed,
+            "p50_ms": lat[len(lat) // 2],
+            "p99_ms": lat[min(len(lat) - 1, int(len(lat) * 0.99))],
+            "max_ms": lat[-1],
+            "over_budget": self._over_budget,
+            "queue_depth": self.events.qsize(),
+        }
+
+
+async def _print_events(monitor: Monitor) -> None:
+    while True:
+        event = await monitor.events.get()
+        if event is None:
+            break
+        when = to_local_time(event["bar_timestamp"]).date()
+        price = f" @ {event['price']:.2f}" if event["price"] is not None else ""
+        print(f"{when} {event['type']:<11} {event['security_id']:>8} {event['pattern_type']} "
+              f"[{event['zone_low']:.2f}, {event['zone_high']:.2f}]{price}")
+
+
+async def _main(args) -> None:
+    if args.replay:
+        feed = ReplayFeed(args.replay, speed=args.speed)
+    elif args.socket:
+        host, _, port = args.socket.partition(":")
+        feed = SocketFeed(host or "127.0.0.1", int(port or 9009))
+    else:
+        feed = DhanPollingFeed(args.security_id, interval=args.interval)
+    monitor = Monitor(
+        feed,
+        directions=args.direction or ["bullish"],
+        max_bases=args.max_bases,
+        body_threshold=args.body,
+        wick_threshold=args.wick,
+        queue_size=args.queue_size,
+    )
+    await asyncio.gather(monitor.run(), _print_events(monitor))
+    print(f"Monitor stats: {monitor.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the pattern detectors continuously over a bar feed.")
+    parser.add_argument("--replay", help="CSV/JSONL bar file to replay")
+    parser.add_argument("--socket", help="host:port serving newline-delimited JSON bars")
+    parser.add_argument("--security-id", action="append", default=[], help="security id to poll from the Dhan API")
+    parser.add_argument("--interval", type=float, default=60.0, help="Dhan polling interval in seconds")
+    parser.add_argument("--speed", type=float, default=0.0, help="delay between replayed batches in seconds")
+    parser.add_argument("--direction", action="append", choices=list(DIRECTION_SPECS))
+    parser.add_argument("--max-bases", type=int, default=4)
+    parser.add_argument("--body", type=float, default=0.65, help="body threshold (fraction)")
+    parser.add_argument("--wick", type=float, default=0.35, help="wick threshold (fraction)")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE)
+    args = parser.parse_args()
+    if not (args.replay or args.socket or args.security_id):
+        parser.error("one of --replay, --socket or --security-id is required")
+    asyncio.run(_main(args))
@@ -0,0 +1,269 @@
+"""Parallel whole-universe scan with shared-memory result aggregation.
+
+A process pool that returned a retest DataFrame per security would pickle
+thousands of small frames back to the parent and concatenate them there.
+Instead each worker:
+
+  - loads its chunk of securities from the candle store (memmapped,
+    corporate-action adjusted) with their stored per-candle features
+  - runs zone_arrays / retest_arrays on plain NumPy arrays (no DataFrames)
+  - writes the chunk's result columns once, back to back, into a
+    SharedMemory segment it creates, and returns only the segment name and
+    the column layout
+
+The parent maps each segment and wraps the numeric columns as Arrow arrays
+over the shared buffers (no copy). It combines the chunks with
+pa.concat_tables (no copy) and hands the table to results_store.write_table,
+the same Parquet writer run_analysis uses. Only the bit-packed boolean
+columns and the null bitmaps are newly allocated.
+
+Example:
+    python parallel_scan.py --workers 8 --spec RBR_LEGACY
+"""
+
+import argparse
+import datetime as dt
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from candle_store import STORE_DIR, CandleStore
+from corporate_actions import adjusted_arrays
+from detector_core import SPECS, retest_arrays, zone_arrays
+from feature_store import feature_arrays
+from results_store import RESULTS_DIR, RUN_BASENAME, TIMEZONE, write_table
+
+# per-zone columns written by workers, in buffer order
+LAYOUT = [
+    ("security", np.int32),
+    ("date_base", np.int64),
+    ("zone_low", np.float64),
+    ("zone_high", np.float64),
+    ("num_base_candles", np.int64),
+    ("second_idx", np.int64),
+    ("signal", np.bool_),
+    ("price", np.float64),
+    ("retest_date", np.int64),
+    ("invalidated", np.bool_),
+]
+CHUNK_SIZE = 64
+
+
+def _untrack(shm: shared_memory.SharedMemory) -> None:
+    """Hand ownership of a worker-created segment to the parent (which unlinks it)."""
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+
+
+def _scan_chunk(store_dir: str, offset: int, security_ids: List[str], spec_name: str,
+                max_bases: int, body_threshold: float, wick_threshold: float, backend: str) -> Optional[dict]:
+    """Worker: scan a chunk of securities and publish its zones in one shared segment."""
+    store = CandleStore(store_dir)
+    spec = SPECS[spec_name]
+    parts: Dict[str, list] = {name: [] for name, _ in LAYOUT}
+    for k, sid in enumerate(security_ids):
+        a = adjusted_arrays(sid, store)
+        ts = a["timestamp"]
+        if len(ts) < 3:
+            continue
+        o, h, l, c = a["open"], a["high"], a["low"], a["close"]
+        features = feature_arrays(sid, store, candles=a)
+        zones, _ = zone_arrays(o, h, l, c, spec, max_bases, body_threshold, wick_threshold, backend,
+                               features=features)
+        m = len(zones["first_idx"])
+        if m == 0:
+            continue
+        r = retest_arrays(h, l, zones, spec, backend)
+        parts["security"].append(np.full(m, offset + k, dtype=np.int32))
+        parts["date_base"].append(ts[zones["first_idx"] + 1])
+        parts["zone_low"].append(zones["zone_low"])
+        parts["zone_high"].append(zones["zone_high"])
+        parts["num_base_candles"].append(zones["second_idx"] - zones["first_idx"] - 1)
+        parts["second_idx"].append(zones["second_idx"])
+        parts["signal"].append(r["signal"])
+        parts["price"].append(r["price"])
+        parts["retest_date"].append(ts[np.where(r["signal"], r["retest_idx"], 0)])
+        parts["invalidated"].append(r["invalidated"])
+    if not parts["security"]:
+        return None
+
+    n = sum(len(p) for p in parts["security"])
+    layout, size = [], 0
+    for name, dtype in LAYOUT:
+        size = -(-size // 8) * 8  # 8-byte align every column
+        layout.append((name, np.dtype(dtype).str, size))
+        size += n * np.dtype(dtype).itemsize
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    _untrack(shm)
+    for (name, dtype, start) in layout:
+        view = np.ndarray((n,), dtype=dtype, buffer=shm.buf, offset=start)
+        np.concatenate(parts[name], out=view, casting="unsafe")
+        del view
+    shm.close()
+    return {"name": shm.name, "rows": n, "layout": layout}
+
+
+def _wrap(values: np.ndarray, valid: Optional[np.ndarray] = None) -> pa.Array:
+    """Arrow array over `values`' memory (no copy); `valid` becomes the null bitmap."""
+    bitmap = None if valid is None else pa.array(valid).buffers()[1]
+    return pa.Array.from_buffers(pa.from_numpy_dtype(values.dtype), len(values), [bitmap, pa.py_buffer(values)])
+
+
+class ScanResults:
+    """Arrow table over the workers' shared segments; call close() when done."""
+
+    def __init__(self, spec_name: str, security_ids: Sequence[str], symbol_names: Optional[Dict[str, str]] = None):
+        self.spec = SPECS[spec_name]
+        self.security_ids = [str(s) for s in security_ids]
+        self.symbol_names = symbol_names or {}
+        self._segments: List[shared_memory.SharedMemory] = []
+        self._tables: List[pa.Table] = []
+
+    def add_chunk(self, meta: dict) -> None:
+        shm = shared_memory.SharedMemory(name=meta["name"])
+        self._segments.append(shm)
+        n = meta["rows"]
+        cols = {name: np.ndarray((n,), dtype=dtype, buffer=shm.buf, offset=start)
+                for name, dtype, start in meta["layout"]}
+        self._tables.append(self._chunk_table(cols))
+
+    def _chunk_table(self, cols: Dict[str, np.ndarray]) -> pa.Table:
+        spec = self.spec
+        codes = _wrap(cols["security"])
+        signal = cols["signal"]
+        out = {
+            "security_id": pa.DictionaryArray.from_arrays(codes, pa.array(self.security_ids, pa.string())),
+        }
+        if self.symbol_names:
+            names = [self.symbol_names.get(s) for s in self.security_ids]
+            out["symbol_name"] = pa.DictionaryArray.from_arrays(codes, pa.array(names, pa.string()))
+        out.update({
+            "date_base": _wrap(cols["date_base"]),
+            spec.low_col: _wrap(cols["zone_low"]),
+            spec.high_col: _wrap(cols["zone_high"]),
+            "num_base_candles": _wrap(cols["num_base_candles"]),
+            spec.idx_col: _wrap(cols["second_idx"]),
+            f"{spec.signal_prefix}_signal": pa.array(signal),
+            f"{spec.signal_prefix}_price": _wrap(cols["price"], signal),
+            "retest_date": _wrap(cols["retest_date"], signal),
+            "invalidated": pa.array(cols["invalidated"]),
+        })
+        if "zone_height" not in spec.retest_drop:
+            out["zone_height"] = pa.array(np.abs(cols["zone_high"] - cols["zone_low"]))
+        for name in spec.retest_drop:
+            out.pop(name, None)
+        return pa.table(out)
+
+    def table(self, run_date: Optional[str] = None) -> pa.Table:
+        """All chunks as one (chunked) table in results_store's schema, plus partition keys."""
+        if not self._tables:
+            return pa.table({})
+        table = pa.concat_tables(self._tables)
+        n = table.num_rows
+        run_date = run_date or dt.date.today().isoformat()
+        table = table.append_column("run_date", pa.array(np.full(n, run_date, dtype=object), pa.string()))
+        return table.append_column("pattern_type", pa.array(np.full(n, self.spec.name, dtype=object), pa.string()))
+
+    def close(self) -> None:
+        self._tables.clear()
+        for shm in self._segments:
+            try:
+                shm.close()
+            except BufferError:  # a caller still holds a view; the segment is unlinked anyway
+                pass
+            shm.unlink()
+        self._segments.clear()
+
+
+def parallel_scan(
+    security_ids: Sequence[str],
+    spec_name: str = "RBR_LEGACY",
+    workers: Optional[int] = None,
+    store_dir: str = STORE_DIR,
+    max_bases: int = 4,
+    body_threshold: float = 0.65,
+    wick_threshold: float = 0.35,
+    backend: str = "python",
+    symbol_names: Optional[Dict[str, str]] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> ScanResults:
+    """Scan stored candles of `security_ids` on a process pool; returns ScanResults."""
+    security_ids = [str(s) for s in security_ids]
+    results = ScanResults(spec_name, security_ids, symbol_names)
+    chunks = [(k, security_ids[k:k + chunk_size]) for k in range(0, len(security_ids), chunk_size)]
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = [pool.submit(_scan_chunk, store_dir, k, ids, spec_name, max_bases,
+                               body_threshold, wick_threshold, backend) for k, ids in chunks]
+        pending = list(futures)
+        try:
+            while pending:
+                meta = pending[0].result()
+                pending.pop(0)
+                if meta is not None:
+                    results.add_chunk(meta)
+        except BaseException:
+            results.close()
+            for fut in pending:  # segments of chunks that finished but were never mapped
+                if fut.cancel() or fut.exception() is not None or fut.result() is None:
+                    continue
+                try:
+                    shared_memory.SharedMemory(name=fut.result()["name"]).unlink()
+                except FileNotFoundError:
+                    pass
+            raise
+    return results
+
+
+def run_parallel_analysis(
+    security_ids: Sequence[str],
+    spec_name: str = "RBR_LEGACY",
+    workers: Optional[int] = None,
+    out_dir: Optional[str] = RESULTS_DIR,
+    out_csv: Optional[str] = None,
+    run_date: Optional[str] = None,
+    **scan_kwargs,
+) -> int:
+    """parallel_scan + the same Parquet (and optional CSV) output as run_analysis; returns rows."""
+    results = parallel_scan(security_ids, spec_name, workers, **scan_kwargs)
+    table = None
+    try:
+        table = results.table(run_date)
+        rows = table.num_rows
+        if rows == 0:
+            print("No zones detected for any security IDs.")
+            return 0
+        if out_dir:
+            # same file stem as run_analysis: a rerun of the run date replaces it
+            write_table(table, out_dir, basename=RUN_BASENAME)
+            print(f"Saved aggregated results to {out_dir} (rows={rows})")
+        if out_csv:
+            final = table.drop_columns(["run_date", "pattern_type"]).to_pandas()
+            for col in ("date_base", "retest_date"):
+                final[col] = pd.to_datetime(final[col], unit="s", utc=True).dt.tz_convert(TIMEZONE)
+            final.to_csv(out_csv, index=False)
+            print(f"Saved aggregated results to {out_csv} (rows={rows})")
+        return rows
+    finally:
+        del table
+        results.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scan every security in the candle store on a process pool.")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--spec", default="RBR_LEGACY", choices=sorted(SPECS))
+    parser.add_argument("--backend", default="python")
+    parser.add_argument("--out-csv", default=None)
+    args = parser.parse_args()
+
+    ids = CandleStore(STORE_DIR).securities()
+    print(f"Scanning {len(ids)} securities with {args.workers or os.cpu_count()} workers ...")
+    run_parallel_analysis(ids, args.spec, args.workers, out_csv=args.out_csv, backend=args.backend)
@@ -1,6 +1,9 @@
 # patterns_logic.py
 import pandas as pd
 from rbr_logic import fetch_for
+from detector_core import DIRECTION_SPECS, SPECS, detect_retests, detect_zones, spec_for_direction
+from zone_cache import analyze_cached
+from corporate_actions import adjust_candles
 from typing import Optional, Tuple
 
 # ------------------------
@@ -29,7 +32,9 @@ def find_pattern(
     direction: str = "bullish",
     max_bases: int = 4,
     body_threshold: float = 0.65,
-    wick_threshold: float = 0.35
+    wick_threshold: float = 0.35,
+    backend: str = "python",
+    scores: bool = False
 ) -> pd.DataFrame:
     """
     Detect RBR (bullish), DBD (bearish), RBD (bearish), and DBR (bullish) patterns.
@@ -39,292 +44,42 @@ def find_pattern(
       - "bearish" -> DBD (Drop-Base-Drop)    (supply)
       - "rbd"     -> RBD (Rally-Base-Drop)   (supply)
       - "dbr"     -> DBR (Drop-Base-Rally)   (demand)
-    """
-    zones = []
-    n = len(df)
-    i = 0
-
-    while i < n - 2:
-        c1 = df.iloc[i]
-        size1 = candle_size(c1)
-        body1 = candle_body(c1)
-        wick1 = wick_sum(c1)
-
-        # ---------- RBR / DBD (existing) ----------
-        if direction in ("bullish", "bearish"):
-            if direction == "bullish":
-                if not is_bullish(c1) or body1 / size1 < body_threshold or wick1 / size1 > wick_threshold:
-                    i += 1
-                    continue
-            else:
-                if not is_bearish(c1) or body1 / size1 < body_threshold or wick1 / size1 > wick_threshold:
-                    i += 1
-                    continue
-
-            bases = []
-            j = i + 1
-            while j < n and len(bases) < max_bases:
-                cb = df.iloc[j]
-                s = candle_size(cb)
-                b = candle_body(cb)
-                w = wick_sum(cb)
-                if (b / s) <= wick_threshold and (w / s) >= body_threshold:
-                    bases.append(cb)
-                    j += 1
-                else:
-                    break
-
-            if not bases or j >= n:
-                i += 1
-                continue
-
-            c2 = df.iloc[j]
-            size2 = candle_size(c2)
-            body2 = candle_body(c2)
-            wick2 = wick_sum(c2)
-
-            if direction == "bullish":
-                if not is_bullish(c2) or body2 / size2 < body_threshold or wick2 / size2 > wick_threshold:
-                    i += 1
-                    continue
-            else:
-                if not is_bearish(c2) or body2 / size2 < body_threshold or wick2 / size2 > wick_threshold:
-                    i += 1
-                    continue
-
-            if direction == "bullish":
-                zone_high = max(max(b.open, b.close) for b in bases)
-                zone_low = min(b.low for b in bases)
-                pattern_type = "RBR"
-            else:
-                zone_high = max(b.high for b in bases)
-                zone_low = min(min(b.open, b.close) for b in bases)
-                pattern_type = "DBD"
-
-            zone_height = abs(zone_high - zone_low)
-            date_base = bases[0].date
-
-            zones.append({
-                "pattern_type": pattern_type,
-                "date_base": date_base,
-                "zone_low": float(zone_low),
-                "zone_high": float(zone_high),
-                "zone_height": float(zone_height),
-                "num_base_candles": len(bases),
-                "continuation_idx": j
-            })
-
-            i = j + 1
-            continue
-
-        # ---------- RBD (Rally-Base-Drop) ----------
-        if direction == "rbd":
-            if not is_bullish(c1) or body1 / size1 < body_threshold or wick1 / size1 > wick_threshold:
-                i += 1
-                continue
-
-            bases = []
-            j = i + 1
-            while j < n and len(bases) < max_bases:
-                cb = df.iloc[j]
-                s = candle_size(cb)
-                b = candle_body(cb)
-                w = wick_sum(cb)
-                if (b / s) <= wick_threshold and (w / s) >= body_threshold:
-                    bases.append(cb)
-                    j += 1
-                else:
-                    break
-
-            if not bases or j >= n:
-                i += 1
-                continue
-
-            c2 = df.iloc[j]
-            size2 = candle_size(c2)
-            body2 = candle_body(c2)
-            wick2 = wick_sum(c2)
-
-            if not is_bearish(c2) or body2 / size2 < body_threshold or wick2 / size2 > wick_threshold:
-                i += 1
-                continue
-
-            if float(c2.close) >= float(c1.low):
-                i += 1
-                continue
-
-            zone_high = max(b.high for b in bases)
-            zone_low = min(min(b.open, b.close) for b in bases)
-            zone_height = abs(zone_high - zone_low)
-            date_base = bases[0].date
-
-            zones.append({
-                "pattern_type": "RBD",
-                "date_base": date_base,
-                "zone_low": float(zone_low),
-                "zone_high": float(zone_high),
-                "zone_height": float(zone_height),
-                "num_base_candles": len(bases),
-                "continuation_idx": j
-            })
-
-            i = j + 1
-            continue
-
-        # ---------- DBR (Drop-Base-Rally) - NEW ----------
-        if direction == "dbr":
-            # first candle: Drop (red)
-            if not is_bearish(c1) or body1 / size1 < body_threshold or wick1 / size1 > wick_threshold:
-                i += 1
-                continue
 
-            # gather base candles
-            bases = []
-            j = i + 1
-            while j < n and len(bases) < max_bases:
-                cb = df.iloc[j]
-                s = candle_size(cb)
-                b = candle_body(cb)
-                w = wick_sum(cb)
-                if (b / s) <= wick_threshold and (w / s) >= body_threshold:
-                    bases.append(cb)
-                    j += 1
-                else:
-                    break
-
-            if not bases or j >= n:
-                i += 1
-                continue
-
-            # Rally candle
-            c2 = df.iloc[j]
-            size2 = candle_size(c2)
-            body2 = candle_body(c2)
-            wick2 = wick_sum(c2)
-
-            if not is_bullish(c2) or body2 / size2 < body_threshold or wick2 / size2 > wick_threshold:
-                i += 1
-                continue
-
-            # Rally close must be above Drop high
-            if float(c2.close) <= float(c1.high):
-                i += 1
-                continue
-
-            # demand zone
-            zone_low = min(b.low for b in bases)
-            zone_high = max(max(b.open, b.close) for b in bases)
-            zone_height = abs(zone_high - zone_low)
-            date_base = bases[0].date
-
-            zones.append({
-                "pattern_type": "DBR",
-                "date_base": date_base,
-                "zone_low": float(zone_low),
-                "zone_high": float(zone_high),
-                "zone_height": float(zone_height),
-                "num_base_candles": len(bases),
-                "continuation_idx": j
-            })
-
-            i = j + 1
-            continue
-
-        i += 1
-
-    return pd.DataFrame(zones)
+    The scan itself lives in detector_core; see SPECS there for the rules.
+    backend: "python" (default), "numba" or "auto" - compiled scan loops
+    from detector_jit, falling back to Python when Numba is not installed.
+    scores: add quality columns (freshness, impulse_strength, base_tightness,
+    departure_distance, height_atr, quality_score), computed in the same pass.
+    """
+    spec = spec_for_direction(direction)
+    if spec is None:
+        return pd.DataFrame([])
+    return detect_zones(df, spec, max_bases, body_threshold, wick_threshold, backend=backend, scores=scores)
 
 # ------------------------
 # Retests
 # ------------------------
-def find_retests_rbr(df, zones):
+def _retests(df, zones, name, backend="python"):
     if zones is None or zones.empty:
         return pd.DataFrame()
-    results = []
-    n = len(df)
-    for _, zone in zones.iterrows():
-        low = zone["zone_low"]
-        high = zone["zone_high"]
-        idx = int(zone["continuation_idx"])
-        signal = invalid = False
-        price = date = None
-        for i in range(idx + 1, n):
-            c = df.iloc[i]
-            if not signal and low <= c.low <= high:
-                signal = True; price = c.low; date = c.date
-            if c.low < low: invalid = True; break
-        z = zone.to_dict()
-        z.update({"buy_signal": signal, "buy_price": price, "retest_date": date, "invalidated": invalid})
-        results.append(z)
-    return pd.DataFrame(results)
+    return detect_retests(df, zones, SPECS[name], backend=backend)
 
-def find_retests_dbd(df, zones):
-    if zones is None or zones.empty:
-        return pd.DataFrame()
-    results = []
-    n = len(df)
-    for _, zone in zones.iterrows():
-        low = zone["zone_low"]
-        high = zone["zone_high"]
-        idx = int(zone["continuation_idx"])
-        signal = invalid = False
-        price = date = None
-        for i in range(idx + 1, n):
-            c = df.iloc[i]
-            if not signal and low <= c.high <= high:
-                signal = True; price = c.high; date = c.date
-            if c.high > high: invalid = True; break
-        z = zone.to_dict()
-        z.update({"sell_signal": signal, "sell_price": price, "retest_date": date, "invalidated": invalid})
-        results.append(z)
-    return pd.DataFrame(results)
+def find_retests_rbr(df, zones, backend="python"):
+    return _retests(df, zones, "RBR", backend)
 
-def find_retests_rbd(df, zones):
-    if zones is None or zones.empty:
-        return pd.DataFrame()
-    results = []
-    n = len(df)
-    for _, zone in zones.iterrows():
-        low = zone["zone_low"]
-        high = zone["zone_high"]
-        idx = int(zone["continuation_idx"])
-        signal = invalid = False
-        price = date = None
-        for i in range(idx + 1, n):
-            c = df.iloc[i]
-            if not signal and low <= c.high <= high:
-                signal = True; price = c.high; date = c.date
-            if c.high > high: invalid = True; break
-        z = zone.to_dict()
-        z.update({"sell_signal": signal, "sell_price": price, "retest_date": date, "invalidated": invalid})
-        results.append(z)
-    return pd.DataFrame(results)
+def find_retests_dbd(df, zones, backend="python"):
+    return _retests(df, zones, "DBD", backend)
 
-def find_retests_dbr(df, zones):
+def find_retests_rbd(df, zones, backend="python"):
+    return _retests(df, zones, "RBD", backend)
+
+def find_retests_dbr(df, zones, backend="python"):
     """
     Retest scanning for DBR (demand zones)
     - Buy when any future candle.low enters the demand zone
     - Invalidate when any candle.low breaks below the demand zone low
     """
-    if zones is None or zones.empty:
-        return pd.DataFrame()
-    results = []
-    n = len(df)
-    for _, zone in zones.iterrows():
-        low = zone["zone_low"]
-        high = zone["zone_high"]
-        idx = int(zone["continuation_idx"])
-        signal = invalid = False
-        price = date = None
-        for i in range(idx + 1, n):
-            c = df.iloc[i]
-            if not signal and low <= c.low <= high:
-                signal = True; price = c.low; date = c.date
-            if c.low < low: invalid = True; break
-        z = zone.to_dict()
-        z.update({"buy_signal": signal, "buy_price": price, "retest_date": date, "invalidated": invalid})
-        results.append(z)
-    return pd.DataFrame(results)
+    return _retests(df, zones, "DBR", backend)
 
 # ------------------------
 # Entry wrapper
@@ -334,25 +89,41 @@ def analyze_security_patterns(
     direction: str,
     body_threshold: float = 0.65,
     wick_threshold: float = 0.35,
-    max_bases: int = 4
+    max_bases: int = 4,
+    backend: str = "python",
+    use_cache: bool = True
 ) -> Tuple[Optional[pd.DataFrame], pd.DataFrame]:
+    """Fetch candles and return (df, retests) for one security and direction.
+
+    With use_cache, zones/retests come from zone_cache: unchanged candles are
+    served from the cache and appended bars only re-scan the series tail.
+    """
     try:
         df = fetch_for(security_id)
         if df is None or df.empty:
             return None, pd.DataFrame()
+        # back-adjust for recorded splits / bonus issues before detecting
+        df = adjust_candles(security_id, df)
+
+        if use_cache:
+            spec_name = DIRECTION_SPECS.get(direction)
+            if spec_name is None:
+                return df, pd.DataFrame()
+            _, retests = analyze_cached(security_id, df, spec_name, max_bases, body_threshold, wick_threshold, backend)
+            return df, retests
 
-        zones = find_pattern(df, direction, max_bases, body_threshold, wick_threshold)
+        zones = find_pattern(df, direction, max_bases, body_threshold, wick_threshold, backend=backend)
         if zones is None or zones.empty:
             return df, pd.DataFrame()
 
         if direction == "bullish":
-            retests = find_retests_rbr(df, zones)
+            retests = find_retests_rbr(df, zones, backend)
         elif direction == "bearish":
-            retests = find_retests_dbd(df, zones)
+            retests = find_retests_dbd(df, zones, backend)
         elif direction == "rbd":
-            retests = find_retests_rbd(df, zones)
+            retests = find_retests_rbd(df, zones, backend)
         elif direction == "dbr":
-            retests = find_retests_dbr(df, zones)
+            retests = find_retests_dbr(df, zones, backend)
         else:
             retests = pd.DataFrame()
         return df, retests
@@ -0,0 +1,173 @@
+"""Cold-start prewarming for app.py.
+
+After a restart (e.g. on Streamlit Community Cloud) the first user paid for
+the scrip master parse, the token check and cold API fetches before seeing a
+result. The Prewarmer runs these steps once per process, on a background
+thread, while the first page renders:
+
+  1. scrip_index  load (or build) the scrip master index (scrip_index.py)
+  2. token        import rbr_logic and validate the access token, renewing it
+                  when it is about to expire
+  3. watchlist    analyze the most-viewed symbols through the shared batch
+                  analyzer. This fetches their candles, fills zone_cache and
+                  leaves the results in the analyzer's store (batch_analysis.py).
+
+The app's single analysis reads from that same store. A prewarmed symbol is
+therefore served without a fetch, and a symbol being warmed right now is
+joined rather than fetched twice. A symbol still queued for warming is
+analyzed on the analyzer's interactive pool, so the user does not wait for
+the watchlist ahead of it. `status()` reports per-stage progress; `ready` is set
+when all stages have finished (failed stages included: prewarming never
+blocks the app).
+
+The watchlist comes from PREWARM_WATCHLIST: comma-separated security ids,
+or a file with one id per line (default: watchlist.txt next to app.py, if
+present). PREWARM_DIRECTIONS (default "bullish") picks the pattern
+directions to precompute at the default thresholds.
+
+Example:
+    >>> from prewarm import get_prewarmer
+    >>> warm = get_prewarmer()          # starts the thread on first call
+    >>> warm.wait(timeout=30)
+    >>> warm.status()
+    {'ready': True, 'stages': {'scrip_index': 'done', 'token': 'done', 'watchlist': 'done'}, ...}
+"""
+
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+from scrip_index import DEFAULT_CSV, load_scrip_index
+
+WATCHLIST_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "watchlist.txt")
+STAGES = ("scrip_index", "token", "watchlist")
+WATCHLIST_TIMEOUT = 300.0
+
+
+def read_watchlist(spec: Optional[str] = None) -> List[str]:
+    """Security ids from PREWARM_WATCHLIST (ids or a file path), else from watchlist.txt."""
+    spec = spec if spec is not None else os.getenv("PREWARM_WATCHLIST")
+    if spec is None:
+        spec = WATCHLIST_FILE if os.path.exists(WATCHLIST_FILE) else ""
+    if os.path.isfile(spec):
+        with open(spec) as f:
+            items = [line.split("#", 1)[0] for line in f]
+    else:
+        items = spec.split(",")
+    return [item.strip() for item in items if item.strip()]
+
+
+class Prewarmer:
+    """Background warm-up of the scrip index, the token and a watchlist's analyses."""
+
+    def __init__(
+        self,
+        csv_path: str = DEFAULT_CSV,
+        watchlist: Sequence[str] = (),
+        directions: Sequence[str] = ("bullish",),
+        body_threshold: float = 0.65,
+        wick_threshold: float = 0.35,
+        max_bases: int = 4,
+    ):
+        self.csv_path = csv_path
+        self.watchlist = [str(s) for s in watchlist]
+        self.directions = list(directions)
+        self.thresholds = (body_threshold, wick_threshold, max_bases)
+        self.ready = threading.Event()
+        self.index = None
+        self._stages: Dict[str, str] = {name: "pending" for name in STAGES}
+        self._errors: Dict[str, str] = {}
+        self._warmed = 0
+        self._started: Optional[float] = None
+        self._finished: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> "Prewarmer":
+        """Start the warm-up thread (once)."""
+        with self._lock:
+            if self._thread is None:
+                self._started = time.time()
+                self._thread = threading.Thread(target=self._run, name="prewarm", daemon=True)
+                self._thread.start()
+        return self
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self.ready.wait(timeout)
+
+    # ----- stages -----
+    def _stage(self, name: str, step) -> None:
+        self._stages[name] = "running"
+        try:
+            step()
+            if self._stages[name] == "running":
+                self._stages[name] = "done"
+        except Exception as e:
+            self._stages[name] = "failed"
+            self._errors[name] = str(e)
+            print(f"Prewarm {name} failed: {e}")
+
+    def _load_index(self) -> None:
+        if not os.path.exists(self.csv_path):
+            self._stages["scrip_index"] = "skipped"
+            return
+        self.index = load_scrip_index(self.csv_path)
+
+    def _check_token(self) -> None:
+        from rbr_logic import get_current_token, is_token_expired
+
+        if is_token_expired(get_current_token()):
+            raise RuntimeError("access token is expired and could not be renewed")
+
+    def _warm_watchlist(self) -> None:
+        from batch_analysis import get_batch_analyzer
+
+        analyzer = get_batch_analyzer()
+        symbols = {sid: sid for sid in self.watchlist}
+        jobs = [analyzer.submit(symbols, direction, *self.thresholds) for direction in self.directions]
+        deadline = time.time() + WATCHLIST_TIMEOUT
+        for job in jobs:
+            while not job.done() and time.time() < deadline:
+                job.wait(timeout=1.0)
+                self._warmed = sum(j.completed() for j in jobs)
+        self._warmed = sum(j.completed() for j in jobs)
+
+    def _run(self) -> None:
+        try:
+            self._stage("scrip_index", self._load_index)
+            self._stage("token", self._check_token)
+            if self.watchlist and self.directions:
+                self._stage("watchlist", self._warm_watchlist)
+            else:
+                self._stages["watchlist"] = "skipped"
+        finally:
+            self._finished = time.time()
+            self.ready.set()
+            print(f"Prewarm finished in {self._finished - self._started:.1f}s: {self._stages}")
+
+    def status(self) -> dict:
+        """Readiness, per-stage state (pending/running/done/failed/skipped) and watchlist progress."""
+        end = self._finished or time.time()
+        return {
+            "ready": self.ready.is_set(),
+            "stages": dict(self._stages),
+            "errors": dict(self._errors),
+            "warmed": self._warmed,
+            "total": len(self.watchlist) * len(self.directions),
+            "elapsed_s": round(end - self._started, 1) if self._started else 0.0,
+        }
+
+
+_prewarmer: Optional[Prewarmer] = None
+_prewarmer_lock = threading.Lock()
+
+
+def get_prewarmer(csv_path: str = DEFAULT_CSV) -> Prewarmer:
+    """Process-wide Prewarmer, started on first call (shared across Streamlit reruns and sessions)."""
+    global _prewarmer
+    with _prewarmer_lock:
+        if _prewarmer is None:
+            directions = [d.strip() for d in os.getenv("PREWARM_DIRECTIONS", "bullish").split(",") if d.strip()]
+            _prewarmer = Prewarmer(csv_path, read_watchlist(), directions).start()
+        return _prewarmer
@@ -0,0 +1,195 @@
+"""Adaptive (AIMD) rate limiter for the Dhan API.
+
+A token bucket whose refill rate is learned from the responses:
+  - until the first 429, each successful response grows the rate by 10%
+    (slow start); afterwards the rate grows by about `increase` req/s per
+    second of successful traffic (additive increase)
+  - a 429 multiplies the rate by `decrease` and pauses all callers until the
+    Retry-After time (or one request interval) has passed
+  - 5xx responses and responses slower than `latency_target` shrink the rate
+    gently (x `soft_decrease`), without the pause
+
+Callers reserve a slot and sleep for the returned delay, so the same limiter
+serves threads (`acquire`) and asyncio tasks (`acquire_async`; the reservation
+takes locks and may do file I/O, so it runs in the default executor rather
+than on the event loop). Pass `state_path` to share the bucket between
+processes: the state is kept in a small JSON file guarded by an exclusive file
+lock (POSIX only; elsewhere the limiter stays per-process).
+
+tests/test_rate_limiter.py checks the pacing and the 429 backoff against a
+local mock server that throttles above a fixed ceiling.
+
+Example:
+    >>> limiter = AdaptiveRateLimiter(rate=5.0)
+    >>> limiter.acquire()
+    >>> limiter.record(resp.status_code, latency, parse_retry_after(resp.headers.get("Retry-After")))
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process sharing
+    fcntl = None
+
+DEFAULT_RATE = 5.0
+MIN_RATE = 0.2
+MAX_RATE = 50.0
+
+
+class AdaptiveRateLimiter:
+    """AIMD token bucket shared by threads, asyncio tasks and (optionally) processes."""
+
+    def __init__(
+        self,
+        rate: float = DEFAULT_RATE,
+        min_rate: float = MIN_RATE,
+        max_rate: float = MAX_RATE,
+        burst: float = 1.0,
+        increase: float = 0.5,
+        decrease: float = 0.5,
+        soft_decrease: float = 0.9,
+        latency_target: float = 2.0,
+        state_path: Optional[str] = None,
+    ):
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase = increase
+        self.decrease = decrease
+        self.soft_decrease = soft_decrease
+        self.latency_target = latency_target
+        if state_path and fcntl is None:
+            print("Cross-process rate limiting needs fcntl; using a per-process limiter.")
+            state_path = None
+        self.state_path = state_path
+        self._lock = threading.Lock()
+        self._state = self._initial_state(rate)
+        if state_path and not os.path.exists(state_path):
+            with self._locked() as state:
+                state.update(self._initial_state(rate))
+
+    def _initial_state(self, rate: float) -> Dict[str, float]:
+        return {
+            "rate": float(min(max(rate, self.min_rate), self.max_rate)),
+            "tokens": float(self.burst),
+            "updated": time.time(),
+            "backoff_until": 0.0,
+            "threshold": float(self.max_rate),
+            "requests": 0,
+            "throttled": 0,
+            "errors": 0,
+            "slow": 0,
+            "latency_ewma": 0.0,
+        }
+
+    @contextmanager
+    def _locked(self):
+        """Yield the mutable state dict under the thread (and file) lock."""
+        with self._lock:
+            if not self.state_path:
+                yield self._state
+                return
+            with open(self.state_path, "a+") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.seek(0)
+                    raw = f.read()
+                    state = dict(self._state)
+                    if raw:
+                        try:
+                            state.update(json.loads(raw))
+                        except ValueError:
+                            pass
+                    yield state
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(state))
+                    f.flush()
+                    self._state = state
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    # ----- acquiring -----
+    def reserve(self) -> float:
+        """Take one request slot; returns how long the caller must wait first."""
+        with self._locked() as s:
+            now = time.time()
+            rate = s["rate"]
+            s["tokens"] = min(self.burst, s["tokens"] + (now - s["updated"]) * rate)
+            s["updated"] = now
+            s["tokens"] -= 1.0
+            wait = 0.0 if s["tokens"] >= 0 else -s["tokens"] / rate
+            wait = max(wait, s["backoff_until"] - now)
+            s["requests"] += 1
+            return wait
+
+    def acquire(self) -> float:
+        """Block the calling thread until a request may be sent; returns the wait."""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self) -> float:
+        """asyncio version of acquire; the reservation runs off the event loop."""
+        wait = await asyncio.get_running_loop().run_in_executor(None, self.reserve)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    # ----- feedback -----
+    def record(self, status_code: int, latency: float, retry_after: Optional[float] = None) -> None:
+        """Feed back the outcome of one request."""
+        with self._locked() as s:
+            now = time.time()
+            ewma = s["latency_ewma"]
+            s["latency_ewma"] = latency if ewma == 0 else 0.8 * ewma + 0.2 * latency
+            rate = s["rate"]
+            if status_code == 429:
+                s["throttled"] += 1
+                # requests already in flight when the first 429 arrived must
+                # not shrink the rate again; one decrease per backoff window
+                if now >= s["backoff_until"]:
+                    rate *= self.decrease
+                    s["threshold"] = rate
+                pause = retry_after if retry_after is not None else 1.0 / max(rate, self.min_rate)
+                s["backoff_until"] = max(s["backoff_until"], now + pause)
+                s["tokens"] = min(s["tokens"], 0.0)
+            elif status_code >= 500:
+                s["errors"] += 1
+                rate *= self.soft_decrease
+            elif latency > self.latency_target:
+                s["slow"] += 1
+                rate *= self.soft_decrease
+            elif rate < s["threshold"]:
+                rate *= 1.1
+            else:
+                rate += self.increase / rate
+            s["rate"] = min(max(rate, self.min_rate), self.max_rate)
+
+    def metrics(self) -> Dict[str, float]:
+        """Current rate, backoff and counters (a snapshot)."""
+        with self._locked() as s:
+            out = dict(s)
+        out["backoff_remaining"] = max(0.0, out.pop("backoff_until") - time.time())
+        out.pop("updated", None)
+        out.pop("threshold", None)
+        return out
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After header in seconds (HTTP-date form is ignored)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
@@ -6,6 +6,14 @@ import os
 import sys
 from typing import Optional, Dict, Any, Tuple
 
+from detector_core import SPECS, detect_retests, detect_zones
+from zone_cache import analyze_cached
+from scrip_index import load_scrip_index
+from rate_limiter import AdaptiveRateLimiter, parse_retry_after
+from results_store import RESULTS_DIR, write_results
+from corporate_actions import adjust_candles
+from zone_diff import ZoneDiffer
+
 # Import configuration
 try:
     from config import (INITIAL_ACCESS_TOKEN, DHAN_CLIENT_ID, API_URL, TOKEN_RENEWAL_URL,
@@ -73,6 +81,18 @@ FROM_DATE = "2021-01-01"
 # Default TO_DATE to today's date in YYYY-MM-DD format
 TO_DATE = date.today().isoformat()
 
+# Shared adaptive limiter for every Dhan API call made through fetch_for.
+# DHAN_RATE_LIMIT sets the starting rate (req/s); DHAN_RATE_LIMIT_STATE names a
+# state file to share the learned rate between processes.
+_rate_limiter = AdaptiveRateLimiter(
+    rate=float(os.getenv("DHAN_RATE_LIMIT", "5")),
+    state_path=os.getenv("DHAN_RATE_LIMIT_STATE") or None,
+)
+
+def get_rate_limiter() -> AdaptiveRateLimiter:
+    """The limiter pacing fetch_for; use .metrics() for current rate / backoff."""
+    return _rate_limiter
+
 def get_headers() -> Dict[str, str]:
     """Get the current headers with a fresh access token."""
     return {
@@ -88,6 +108,7 @@ def fetch_for(
     instrument: str = INSTRUMENT,
     headers: Optional[Dict[str, str]] = None,
     timeout: Optional[float] = 10.0,
+    max_retries: int = 3,
 ) -> pd.DataFrame:
     """Fetch historical candles for a single security_id and return a DataFrame.
 
@@ -106,6 +127,8 @@ def fetch_for(
       exchange / instrument: API parameters (defaults from module config)
       headers: request headers (must include access-token)
       timeout: request timeout in seconds (float)
+      max_retries: extra attempts after a 429; requests are paced by the shared
+        adaptive rate limiter, which backs off on 429s
 
     Returns:
       pandas.DataFrame with columns [open, high, low, close, timestamp, date]
@@ -118,10 +141,18 @@ def fetch_for(
         "toDate": to_date,
     }
 
-    try:
-        resp = requests.post(API_URL, json=payload, headers=headers or get_headers(), timeout=timeout)
-    except requests.RequestException as e:
-        raise RuntimeError(f"Network error fetching {security_id}: {e}")
+    for attempt in range(max_retries + 1):
+        _rate_limiter.acquire()
+        started = time.time()
+        try:
+            resp = requests.post(API_URL, json=payload, headers=headers or get_headers(), timeout=timeout)
+        except requests.RequestException as e:
+            _rate_limiter.record(599, time.time() - started)
+            raise RuntimeError(f"Network error fetching {security_id}: {e}")
+        _rate_limiter.record(resp.status_code, time.time() - started,
+                             parse_retry_after(resp.headers.get("Retry-After")))
+        if resp.status_code != 429:
+            break
 
     if resp.status_code != 200:
         # raise an error; callers (UI) should catch and display messages
@@ -160,87 +191,13 @@ def wick_data(c) -> tuple[float, float, float]:
     return upper, lower, body
 
 # ---------- Zone detection (only detect zones; no retest here) ----------
-def find_demand_zones(df: pd.DataFrame, max_bases: int = 4) -> pd.DataFrame:
+def find_demand_zones(df: pd.DataFrame, max_bases: int = 4, scores: bool = False) -> pd.DataFrame:
     """
     Returns DataFrame with columns:
       date_base, demand_zone_low, demand_zone_high, rally2_idx, num_base_candles
+    and, with scores, the detector_core.SCORE_COLUMNS quality measures.
     """
-    zones = []
-    i = 0
-    n = len(df)
-
-    while i < n - 2:
-        r1 = df.iloc[i]
-
-        # First strong rally check (green and strong body > 65% of overall)
-        if not is_green(r1) or (r1.close - r1.open) / overall(r1) <= 0.65:
-            i += 1
-            continue
-
-        # Collect 1..4 base candles (strict rule)
-        bases = []
-        j = i + 1
-        while j < n and len(bases) < max_bases:
-            c = df.iloc[j]
-            upper, lower, body = wick_data(c)
-            body_ratio = abs(body) / overall(c)
-            wick_ratio = (upper + lower) / overall(c)
-
-            # Base conditions (strict): body <= 35%, wicks >= 65%
-            if body_ratio <= 0.35 and wick_ratio >= 0.65:
-                bases.append(c)
-                j += 1
-            else:
-                break
-
-        if not bases:
-            i += 1
-            continue
-
-        # Ensure there's a 2nd rally after bases
-        if j >= n:
-            break
-
-        r2 = df.iloc[j]
-        if not is_green(r2) or (r2.close - r2.open) / overall(r2) <= 0.65:
-            i += 1
-            continue
-
-        # ✅ demand zone from base range
-        body_highs = [(b.close if is_green(b) else b.open) for b in bases]
-        lows = [b.low for b in bases]
-
-        dz_high = max(body_highs)
-        dz_low = min(lows)
-        rally2_idx = j
-        zone_height = dz_high - dz_low
-
-        # ✅ date_base = FIRST base candle after rally1
-        date_base = bases[0].date
-
-        # ✅ Zone invalidation check (future candles)
-        valid_zone = True
-        for k in range(rally2_idx + 1, n):
-            if df.iloc[k].low < dz_low:  # zone broken
-                valid_zone = False
-                break
-
-        if not valid_zone:
-            i = j + 1
-            continue  # ❌ don't include broken zones
-
-        # ✅ If zone valid, store zone info
-        zones.append({
-            "date_base": date_base,
-            "demand_zone_low": float(dz_low),
-            "demand_zone_high": float(dz_high),
-            "zone_height": float(zone_height),
-            "num_base_candles": len(bases),
-            "rally2_idx": rally2_idx
-        })
-
-        i = j + 1  # skip ahead
-    return pd.DataFrame(zones)
+    return detect_zones(df, SPECS["RBR_LEGACY"], max_bases, scores=scores)
 
 def find_retests(df: pd.DataFrame, zones: pd.DataFrame) -> pd.DataFrame:
     """
@@ -261,48 +218,7 @@ def find_retests(df: pd.DataFrame, zones: pd.DataFrame) -> pd.DataFrame:
             "buy_signal", "buy_price", "retest_date", "invalidated"
         ])
 
-    results = []
-    n = len(df)
-
-    for _, zone in zones.iterrows():
-        dz_low = float(zone["demand_zone_low"])
-        dz_high = float(zone["demand_zone_high"])
-        rally2_idx = int(zone["rally2_idx"])
-
-        buy_signal = False
-        invalidated = False
-        buy_price = None
-        retest_date = None
-
-        # ✅ Scan all candles after Rally-2
-        for idx in range(rally2_idx + 1, n):
-            c = df.iloc[idx]
-            low = float(c.low)
-
-            # ❌ Invalidation condition
-            if low < dz_low:
-                invalidated = True
-                break
-
-            # ✅ Buy condition: candle touches within zone
-            if dz_low <= low <= dz_high:
-                buy_signal = True
-                buy_price = low
-                retest_date = c.date
-                break
-
-        out = zone.to_dict()
-        out.update({
-            "buy_signal": buy_signal,
-            "buy_price": buy_price,
-            "retest_date": pd.to_datetime(retest_date) if retest_date else None,
-            "invalidated": invalidated
-        })
-
-        results.append(out)
-
-    df_out = pd.DataFrame(results)
-    return df_out.drop(columns=["zone_height", "rally2_idx"], errors="ignore")
+    return detect_retests(df, zones, SPECS["RBR_LEGACY"])
 
 # ---------- Main orchestration ----------
 def analyze_security(security_id: str) -> Tuple[Optional[pd.DataFrame], pd.DataFrame]:
@@ -327,16 +243,25 @@ def analyze_security(security_id: str) -> Tuple[Optional[pd.DataFrame], pd.DataF
 def run_analysis(
     csv_path: Optional[str] = None,
     out_csv: Optional[str] = None,
-    sleep_between: float = 0.2,
+    out_dir: Optional[str] = RESULTS_DIR,
+    sleep_between: float = 0.0,
     max_securities: Optional[int] = None,
+    scores: bool = False,
+    diff: bool = True,
 ) -> pd.DataFrame:
     """Read CSV, filter required rows, iterate over security IDs and return aggregated DataFrame.
 
     Parameters:
       csv_path: optional path to api-scrip-master.csv (defaults to script dir)
-      out_csv: optional output path to save aggregated results
-      sleep_between: pause between API calls
+      out_csv: optional CSV copy of the aggregated results (legacy format)
+      out_dir: Parquet dataset directory (see results_store); None to skip
+      sleep_between: extra pause between securities (API calls are already
+        paced by the adaptive rate limiter in fetch_for)
     max_securities: optional int to limit processed securities
+      scores: add zone quality columns (detector_core.SCORE_COLUMNS); pass the
+        result to detector_core.top_zones for the best N
+      diff: log new / retested / invalidated zones since the previous run
+        (zone_diff; snapshots under out_dir/.snapshots)
     """
     if csv_path is None:
         csv_path = os.path.join(os.path.dirname(__file__), "api-scrip-master.csv")
@@ -344,22 +269,9 @@ def run_analysis(
     if not os.path.exists(csv_path):
         raise FileNotFoundError(f"CSV file not found at {csv_path}. Put 'api-scrip-master.csv' next to this script or pass csv_path.")
 
-    scrips = pd.read_csv(csv_path, dtype=str)
-    required_cols = [
-        "SEM_SMST_SECURITY_ID",
-        "SEM_EXM_EXCH_ID",
-        "SEM_INSTRUMENT_NAME",
-        "SEM_SEGMENT",
-    ]
-    for c in required_cols:
-        if c not in scrips.columns:
-            raise ValueError(f"Required column '{c}' not found in CSV. Available columns: {list(scrips.columns)}")
-
-    filtered = scrips[
-        (scrips["SEM_EXM_EXCH_ID"] == "NSE") &
-        (scrips["SEM_INSTRUMENT_NAME"] == "EQUITY") &
-        (scrips["SEM_SEGMENT"] == "E")
-    ]
+    # NSE equity subset, cached on disk and rebuilt only when the CSV changes
+    index = load_scrip_index(csv_path)
+    filtered = index.frame
 
     security_ids = filtered["SEM_SMST_SECURITY_ID"].dropna().astype(str).unique().tolist()
     if max_securities is not None:
@@ -381,28 +293,26 @@ def run_analysis(
             time.sleep(sleep_between)
             continue
 
-        zones = find_demand_zones(df)
+        df = adjust_candles(sid, df)
+        zones, retests = analyze_cached(sid, df, "RBR_LEGACY", scores=scores)
         if zones.empty:
             print(f"No demand zones for {sid}")
             time.sleep(sleep_between)
             continue
 
-        retests = find_retests(df, zones)
         if retests is None or retests.empty:
             print(f"No retests for {sid}")
             time.sleep(sleep_between)
             continue
 
-        for _, r in retests.iterrows():
-            out = r.to_dict()
-            out["security_id"] = sid
-            row_meta = filtered[filtered["SEM_SMST_SECURITY_ID"] == sid]
-            if not row_meta.empty:
-                first = row_meta.iloc[0]
-                # Preserve existing symbol_name field if present, and also add SM_SYMBOL_NAME
-                out["symbol_name"] = first.get("SEM_SMST_SECURITY_NAME", None) if "SEM_SMST_SECURITY_NAME" in first.index else None
-                # out["SM_SYMBOL_NAME"] = first.get("SM_SYMBOL_NAME", None) if "SM_SYMBOL_NAME" in first.index else None
-            all_results.append(out)
+        # tag the whole frame at once; frames are concatenated once at the end
+        out = retests.assign(security_id=sid)
+        first = index.row_for_security(sid)
+        if first is not None:
+            # Preserve existing symbol_name field if present, and also add SM_SYMBOL_NAME
+            out["symbol_name"] = first.get("SEM_SMST_SECURITY_NAME", None)
+            # out["SM_SYMBOL_NAME"] = first.get("SM_SYMBOL_NAME", None)
+        all_results.append(out)
 
         time.sleep(sleep_between)
 
@@ -410,17 +320,21 @@ def run_analysis(
         print("No zones detected for any security IDs.")
         return pd.DataFrame()
 
-    final = pd.DataFrame(all_results)
+    final = pd.concat(all_results, ignore_index=True)
     if "date_base" in final.columns:
         final["date_base"] = pd.to_datetime(final["date_base"], errors="coerce")
     if "retest_date" in final.columns:
         final["retest_date"] = pd.to_datetime(final["retest_date"], errors="coerce")
 
-    if out_csv is None:
-        out_csv = os.path.join(os.path.dirname(__file__), "detected_zones_all.csv")
-
-    final.to_csv(out_csv, index=False)
-    print(f"Saved aggregated results to {out_csv} (rows={len(final)})")
+    if out_dir:
+        write_results(final, out_dir, pattern_type="RBR")
+        print(f"Saved aggregated results to {out_dir} (rows={len(final)})")
+        if diff:
+            changes = ZoneDiffer("RBR", os.path.join(out_dir, ".snapshots")).advance(final, pattern_type="RBR")
+            print(f"Zone changes since the previous run: {changes['change'].value_counts().to_dict()}")
+    if out_csv:
+        final.to_csv(out_csv, index=False)
+        print(f"Saved aggregated results to {out_csv} (rows={len(final)})")
     return final
 
 
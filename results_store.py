@@ -0,0 +1,213 @@
+"""Typed, partitioned Parquet storage for aggregated scan results.
+
+run_analysis used to write detected_zones_all.csv. In that file dates were
+tz-aware strings, None became "" and every column had to be re-parsed and
+re-inferred on load. Results are now written as a Parquet dataset:
+
+    results/run_date=2024-06-01/pattern_type=RBR/part-run-0.parquet
+
+with a fixed schema:
+  - security_id, symbol_name, pattern_type -> dictionary-encoded (categorical)
+  - date columns (date_base, retest_date)  -> int64 epoch seconds, null for NaT
+  - signal / invalidated flags              -> nullable booleans
+  - prices                                  -> float64, num_base_candles int64
+
+A rerun for the same run date and pattern replaces its partition files
+(see write_table) instead of adding a second copy of every zone.
+
+Rows are sorted by (invalidated, security_id) before writing, so the row-group
+statistics let `load_results(open_only=True)` skip invalidated zones without
+decoding them. Partition filters (run date, pattern) prune whole directories.
+
+Example:
+    >>> from results_store import write_results, load_results
+    >>> write_results(final, pattern_type="RBR")
+    >>> open_zones = load_results(pattern_type="RBR", open_only=True, columns=["security_id", "demand_zone_low"])
+"""
+
+import datetime as dt
+import operator
+import os
+import re
+import shutil
+import uuid
+from functools import reduce
+from typing import List, Optional, Sequence
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+TIMEZONE = "Asia/Kolkata"
+
+CATEGORY_COLUMNS = ["security_id", "symbol_name", "pattern_type"]
+DATE_COLUMNS = ["date_base", "retest_date"]
+BOOL_COLUMNS = ["buy_signal", "sell_signal", "invalidated"]
+INT_COLUMNS = ["num_base_candles", "continuation_idx", "rally2_idx", "drop2_idx", "freshness"]
+RUN_BASENAME = "run"  # file stem of whole-run writes (one copy per partition)
+PARTITIONING = ds.partitioning(
+    pa.schema([("run_date", pa.string()), ("pattern_type", pa.string())]), flavor="hive"
+)
+
+
+def _epoch_seconds(values: pd.Series) -> pd.Series:
+    stamps = pd.to_datetime(values, errors="coerce", utc=True)
+    out = pd.Series(pd.NA, index=values.index, dtype="Int64")
+    ok = stamps.notna()
+    out[ok] = (stamps[ok].astype("datetime64[ns, UTC]").astype("int64") // 10**9).to_numpy()
+    return out
+
+
+def to_typed_frame(results: pd.DataFrame) -> pd.DataFrame:
+    """Cast aggregated results to the storage schema (see module docstring)."""
+    out = results.copy()
+    for col in DATE_COLUMNS:
+        if col in out.columns:
+            out[col] = _epoch_seconds(out[col])
+    for col in BOOL_COLUMNS:
+        if col in out.columns:
+            out[col] = out[col].replace("", pd.NA).astype("boolean")
+    for col in INT_COLUMNS:
+        if col in out.columns:
+            out[col] = pd.to_numeric(out[col], errors="coerce").astype("Int64")
+    for col in CATEGORY_COLUMNS:
+        if col in out.columns:
+            out[col] = out[col].astype("string").astype("category")
+    return out
+
+
+def write_results(
+    results: pd.DataFrame,
+    root: str = RESULTS_DIR,
+    run_date: Optional[str] = None,
+    pattern_type: Optional[str] = None,
+    basename: str = RUN_BASENAME,
+) -> Optional[str]:
+    """Write `results` to the dataset under `root`; returns the written directory.
+
+    Parameters:
+      results: aggregated zones/retests (one row per zone)
+      root: dataset directory
+      run_date: partition value, ISO date (default: today)
+      pattern_type: used when `results` has no pattern_type column
+      basename: file name stem; writing it again replaces its files (see write_table)
+    """
+    if results is None or results.empty:
+        return None
+    frame = results.copy()
+    if "pattern_type" not in frame.columns:
+        if pattern_type is None:
+            raise ValueError("pattern_type is required when results have no pattern_type column")
+        frame["pattern_type"] = pattern_type
+    frame["run_date"] = run_date or dt.date.today().isoformat()
+
+    frame = to_typed_frame(frame)
+    sort_cols = [c for c in ("invalidated", "security_id") if c in frame.columns]
+    if sort_cols:
+        frame = frame.sort_values(sort_cols, kind="stable")
+    frame["run_date"] = frame["run_date"].astype(str)
+    frame["pattern_type"] = frame["pattern_type"].astype(str)
+    return write_table(pa.Table.from_pandas(frame, preserve_index=False), root, basename)
+
+
+def write_table(table: pa.Table, root: str = RESULTS_DIR, basename: str = RUN_BASENAME) -> str:
+    """Write an Arrow table that is already in the storage schema.
+
+    The table must carry string `run_date` and `pattern_type` columns (the
+    partition keys). Used directly by parallel_scan, which builds its table
+    from shared-memory buffers without going through pandas.
+
+    basename: file name stem within each partition. Writing the same basename
+    again replaces its files in the partitions written, instead of adding
+    rows. A whole-universe run uses the default, so rerunning it on the same
+    run date replaces the earlier copy. Writers of partial results (scheduler
+    batches, distributed_scan units) pass a stem per batch or unit, so a
+    replayed batch overwrites itself. The files are staged under
+    root/.staging/ and moved into place. Only files named exactly
+    part-<basename>-<i>.parquet belong to a stem, so the default "run" does
+    not touch the files of a stem such as "run-2024-06-01-<unit>".
+    """
+    os.makedirs(root, exist_ok=True)
+    staging = os.path.join(root, ".staging", uuid.uuid4().hex)  # dot-prefixed: ignored by load_results
+    prefix = f"part-{basename}-"
+    own = re.compile(re.escape(prefix) + r"\d+\.parquet")
+    try:
+        ds.write_dataset(
+            table,
+            staging,
+            format="parquet",
+            partitioning=PARTITIONING,
+            basename_template=f"{prefix}{{i}}.parquet",
+        )
+        for folder, _, files in os.walk(staging):
+            if not files:
+                continue
+            target = os.path.join(root, os.path.relpath(folder, staging))
+            os.makedirs(target, exist_ok=True)
+            for name in files:
+                os.replace(os.path.join(folder, name), os.path.join(target, name))
+            # files of an earlier, larger write under the same stem
+            for name in os.listdir(target):
+                if own.fullmatch(name) and name not in files:
+                    os.remove(os.path.join(target, name))
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    return root
+
+
+def load_results(
+    root: str = RESULTS_DIR,
+    run_date: Optional[str] = None,
+    pattern_type: Optional[str] = None,
+    security_ids: Optional[Sequence[str]] = None,
+    open_only: bool = False,
+    columns: Optional[List[str]] = None,
+    parse_dates: bool = True,
+) -> pd.DataFrame:
+    """Read results, pushing the filters down to the Parquet scan.
+
+    Parameters:
+      run_date / pattern_type: partition filters (skip whole directories)
+      security_ids: keep only these securities
+      open_only: keep only zones that are not invalidated
+      columns: columns to read (default: all)
+      parse_dates: convert epoch-second date columns to tz-aware timestamps
+
+    Returns:
+      pandas DataFrame (empty when the dataset does not exist)
+    """
+    if not os.path.isdir(root):
+        return pd.DataFrame()
+    dataset = ds.dataset(root, format="parquet", partitioning=PARTITIONING)
+
+    filters = []
+    if run_date is not None:
+        filters.append(ds.field("run_date") == run_date)
+    if pattern_type is not None:
+        filters.append(ds.field("pattern_type") == pattern_type)
+    if security_ids is not None:
+        filters.append(ds.field("security_id").isin([str(s) for s in security_ids]))
+    if open_only and "invalidated" in dataset.schema.names:
+        filters.append(~ds.field("invalidated"))
+
+    if columns is not None:
+        columns = [c for c in columns if c in dataset.schema.names]
+    expr = reduce(operator.and_, filters) if filters else None
+    table = dataset.to_table(columns=columns, filter=expr)
+    frame = table.to_pandas()
+    for col in ("run_date", "pattern_type", "security_id", "symbol_name"):
+        if col in frame.columns and frame[col].dtype != "category":
+            frame[col] = frame[col].astype("category")
+    # files written from pandas and from Arrow (parallel_scan) read back alike
+    for col in BOOL_COLUMNS:
+        if col in frame.columns:
+            frame[col] = frame[col].astype("boolean")
+    for col in INT_COLUMNS:
+        if col in frame.columns:
+            frame[col] = frame[col].astype("Int64")
+    if parse_dates:
+        for col in DATE_COLUMNS:
+            if col in frame.columns:
+                frame[col] = pd.to_datetime(frame[col], unit="s", utc=True).dt.tz_convert(TIMEZONE)
+    return frame
@@ -0,0 +1,250 @@
+"""Scheduler for the scan pipeline: priority tiers, incremental refresh, resumable queue.
+
+Replaces the cron job that re-ran `python rbr_logic.py` over the whole
+universe from scratch:
+
+  - daily tier: once per trading day, after market close, every security in
+    the universe is queued. A job syncs the candle store (candle_store.py,
+    fetching only bars after the stored ones) and analyzes the stored
+    candles through zone_cache. A security without new bars is a cache hit,
+    so only securities with new bars are actually rescanned. Results go to
+    the Parquet dataset (results_store.py) under that day's partition.
+  - watchlist tier: during market hours the watchlist is queued every
+    `watchlist_interval` seconds at a better priority. Those jobs refresh
+    the candle store and zone cache (what app.py and batch mode read), but
+    they do not write the daily results.
+
+Jobs are held in a persistent SQLite queue (work_queue.py) and executed
+by a bounded thread pool. The scheduler only claims jobs of its own tiers,
+so other users of the queue file (e.g. distributed_scan units) are left
+alone. A job is marked done only after its results are flushed to disk, so
+an interrupted refresh resumes with the remaining securities on the next
+start. Each flush writes files named after its run and securities, so
+flushing the same batch again replaces them rather than adding rows.
+
+Example:
+    python scan_scheduler.py --once                 # run today's refresh now and exit
+    python scan_scheduler.py --watchlist watch.txt  # keep running, one security id per line
+    python scan_scheduler.py --status
+"""
+
+import argparse
+import hashlib
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import time as dtime
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import pandas as pd
+
+from candle_store import CandleStore, candles_frame, get_candle_store
+from corporate_actions import adjusted_arrays
+from detector_core import SPECS
+from feature_store import feature_arrays
+from results_store import RESULTS_DIR, write_results
+from work_queue import WorkQueue
+from zone_cache import analyze_cached
+
+TIMEZONE = "Asia/Kolkata"
+MARKET_OPEN = dtime(9, 15)
+MARKET_CLOSE = dtime(15, 30)
+
+# tier name -> queue priority (lower runs first) and whether results are written
+TIERS = {
+    "watchlist": {"priority": 0, "write_results": False},
+    "daily": {"priority": 10, "write_results": True},
+}
+WATCHLIST_INTERVAL = 15 * 60
+FLUSH_EVERY = 200
+
+
+def _run_date(run_id: str) -> str:
+    """'daily-2024-06-01' -> '2024-06-01'."""
+    return run_id.split("-", 1)[1][:10]
+
+
+def batch_basename(run_id: str, security_ids: Iterable[str]) -> str:
+    """Result file stem of a flushed batch: the run id and a hash of its (sorted) security ids."""
+    digest = hashlib.sha1("\n".join(sorted(str(s) for s in security_ids)).encode()).hexdigest()[:12]
+    return f"{run_id}-{digest}"
+
+
+class ScanScheduler:
+    """Queues tiered scan runs and drains them with a bounded worker pool."""
+
+    def __init__(
+        self,
+        universe: Sequence[str],
+        watchlist: Sequence[str] = (),
+        queue: Optional[WorkQueue] = None,
+        store: Optional[CandleStore] = None,
+        workers: int = 4,
+        spec_name: str = "RBR_LEGACY",
+        watchlist_interval: float = WATCHLIST_INTERVAL,
+        results_dir: Optional[str] = RESULTS_DIR,
+        symbol_names: Optional[Dict[str, str]] = None,
+        fetch: bool = True,
+        flush_every: int = FLUSH_EVERY,
+    ):
+        self.universe = [str(s) for s in universe]
+        self.watchlist = [str(s) for s in watchlist]
+        self.queue = queue or WorkQueue()
+        self.store = store or get_candle_store()
+        self.workers = workers
+        self.spec_name = spec_name
+        self.watchlist_interval = watchlist_interval
+        self.results_dir = results_dir
+        self.symbol_names = symbol_names or {}
+        self.fetch = fetch
+        self.flush_every = flush_every
+        self.kinds = tuple(TIERS)
+        self.stats = {"jobs": 0, "rescanned": 0, "unchanged": 0, "failed": 0, "rows_written": 0}
+
+    # ----- planning -----
+    def due_runs(self, now: Optional[pd.Timestamp] = None, force_daily: bool = False) -> List[tuple]:
+        """(tier, run_id, security_ids) for every run that should be queued at `now`."""
+        now = now or pd.Timestamp.now(tz=TIMEZONE)
+        runs = []
+        trading_day = now.weekday() < 5
+        if force_daily or (trading_day and now.time() >= MARKET_CLOSE):
+            runs.append(("daily", f"daily-{now.date().isoformat()}", self.universe))
+        if self.watchlist and trading_day and MARKET_OPEN <= now.time() < MARKET_CLOSE:
+            slot = int(now.timestamp() // self.watchlist_interval)
+            runs.append(("watchlist", f"watchlist-{now.date().isoformat()}-{slot}", self.watchlist))
+        return runs
+
+    def enqueue_due(self, now: Optional[pd.Timestamp] = None, force_daily: bool = False) -> int:
+        """Queue the due runs that were not queued before; returns jobs added."""
+        added = 0
+        for tier, run_id, ids in self.due_runs(now, force_daily):
+            if self.queue.has_run(run_id):
+                continue
+            n = self.queue.enqueue(ids, run_id=run_id, priority=TIERS[tier]["priority"], kind=tier)
+            print(f"Queued {n} {tier} jobs for {run_id}")
+            added += n
+        return added
+
+    # ----- execution -----
+    def _process(self, job: dict) -> tuple:
+        """Sync and analyze one security; returns (new bars, tagged retests or None)."""
+        sid = job["security_id"]
+        new_bars = self.store.sync(sid) if self.fetch else 0
+        candles = adjusted_arrays(sid, self.store)
+        df = candles_frame(candles)
+        if df.empty:
+            return new_bars, None
+        # unchanged candles are a zone_cache hit; appended bars only re-scan the tail
+        features = feature_arrays(sid, self.store, candles=candles)
+        _, retests = analyze_cached(sid, df, self.spec_name, features=features)
+        if retests is None or retests.empty:
+            return new_bars, None
+        out = retests.assign(security_id=sid)
+        if sid in self.symbol_names:
+            out["symbol_name"] = self.symbol_names[sid]
+        return new_bars, out
+
+    def _flush(self, done: List[tuple]) -> None:
+        """Write buffered results per run, then mark their jobs done."""
+        by_run: Dict[str, List[tuple]] = {}
+        for job, frame in done:
+            if frame is not None and TIERS[job["kind"]]["write_results"] and self.results_dir:
+                by_run.setdefault(job["run_id"], []).append((job["security_id"], frame))
+        for run_id, items in by_run.items():
+            final = pd.concat([frame for _, frame in items], ignore_index=True)
+            write_results(final, self.results_dir, run_date=_run_date(run_id),
+                          pattern_type=SPECS[self.spec_name].name,
+                          basename=batch_basename(run_id, [sid for sid, _ in items]))
+            self.stats["rows_written"] += len(final)
+        self.queue.complete([job["id"] for job, _ in done])
+        done.clear()
+
+    def drain(self, max_jobs: Optional[int] = None) -> int:
+        """Run queued jobs until the queue is empty (or max_jobs ran); returns jobs finished."""
+        finished = 0
+        buffer: List[tuple] = []
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="scan") as pool:
+            while True:
+                room = self.workers - len(running)
+                if max_jobs is not None:
+                    room = min(room, max_jobs - finished - len(running))
+                if room > 0:
+                    for job in self.queue.claim(room, kind=self.kinds):
+                        running[pool.submit(self._process, job)] = job
+                if not running:
+                    break
+                completed, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for fut in completed:
+                    job = running.pop(fut)
+                    self.stats["jobs"] += 1
+                    try:
+                        new_bars, frame = fut.result()
+                        self.stats["rescanned" if new_bars else "unchanged"] += 1
+                        buffer.append((job, frame))
+                    except Exception as e:
+                        status = self.queue.fail(job["id"], repr(e))
+                        self.stats["failed"] += status == "failed"
+                        print(f"Scan failed for {job['security_id']} ({status}): {e}")
+                    finished += 1
+                if len(buffer) >= self.flush_every:
+                    self._flush(buffer)
+            if buffer:
+                self._flush(buffer)
+        return finished
+
+    def run(self, poll_seconds: float = 30.0, once: bool = False) -> None:
+        """Resume interrupted work, then queue due runs and drain them (forever unless once)."""
+        recovered = self.queue.recover()
+        if recovered:
+            print(f"Resuming {recovered} interrupted jobs")
+        while True:
+            self.enqueue_due(force_daily=once)
+            if self.drain():
+                print(f"Scan progress: {self.stats} queue={self.queue.counts()}")
+            if once:
+                return
+            time.sleep(poll_seconds)
+
+
+def _read_ids(path: Optional[str]) -> List[str]:
+    if not path:
+        return []
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def _universe(max_securities: Optional[int]) -> tuple:
+    from scrip_index import load_scrip_index
+
+    index = load_scrip_index()
+    ids: Iterable[str] = pd.unique(pd.Series(index.security_ids()).dropna())
+    ids = list(ids)[:max_securities] if max_securities is not None else list(ids)
+    names = {}
+    for sid in ids:
+        row = index.row_for_security(sid)
+        if row is not None and "SEM_SMST_SECURITY_NAME" in row.index:
+            names[sid] = row["SEM_SMST_SECURITY_NAME"]
+    return ids, names
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tiered, resumable scan scheduler.")
+    parser.add_argument("--once", action="store_true", help="queue today's refresh now, drain the queue and exit")
+    parser.add_argument("--watchlist", help="file with one security id per line (rescanned intraday)")
+    parser.add_argument("--watchlist-interval", type=float, default=WATCHLIST_INTERVAL, help="seconds")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--max-securities", type=int, default=None)
+    parser.add_argument("--status", action="store_true", help="print queue counts and exit")
+    args = parser.parse_args()
+
+    if args.status:
+        print(WorkQueue().counts())
+    else:
+        universe, names = _universe(args.max_securities)
+        ScanScheduler(
+            universe,
+            watchlist=_read_ids(args.watchlist),
+            workers=args.workers,
+            watchlist_interval=args.watchlist_interval,
+            symbol_names=names,
+        ).run(once=args.once)
@@ -0,0 +1,187 @@
+"""Prebuilt index of the NSE equity subset of api-scrip-master.csv.
+
+The scrip master is large, and both app.py (on every Streamlit rerun) and
+rbr_logic.run_analysis used to re-read and re-filter it. `load_scrip_index`
+parses the CSV once, keeps only NSE / EQUITY / segment E rows and pickles the
+result (rows plus search postings) under .cache/scrips/. The pickle is rebuilt
+only when the CSV's mtime or size changes, and the loaded index is memoized
+per process.
+
+Symbol search uses an n-gram index (1- to 3-grams of the lower-cased label):
+a query is answered by intersecting the postings of its n-grams and verifying
+the few candidates, instead of scanning every label.
+
+Example:
+    >>> from scrip_index import load_scrip_index
+    >>> idx = load_scrip_index()
+    >>> rows = idx.search("tata", instrument_type="ES")
+    >>> idx.labels(rows)[:5]
+"""
+
+import os
+import pickle
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "api-scrip-master.csv")
+INDEX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "scrips")
+INDEX_VERSION = 1
+
+REQUIRED_COLUMNS = [
+    "SEM_SMST_SECURITY_ID",
+    "SEM_EXM_EXCH_ID",
+    "SEM_INSTRUMENT_NAME",
+    "SEM_SEGMENT",
+]
+SYMBOL_CANDIDATES = ["SM_SYMBOL_NAME", "SEM_SMST_SECURITY_NAME", "SM_SYMBOL", "SYMBOL", "symbol"]
+MAX_GRAM = 3
+
+_memo: Dict[str, "ScripIndex"] = {}
+_memo_lock = threading.Lock()
+
+
+def _grams(text: str, size: int) -> set:
+    return {text[k:k + size] for k in range(len(text) - size + 1)}
+
+
+class ScripIndex:
+    """NSE equity rows of the scrip master plus an n-gram symbol index."""
+
+    def __init__(self, frame: pd.DataFrame, symbol_col: str, source_stamp: tuple):
+        self.frame = frame.reset_index(drop=True)
+        self.symbol_col = symbol_col
+        self.source_stamp = source_stamp
+        self._labels = self.frame[symbol_col].astype(str).tolist()
+        self._ids = self.frame["SEM_SMST_SECURITY_ID"].astype(str).tolist()
+        self._lower = [s.lower() for s in self._labels]
+        postings: Dict[str, List[int]] = {}
+        for pos, text in enumerate(self._lower):
+            for size in range(1, MAX_GRAM + 1):
+                for g in _grams(text, size):
+                    postings.setdefault(g, []).append(pos)
+        self._postings = {g: np.asarray(p, dtype=np.int32) for g, p in postings.items()}
+        self._subsets: Dict[Optional[str], np.ndarray] = {}
+        self._by_id = {sid: pos for pos, sid in reversed(list(enumerate(self._ids)))}
+
+    def __len__(self) -> int:
+        return len(self._labels)
+
+    # ----- subsets -----
+    def subset(self, instrument_type: Optional[str] = None) -> np.ndarray:
+        """Row positions, optionally restricted to SEM_EXCH_INSTRUMENT_TYPE."""
+        rows = self._subsets.get(instrument_type)
+        if rows is None:
+            if instrument_type is None or "SEM_EXCH_INSTRUMENT_TYPE" not in self.frame.columns:
+                rows = np.arange(len(self), dtype=np.int32)
+            else:
+                rows = np.flatnonzero(self.frame["SEM_EXCH_INSTRUMENT_TYPE"].to_numpy() == instrument_type).astype(np.int32)
+            self._subsets[instrument_type] = rows
+        return rows
+
+    def labels(self, rows) -> List[str]:
+        return [self._labels[r] for r in rows]
+
+    def security_ids(self, rows=None) -> List[str]:
+        if rows is None:
+            return list(self._ids)
+        return [self._ids[r] for r in rows]
+
+    def mapping(self, rows) -> Dict[str, str]:
+        """label -> security id for the given rows (later duplicates win)."""
+        return {self._labels[r]: self._ids[r] for r in rows}
+
+    def row_for_security(self, security_id: str) -> Optional[pd.Series]:
+        pos = self._by_id.get(str(security_id))
+        return None if pos is None else self.frame.iloc[pos]
+
+    # ----- search -----
+    def search(self, query: str, instrument_type: Optional[str] = None, limit: Optional[int] = None) -> np.ndarray:
+        """Rows whose label contains `query` (case-insensitive), in index order."""
+        within = self.subset(instrument_type)
+        q = query.lower()
+        if not q:
+            rows = within
+        else:
+            size = min(len(q), MAX_GRAM)
+            grams = sorted(_grams(q, size), key=lambda g: len(self._postings.get(g, ())))
+            rows = self._postings.get(grams[0])
+            if rows is None:
+                return np.empty(0, dtype=np.int32)
+            for g in grams[1:]:
+                rows = np.intersect1d(rows, self._postings.get(g, np.empty(0, dtype=np.int32)), assume_unique=True)
+                if len(rows) == 0:
+                    return rows
+            if instrument_type is not None:
+                rows = np.intersect1d(rows, within, assume_unique=True)
+            if len(q) > MAX_GRAM:
+                rows = np.asarray([r for r in rows if q in self._lower[r]], dtype=np.int32)
+        return rows[:limit] if limit is not None else rows
+
+    def prefix(self, query: str, instrument_type: Optional[str] = None, limit: Optional[int] = None) -> np.ndarray:
+        """Rows whose label starts with `query` (case-insensitive), in index order."""
+        q = query.lower()
+        rows = self.search(q, instrument_type)
+        rows = np.asarray([r for r in rows if self._lower[r].startswith(q)], dtype=np.int32)
+        return rows[:limit] if limit is not None else rows
+
+
+def _build(csv_path: str, stamp: tuple) -> ScripIndex:
+    scrips = pd.read_csv(csv_path, dtype=str)
+    for c in REQUIRED_COLUMNS:
+        if c not in scrips.columns:
+            raise ValueError(f"Required column '{c}' not found in CSV. Available columns: {list(scrips.columns)}")
+    filtered = scrips[
+        (scrips["SEM_EXM_EXCH_ID"] == "NSE") &
+        (scrips["SEM_INSTRUMENT_NAME"] == "EQUITY") &
+        (scrips["SEM_SEGMENT"] == "E")
+    ].copy()
+    symbol_col = next((c for c in SYMBOL_CANDIDATES if c in filtered.columns), None)
+    if symbol_col is None:
+        filtered["_symbol_label"] = filtered["SEM_SMST_SECURITY_ID"]
+        symbol_col = "_symbol_label"
+    return ScripIndex(filtered, symbol_col, stamp)
+
+
+def load_scrip_index(csv_path: Optional[str] = None, index_dir: Optional[str] = INDEX_DIR) -> ScripIndex:
+    """Return the index for `csv_path`, rebuilding it only when the CSV changed.
+
+    Raises FileNotFoundError when the CSV does not exist and ValueError when
+    required columns are missing.
+    """
+    csv_path = os.path.abspath(csv_path or DEFAULT_CSV)
+    st_ = os.stat(csv_path)
+    stamp = (INDEX_VERSION, st_.st_mtime_ns, st_.st_size)
+
+    with _memo_lock:
+        idx = _memo.get(csv_path)
+        if idx is not None and idx.source_stamp == stamp:
+            return idx
+
+        pickle_path = None
+        if index_dir:
+            base = os.path.splitext(os.path.basename(csv_path))[0]
+            pickle_path = os.path.join(index_dir, f"{base}.index.pkl")
+            try:
+                with open(pickle_path, "rb") as f:
+                    cached = pickle.load(f)
+                if cached.source_stamp == stamp:
+                    _memo[csv_path] = cached
+                    return cached
+            except (OSError, pickle.PickleError, EOFError, AttributeError):
+                pass
+
+        idx = _build(csv_path, stamp)
+        if pickle_path:
+            try:
+                os.makedirs(index_dir, exist_ok=True)
+                tmp = f"{pickle_path}.{os.getpid()}.tmp"
+                with open(tmp, "wb") as f:
+                    pickle.dump(idx, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, pickle_path)
+            except OSError as e:
+                print(f"Could not write scrip index cache: {e}")
+        _memo[csv_path] = idx
+        return idx
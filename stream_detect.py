@@ -0,0 +1,221 @@
+"""Memory-bounded chunked detection over long candle histories.
+
+detect_zones / detect_retests need the whole series as one DataFrame, and
+the retest scan of every zone runs to the end of the series. For multi-year
+intraday histories that is millions of rows. ChunkedDetector instead
+consumes candles in fixed-size chunks. Between chunks it keeps only:
+
+  - the unfinished tail of the base scan: candles from the scan's resume
+    position on (at most max_bases + 2 candles, see scan_zones)
+  - the open zones: not yet retested / broken, or, for drop_broken specs,
+    not yet broken (those zones are dropped once a later candle breaks them)
+
+Finished zones are kept as a few numbers each, so peak memory depends on the
+chunk size and the number of zones, not on the history length. The result
+equals detect_zones + detect_retests on the whole series. It uses the same
+resume logic as zone_cache: the zone scan restarts at `resume`, and open
+zones continue on the new candles only.
+
+Example:
+    >>> from stream_detect import detect_stream
+    >>> zones, retests = detect_stream("21238", "RBR", chunk_rows=100_000)
+    python stream_detect.py 21238 --spec RBR --chunk-rows 100000
+"""
+
+import argparse
+import dataclasses
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from candle_store import COLUMNS, CandleStore, get_candle_store
+from corporate_actions import adjusted_arrays
+from detector_core import SPECS, broken_after, frames_from_arrays, retest_arrays, zone_arrays
+from feature_store import FEATURE_COLUMNS, feature_arrays
+
+CHUNK_ROWS = 250_000
+PRICE_COLUMNS = ("open", "high", "low", "close")
+# per-zone state, global indices / epoch seconds
+ZONE_FIELDS = {
+    "first_idx": np.int64, "second_idx": np.int64, "zone_low": np.float64, "zone_high": np.float64,
+    "base_ts": np.int64, "signal": np.bool_, "price": np.float64, "retest_idx": np.int64,
+    "retest_ts": np.int64, "invalidated": np.bool_,
+}
+
+
+def _empty_zones() -> Dict[str, np.ndarray]:
+    return {k: np.empty(0, dtype=t) for k, t in ZONE_FIELDS.items()}
+
+
+def _take(zones: Dict[str, np.ndarray], mask: np.ndarray) -> Dict[str, np.ndarray]:
+    return {k: v[mask] for k, v in zones.items()}
+
+
+def _concat(parts: List[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    if not parts:
+        return _empty_zones()
+    return {k: np.concatenate([p[k] for p in parts]) for k in ZONE_FIELDS}
+
+
+class ChunkedDetector:
+    """Zone scan + retest resolution for one series, fed chunk by chunk."""
+
+    def __init__(self, spec_name: str, max_bases: int = 4, body_threshold: float = 0.65,
+                 wick_threshold: float = 0.35, backend: str = "python"):
+        self.spec = SPECS[spec_name]
+        # zones are filtered for breaks here, as the candles arrive
+        self._scan_spec = dataclasses.replace(self.spec, drop_broken=False)
+        self.max_bases = max_bases
+        self.body_threshold = body_threshold
+        self.wick_threshold = wick_threshold
+        self.backend = backend
+        self.rows = 0  # candles fed so far
+        self._carry: Dict[str, np.ndarray] = {}  # candle (and feature) columns from the resume position on
+        self._carry_start = 0  # global index of the first carried candle
+        self._open = _empty_zones()
+        self._closed: List[Dict[str, np.ndarray]] = []
+
+    # ----- state -----
+    def _still_open(self, zones: Dict[str, np.ndarray]) -> np.ndarray:
+        if self.spec.drop_broken:
+            return np.ones(len(zones["first_idx"]), dtype=bool)  # until broken (then dropped)
+        if self.spec.retest_order == "break_first":
+            return ~(zones["invalidated"] | zones["signal"])
+        return ~zones["invalidated"]
+
+    def _settle(self, zones: Dict[str, np.ndarray]) -> None:
+        """Split zones into the ones that need more candles and the finished ones."""
+        keep = self._still_open(zones)
+        if not keep.all():
+            self._closed.append(_take(zones, ~keep))
+        self._open = _take(zones, keep)
+
+    # ----- processing -----
+    def _continue_open(self, win: Dict[str, np.ndarray], new_from: int) -> Dict[str, np.ndarray]:
+        """Resolve open zones over the window's new candles (local index >= new_from)."""
+        z = {k: v.copy() for k, v in self._open.items()}
+        m = len(z["first_idx"])
+        if m == 0:
+            return z
+        h, l, ts = win["high"], win["low"], win["timestamp"]
+        before = np.full(m, new_from - 1, dtype=np.int64)
+        upd = retest_arrays(h, l, {"zone_low": z["zone_low"], "zone_high": z["zone_high"], "second_idx": before},
+                            self.spec, self.backend)
+        fresh = ~z["signal"] & upd["signal"]
+        z["signal"][fresh] = True
+        z["price"][fresh] = upd["price"][fresh]
+        z["retest_idx"][fresh] = upd["retest_idx"][fresh] + self._carry_start
+        z["retest_ts"][fresh] = ts[upd["retest_idx"][fresh]]
+        z["invalidated"] |= upd["invalidated"]
+        if self.spec.drop_broken:
+            z = _take(z, ~broken_after(h, l, z["zone_low"], z["zone_high"], before, self.spec.breaks))
+        return z
+
+    def _scan_window(self, win: Dict[str, np.ndarray], final: bool) -> Tuple[Dict[str, np.ndarray], int]:
+        """New zones in the window (resolved over the window) and the local resume position."""
+        if len(win.get("timestamp", ())) < 3:
+            return _empty_zones(), 0
+        o, h, l, c = (win[col] for col in PRICE_COLUMNS)
+        features = {k: win[k] for k in FEATURE_COLUMNS if k in win} if "body_ratio" in win else None
+        zones, resume = zone_arrays(o, h, l, c, self._scan_spec, self.max_bases,
+                                    self.body_threshold, self.wick_threshold, self.backend, features=features)
+        if not final:
+            # pairs from `resume` on may change once more candles arrive
+            zones = {k: v[zones["first_idx"] < resume] for k, v in zones.items()}
+        r = retest_arrays(h, l, zones, self.spec, self.backend)
+        ts, offset = win["timestamp"], self._carry_start
+        out = {
+            "first_idx": zones["first_idx"] + offset,
+            "second_idx": zones["second_idx"] + offset,
+            "zone_low": zones["zone_low"],
+            "zone_high": zones["zone_high"],
+            "base_ts": ts[zones["first_idx"] + 1],
+            "signal": r["signal"],
+            "price": r["price"],
+            "retest_idx": np.where(r["signal"], r["retest_idx"] + offset, -1),
+            "retest_ts": ts[np.where(r["signal"], r["retest_idx"], 0)],
+            "invalidated": r["invalidated"],
+        }
+        if self.spec.drop_broken and len(out["first_idx"]):
+            out = _take(out, ~broken_after(h, l, out["zone_low"], out["zone_high"], zones["second_idx"],
+                                           self.spec.breaks))
+        return out, resume
+
+    def feed(self, chunk: Dict[str, np.ndarray]) -> None:
+        """Process the next chunk of candles (columns timestamp, open, high, low, close).
+
+        The chunk may also carry feature_store columns (body_ratio, wick_ratio,
+        color), which the zone scan then uses instead of recomputing them.
+        """
+        n_new = len(chunk["timestamp"])
+        if n_new == 0:
+            return
+        win = {}
+        for col, values in chunk.items():
+            values = np.asarray(values, dtype=COLUMNS[col] if col in COLUMNS else FEATURE_COLUMNS[col])
+            win[col] = np.concatenate([self._carry[col], values]) if col in self._carry else values
+        new_from = len(self._carry.get("timestamp", ()))
+        opened = self._continue_open(win, new_from)
+        found, resume = self._scan_window(win, final=False)
+        self._settle(_concat([opened, found]))
+        self._carry = {col: v[resume:].copy() for col, v in win.items()}
+        self._carry_start += resume
+        self.rows += n_new
+
+    def finish(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """End of the series: returns (zones, retests) as detect_zones / detect_retests would."""
+        found, _ = self._scan_window(self._carry, final=True)
+        zones = _concat(self._closed + [self._open, found])
+        order = np.argsort(zones["second_idx"], kind="stable")
+        return self._frames(_take(zones, order))
+
+    def _frames(self, z: Dict[str, np.ndarray]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        # the candles are gone by now: dates come from the timestamps kept per zone
+        return frames_from_arrays((z["base_ts"], z["retest_ts"]), self.spec, z, z)
+
+
+def detect_stream(
+    security_id: str,
+    spec_name: str = "RBR",
+    store: Optional[CandleStore] = None,
+    chunk_rows: int = CHUNK_ROWS,
+    max_bases: int = 4,
+    body_threshold: float = 0.65,
+    wick_threshold: float = 0.35,
+    backend: str = "python",
+    adjusted: bool = True,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Chunked detection over a security in the candle store; returns (zones, retests).
+
+    adjusted: read the corporate-action adjusted series (corporate_actions.py)
+    and its stored features (feature_store.py) instead of the raw candles.
+    """
+    store = store or get_candle_store()
+    if adjusted:
+        arrays = adjusted_arrays(security_id, store)
+        features = feature_arrays(security_id, store, candles=arrays)
+        arrays = {**arrays, **{k: features[k] for k in ("body_ratio", "wick_ratio", "color")}}
+    else:
+        arrays = store.arrays(security_id)
+    detector = ChunkedDetector(spec_name, max_bases, body_threshold, wick_threshold, backend)
+    total = len(arrays["timestamp"])
+    for start in range(0, total, chunk_rows):
+        # copy the chunk out of the memmap, so only chunk_rows candles are resident at a time
+        detector.feed({col: np.array(v[start:start + chunk_rows]) for col, v in arrays.items()})
+    return detector.finish()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chunked zone detection over a stored candle history.")
+    parser.add_argument("security_id")
+    parser.add_argument("--spec", default="RBR", choices=sorted(SPECS))
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--raw", action="store_true", help="skip corporate-action adjustment")
+    parser.add_argument("--out-csv", default=None)
+    args = parser.parse_args()
+
+    _, found_retests = detect_stream(args.security_id, args.spec, chunk_rows=args.chunk_rows, adjusted=not args.raw)
+    print(f"{len(found_retests)} zones for {args.security_id}")
+    if args.out_csv and not found_retests.empty:
+        found_retests.to_csv(args.out_csv, index=False)
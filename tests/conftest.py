@@ -0,0 +1,35 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# the modules live flat at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# config.py refuses to import without credentials; nothing in the tests calls the real API
+os.environ.setdefault("DHAN_ACCESS_TOKEN", "test-token")
+os.environ.setdefault("DHAN_CLIENT_ID", "test-client")
+os.environ.setdefault("DHAN_API_URL", "http://127.0.0.1:9/v2/charts/historical")
+os.environ.setdefault("DHAN_TOKEN_RENEWAL_URL", "http://127.0.0.1:9/v2/RenewToken")
+
+
+def _synthetic_candles(n: int, seed: int) -> pd.DataFrame:
+    """Deterministic daily candles with enough strong and small bodies to form zones."""
+    rng = np.random.default_rng(seed)
+    close = np.abs(100 + np.cumsum(rng.normal(0, 1.5, n))) + 5
+    op = close + rng.normal(0, 1.2, n)
+    spread = np.where(rng.integers(0, 4, n) == 0, rng.uniform(0.5, 2, n), rng.uniform(0, 0.2, n))
+    ts = (1609459200 + np.arange(n) * 86400).astype(np.int64)
+    return pd.DataFrame({
+        "open": op.round(2), "high": (np.maximum(op, close) + spread).round(2),
+        "low": (np.minimum(op, close) - spread).round(2), "close": close.round(2),
+        "timestamp": ts,
+        "date": pd.to_datetime(ts, unit="s", utc=True).tz_convert("Asia/Kolkata"),
+    })
+
+
+@pytest.fixture
+def synthetic_candles():
+    return _synthetic_candles
@@ -0,0 +1,48 @@
+import threading
+import time
+
+import pandas as pd
+
+import batch_analysis
+from batch_analysis import BatchAnalyzer
+
+
+def _analyze(security_id, direction, body_threshold, wick_threshold, max_bases):
+    return pd.DataFrame({"close": [1.0]}), pd.DataFrame()
+
+
+def test_expired_results_are_pruned(monkeypatch):
+    monkeypatch.setattr(batch_analysis, "analyze_security_patterns", _analyze)
+    analyzer = BatchAnalyzer(max_workers=2, ttl=0.2)
+    job = analyzer.submit({str(s): str(s) for s in range(20)}, "bullish")
+    job.wait(timeout=5)
+    while not job.done():
+        job.wait(timeout=5)
+    assert len(analyzer._results) == 20
+    assert analyzer.submit({"0": "0"}, "bullish").cached == 1
+    time.sleep(0.3)
+    analyzer.analyze("99", "bullish")
+    assert not analyzer._results
+    assert list(analyzer._interactive) == [("99", "bullish", 0.65, 0.35, 4)]
+
+
+def test_interactive_analysis_does_not_queue_behind_batch_work(monkeypatch):
+    release = threading.Event()
+    calls = []
+
+    def analyze(security_id, *args):
+        calls.append(security_id)
+        if security_id.startswith("slow"):
+            release.wait(timeout=10)
+        return _analyze(security_id, *args)
+
+    monkeypatch.setattr(batch_analysis, "analyze_security_patterns", analyze)
+    analyzer = BatchAnalyzer(max_workers=2)
+    job = analyzer.submit({"a": "slow1", "b": "slow2", "c": "x"}, "bullish")
+    started = time.time()
+    df, _ = analyzer.analyze("x", "bullish", timeout=5)
+    assert df is not None and time.time() - started < 1
+    release.set()
+    while not job.done():
+        job.wait(timeout=5)
+    assert calls.count("x") == 1
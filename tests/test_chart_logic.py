@@ -0,0 +1,23 @@
+import pandas as pd
+
+from chart_logic import ChartRenderer
+
+
+def test_cached_is_empty_until_the_chart_is_rendered(synthetic_candles):
+    renderer = ChartRenderer()
+    df = synthetic_candles(120, 1)
+    key = ("1", "RBR", 65, 35, 4)
+    assert renderer.cached(key, df) is None
+    renderer.submit(key, df, pd.DataFrame(), title="test").result(timeout=60)
+    assert renderer.cached(key, df).startswith(b"\x89PNG")
+    assert renderer.error(key, df) is None
+
+
+def test_failed_render_is_reported_without_resubmitting():
+    renderer = ChartRenderer()
+    df = pd.DataFrame({"timestamp": [1, 2]})  # no OHLC columns
+    key = ("1", "RBR", 65, 35, 4)
+    fut = renderer.submit(key, df)
+    fut.exception(timeout=60)
+    assert renderer.cached(key, df) is None
+    assert renderer.error(key, df) is not None
@@ -0,0 +1,32 @@
+import asyncio
+
+import pandas as pd
+
+import detection_service
+import results_store
+from detection_service import DetectionService
+from results_store import write_results
+
+
+def test_zones_revalidates_before_loading_and_bounds_the_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(detection_service, "RESPONSE_CACHE_ENTRIES", 2)
+    write_results(pd.DataFrame({"security_id": ["7"], "demand_zone_low": [10.0], "invalidated": [False]}),
+                  str(tmp_path), run_date="2024-06-01", pattern_type="RBR")
+    svc = DetectionService(workers=1, results_dir=str(tmp_path))
+    try:
+        etag, payload = asyncio.run(svc.zones({"run_date": "2024-06-01"}))
+        assert payload.startswith(b"[{")
+
+        def fail(*args, **kwargs):
+            raise AssertionError("load_results called for a matching If-None-Match")
+
+        load = results_store.load_results
+        monkeypatch.setattr(results_store, "load_results", fail)
+        assert asyncio.run(svc.zones({"run_date": "2024-06-01"}, etag)) == (etag, None)
+        monkeypatch.setattr(results_store, "load_results", load)
+
+        for k in range(4):
+            asyncio.run(svc.zones({"run_date": "2024-06-01", "security_id": str(k)}))
+        assert len(svc._responses) == 2
+    finally:
+        svc.close()
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+
+from detector_core import SPECS, detect_retests, detect_zones, top_zones
+from stream_detect import ChunkedDetector
+from universe_detect import detect_universe
+
+
+def _whole(df, spec):
+    return detect_retests(df, detect_zones(df, spec), spec)
+
+
+def test_stream_and_universe_frames_match_a_whole_series_run(synthetic_candles):
+    parts = [synthetic_candles(600, 1), synthetic_candles(400, 2)]
+    for name in ("RBR", "DBD"):
+        spec = SPECS[name]
+        detector = ChunkedDetector(name)
+        df = parts[0]
+        for start in range(0, len(df), 130):
+            detector.feed({col: df[col].to_numpy()[start:start + 130]
+                           for col in ("timestamp", "open", "high", "low", "close")})
+        _, streamed = detector.finish()
+        pd.testing.assert_frame_equal(streamed, _whole(df, spec), check_dtype=False)
+
+        candles = {col: np.concatenate([p[col].to_numpy() for p in parts])
+                   for col in ("timestamp", "open", "high", "low", "close")}
+        universe = detect_universe(candles, [0, 600, 1000], ["a", "b"], name)
+        for sid, part in zip(("a", "b"), parts):
+            got = universe[universe["security_id"] == sid].drop(columns="security_id").reset_index(drop=True)
+            pd.testing.assert_frame_equal(got, _whole(part, spec), check_dtype=False)
+
+
+def test_top_zones_picks_the_best_rows_and_accepts_k_zero():
+    frames = [pd.DataFrame({"quality_score": [0.5, 2.0, np.nan]}), pd.DataFrame({"quality_score": [1.0, 3.0]})]
+    assert top_zones(frames, k=2)["quality_score"].tolist() == [3.0, 2.0]
+    assert top_zones(frames, k=0).empty
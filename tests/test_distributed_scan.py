@@ -0,0 +1,61 @@
+import pandas as pd
+
+import rbr_logic
+import zone_cache
+from distributed_scan import Coordinator, Worker, open_queue
+from results_store import load_results
+
+
+def test_runs_with_other_settings_queue_their_own_units(tmp_path):
+    queue = open_queue(str(tmp_path / "queue.sqlite"))
+    ids = [str(s) for s in range(10)]
+    coordinator = Coordinator(queue)
+    assert coordinator.submit(ids, "RBR", unit_size=5, out_dir=str(tmp_path / "a"), run_date="2024-06-03") == 2
+    first = coordinator.run_id
+    assert coordinator.submit(ids, "RBR", unit_size=5, out_dir=str(tmp_path / "a"), run_date="2024-06-03") == 0
+    assert coordinator.submit(ids, "RBR", unit_size=5, out_dir=str(tmp_path / "a"), run_date="2024-06-03",
+                              body_threshold=0.5) == 2
+    assert coordinator.submit(ids, "RBR", unit_size=5, out_dir=str(tmp_path / "b"), run_date="2024-06-03") == 2
+    assert coordinator.run_id != first
+    assert queue.counts()["pending"] == 6
+
+
+def test_unit_with_a_fetch_error_is_retried_not_completed(tmp_path, monkeypatch):
+    def fetch_for(security_id, *args, **kwargs):
+        if security_id == "2":
+            raise ConnectionError("connection reset")
+        return pd.DataFrame()
+
+    monkeypatch.setattr(rbr_logic, "fetch_for", fetch_for)
+    queue = open_queue(str(tmp_path / "queue.sqlite"))
+    queue.max_attempts = 2
+    coordinator = Coordinator(queue, run_id="r")
+    coordinator.submit([str(s) for s in range(4)], "RBR", unit_size=4, out_dir=str(tmp_path / "out"))
+    worker = Worker(queue, owner="w")
+    stats = worker.run(once=True)
+    assert stats["units"] == 0
+    assert stats["fetch_errors"] == 2
+    assert stats["retried"] == 1 and stats["failed"] == 1
+    assert queue.counts("r")["failed"] == 1
+
+
+def test_securities_next_to_a_failing_one_are_still_written(tmp_path, monkeypatch, synthetic_candles):
+    def fetch_for(security_id, *args, **kwargs):
+        if security_id == "2":
+            raise ValueError("400 Bad Request: delisted")
+        return synthetic_candles(400, int(security_id))
+
+    monkeypatch.setattr(rbr_logic, "fetch_for", fetch_for)
+    monkeypatch.setattr(zone_cache._default_cache, "cache_dir", None)
+    queue = open_queue(str(tmp_path / "queue.sqlite"))
+    queue.max_attempts = 2
+    out_dir = str(tmp_path / "out")
+    Coordinator(queue, run_id="r").submit(["1", "2", "3"], "RBR", unit_size=3, out_dir=out_dir,
+                                          run_date="2024-06-03")
+    stats = Worker(queue, owner="w").run(once=True)
+    assert stats["fetch_errors"] == 2 and stats["failed"] == 1
+    written = load_results(out_dir, run_date="2024-06-03")
+    assert set(written["security_id"].astype(str)) == {"1", "3"}
+    assert len(written) == len(written.drop_duplicates())
+    failures = queue.failures("r")
+    assert len(failures) == 1 and "2" in failures[0]["error"]
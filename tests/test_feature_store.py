@@ -0,0 +1,27 @@
+import numpy as np
+
+import corporate_actions
+import feature_store
+from candle_store import CandleStore
+from corporate_actions import ActionTable, adjust_arrays, adjusted_arrays
+from feature_store import compute_features, feature_arrays
+
+
+def test_chunked_builds_match_a_whole_series_build(tmp_path, monkeypatch, synthetic_candles):
+    monkeypatch.setattr(corporate_actions, "BUILD_CHUNK_ROWS", 97)
+    monkeypatch.setattr(feature_store, "BUILD_CHUNK_ROWS", 97)
+    store = CandleStore(str(tmp_path / "candles"))
+    store.append("1", synthetic_candles(1000, 1))
+    table = ActionTable(str(tmp_path / "actions.csv"))
+    table.record("1", "2022-01-05", 0.5)
+
+    adjusted = adjusted_arrays("1", store, table)
+    expected = adjust_arrays(store.arrays("1"), table.for_security("1"))
+    for col in ("timestamp", "open", "high", "low", "close"):
+        np.testing.assert_array_equal(adjusted[col], expected[col])
+
+    feats = feature_arrays("1", store, table, candles=adjusted)
+    whole = compute_features(expected)
+    for col in feature_store.FEATURE_COLUMNS:
+        np.testing.assert_allclose(feats[col], whole[col].to_numpy(), rtol=0, atol=1e-12)
+    assert store.read_sidecar("1", feature_store.SIDECAR)["digest"] == table.digest("1")
@@ -0,0 +1,12 @@
+import monitor
+from monitor import Monitor
+
+
+def test_latency_window_is_bounded(monkeypatch):
+    monkeypatch.setattr(monitor, "LATENCY_WINDOW", 5)
+    mon = Monitor(feed=None)
+    for _ in range(12):
+        mon.process_batch([("1", 1_700_000_000, 10.0, 11.0, 9.0, 10.5)])
+    stats = mon.stats()
+    assert len(mon._latencies) == 5
+    assert stats["batches"] == 12 and stats["bars"] == 12
@@ -0,0 +1,17 @@
+from candle_store import CandleStore
+from parallel_scan import run_parallel_analysis
+from results_store import load_results
+
+
+def test_rerunning_a_parallel_scan_does_not_duplicate_rows(tmp_path, synthetic_candles):
+    store = CandleStore(str(tmp_path / "candles"))
+    ids = [str(s) for s in range(6)]
+    for sid in ids:
+        store.append(sid, synthetic_candles(600, int(sid)))
+    out_dir = str(tmp_path / "results")
+    kwargs = dict(workers=2, out_dir=out_dir, run_date="2024-06-01", store_dir=str(tmp_path / "candles"),
+                  body_threshold=0.5, wick_threshold=0.5)
+    rows = run_parallel_analysis(ids, "RBR", **kwargs)
+    assert rows > 0
+    run_parallel_analysis(ids, "RBR", **kwargs)
+    assert len(load_results(out_dir, run_date="2024-06-01")) == rows
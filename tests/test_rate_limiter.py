@@ -0,0 +1,115 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from rate_limiter import AdaptiveRateLimiter, parse_retry_after
+
+
+@pytest.fixture
+def throttling_server():
+    """Local /charts/historical that answers 429 (Retry-After: 1) above `ceiling` req/s."""
+    ceiling = 8.0
+    bucket = {"tokens": ceiling, "updated": time.time()}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0) or 0))
+            with lock:
+                now = time.time()
+                bucket["tokens"] = min(ceiling, bucket["tokens"] + (now - bucket["updated"]) * ceiling)
+                bucket["updated"] = now
+                allowed = bucket["tokens"] >= 1
+                if allowed:
+                    bucket["tokens"] -= 1
+            if allowed:
+                body = b"{}"
+                self.send_response(200)
+            else:
+                body = b'{"errorMessage": "Too many requests"}'
+                self.send_response(429)
+                self.send_header("Retry-After", "1")
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/charts/historical", ceiling
+    server.shutdown()
+    server.server_close()
+
+
+def test_acquire_paces_requests_at_the_rate():
+    limiter = AdaptiveRateLimiter(rate=40.0, max_rate=40.0)
+    started = time.time()
+    for _ in range(21):
+        limiter.acquire()
+    assert time.time() - started >= 0.45
+
+
+def test_429_pauses_callers_until_retry_after():
+    limiter = AdaptiveRateLimiter(rate=20.0)
+    limiter.acquire()
+    limiter.record(429, 0.01, retry_after=0.5)
+    assert limiter.metrics()["rate"] == pytest.approx(10.0)
+    assert limiter.reserve() >= 0.45
+
+
+def test_acquire_async_reserves_off_the_event_loop(tmp_path):
+    limiter = AdaptiveRateLimiter(rate=40.0, max_rate=40.0, state_path=str(tmp_path / "limiter.json"))
+    threads = []
+    reserve = limiter.reserve
+
+    def tracked_reserve():
+        threads.append(threading.current_thread())
+        return reserve()
+
+    limiter.reserve = tracked_reserve
+
+    async def main():
+        started = time.time()
+        await asyncio.gather(*(limiter.acquire_async() for _ in range(21)))
+        return time.time() - started
+
+    assert asyncio.run(main()) >= 0.45
+    assert threads and threading.main_thread() not in threads
+
+
+def test_learns_a_rate_under_a_throttling_server(throttling_server):
+    url, ceiling = throttling_server
+    limiter = AdaptiveRateLimiter(rate=4.0)
+    seconds = 5.0
+    stop = time.time() + seconds
+    ok = [0]
+
+    def worker():
+        with requests.Session() as session:
+            while time.time() < stop:
+                limiter.acquire()
+                started = time.time()
+                resp = session.post(url, json={})
+                limiter.record(resp.status_code, time.time() - started,
+                               parse_retry_after(resp.headers.get("Retry-After")))
+                if resp.status_code == 200:
+                    ok[0] += 1
+
+    pool = [threading.Thread(target=worker) for _ in range(6)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    m = limiter.metrics()
+    # slow start overshoots once, then the 429 backoff holds the rate near the ceiling
+    assert m["throttled"] >= 1
+    assert m["throttled"] <= 0.25 * m["requests"]
+    assert m["rate"] < 2 * ceiling
+    assert 0.4 * ceiling <= ok[0] / seconds <= 1.5 * ceiling
@@ -0,0 +1,40 @@
+import pandas as pd
+
+from results_store import load_results, write_results
+
+
+def _zones(n: int = 2) -> pd.DataFrame:
+    return pd.DataFrame({
+        "security_id": [str(100 + k) for k in range(n)],
+        "date_base": pd.date_range("2024-01-01", periods=n, tz="Asia/Kolkata"),
+        "demand_zone_low": [10.0 + k for k in range(n)],
+        "demand_zone_high": [11.0 + k for k in range(n)],
+        "buy_signal": [True] * n,
+        "invalidated": [False] * n,
+    })
+
+
+def test_rewriting_a_run_replaces_its_rows(tmp_path):
+    for _ in range(2):
+        write_results(_zones(), str(tmp_path), run_date="2024-06-01", pattern_type="RBR")
+    assert len(load_results(str(tmp_path), run_date="2024-06-01")) == 2
+
+
+def test_smaller_rewrite_leaves_no_stale_rows(tmp_path):
+    write_results(_zones(5), str(tmp_path), run_date="2024-06-01", pattern_type="RBR")
+    write_results(_zones(3), str(tmp_path), run_date="2024-06-01", pattern_type="RBR")
+    assert len(load_results(str(tmp_path), run_date="2024-06-01")) == 3
+
+
+def test_batches_with_different_basenames_add_up(tmp_path):
+    write_results(_zones(2), str(tmp_path), run_date="2024-06-01", pattern_type="RBR", basename="b1")
+    write_results(_zones(3), str(tmp_path), run_date="2024-06-01", pattern_type="RBR", basename="b2")
+    write_results(_zones(3), str(tmp_path), run_date="2024-06-01", pattern_type="RBR", basename="b2")
+    assert len(load_results(str(tmp_path), run_date="2024-06-01")) == 5
+
+
+def test_whole_run_rewrite_keeps_stems_starting_with_run(tmp_path):
+    write_results(_zones(2), str(tmp_path), run_date="2024-06-01", pattern_type="RBR", basename="run-7-unit0")
+    write_results(_zones(3), str(tmp_path), run_date="2024-06-01", pattern_type="RBR")
+    write_results(_zones(3), str(tmp_path), run_date="2024-06-01", pattern_type="RBR")
+    assert len(load_results(str(tmp_path), run_date="2024-06-01")) == 5
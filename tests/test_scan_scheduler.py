@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+
+import zone_cache
+from candle_store import CandleStore
+from results_store import load_results
+from scan_scheduler import ScanScheduler
+from work_queue import WorkQueue
+
+
+@pytest.fixture
+def scheduler(tmp_path, monkeypatch, synthetic_candles):
+    monkeypatch.setattr(zone_cache._default_cache, "cache_dir", None)
+    store = CandleStore(str(tmp_path / "candles"))
+    for sid in ("1", "2", "3"):
+        store.append(sid, synthetic_candles(400, int(sid)))
+    return ScanScheduler(["1", "2", "3"], queue=WorkQueue(str(tmp_path / "queue.sqlite")), store=store,
+                         workers=2, spec_name="RBR", results_dir=str(tmp_path / "results"), fetch=False)
+
+
+def test_drain_leaves_jobs_of_other_kinds_alone(scheduler):
+    scheduler.queue.enqueue_units({"u00000": {"security_ids": ["1"]}}, run_id="dist-x")
+    scheduler.queue.enqueue(["1", "2", "3"], run_id="daily-2024-06-03", kind="daily")
+    assert scheduler.drain() == 3
+    assert scheduler.queue.counts("dist-x")["pending"] == 1
+
+
+def test_flushing_a_batch_again_replaces_its_rows(scheduler):
+    scheduler.queue.enqueue(["1", "2", "3"], run_id="daily-2024-06-03", kind="daily")
+    scheduler.drain()
+    rows = len(load_results(scheduler.results_dir, run_date="2024-06-03"))
+    assert rows > 0
+    # a crash after the write but before complete(): the jobs run again on resume
+    scheduler.queue.enqueue(["1", "2", "3"], run_id="daily-2024-06-03", kind="daily")
+    scheduler.drain()
+    assert len(load_results(scheduler.results_dir, run_date="2024-06-03")) == rows
+
+
+def test_job_left_from_an_interrupted_run_does_not_block_the_next_day(scheduler):
+    scheduler.queue.enqueue(["1", "2", "3"], run_id="daily-2024-06-03", kind="daily")
+    scheduler.queue.claim(2, kind="daily")
+    scheduler.queue.recover()  # restart: "1" and "2" back to pending, "3" never ran
+    added = scheduler.enqueue_due(pd.Timestamp("2024-06-04 16:00", tz="Asia/Kolkata"))
+    assert added == 3
+    scheduler.drain()
+    assert scheduler.queue.counts("daily-2024-06-04")["done"] == 3
+    assert len(load_results(scheduler.results_dir, run_date="2024-06-04")) > 0
@@ -0,0 +1,27 @@
+import pandas as pd
+
+from zone_diff import ZoneDiffer
+
+
+def _run(n: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        "security_id": [str(100 + k) for k in range(n)],
+        "pattern_type": ["RBR"] * n,
+        "date_base": pd.date_range("2024-01-01", periods=n, tz="Asia/Kolkata"),
+        "zone_low": [10.0 + k for k in range(n)],
+        "zone_high": [11.0 + k for k in range(n)],
+        "buy_signal": [False] * n,
+        "invalidated": [False] * n,
+    })
+
+
+def test_second_run_on_the_same_day_keeps_the_first_change_log(tmp_path):
+    differ = ZoneDiffer("RBR", str(tmp_path))
+    first = differ.advance(_run(2), run_date="2024-06-01")
+    second = differ.advance(_run(3), run_date="2024-06-01")
+    assert len(first) == 2 and len(second) == 1
+    runs = differ.runs("2024-06-01")
+    assert len(runs) == 2
+    assert len(differ.changes(run_id=runs[0])) == 2
+    assert len(differ.changes("2024-06-01")) == 1
+    assert differ.runs("2024-06-02") == []
@@ -0,0 +1,118 @@
+"""Whole-universe detection in one kernel call.
+
+Calling find_pattern / analyze_cached once per security costs a DataFrame
+and a few Python calls per security, on top of the scan itself. Here the
+candles of all securities are laid out one after the other, as a universe
+candle file would hold them:
+
+    candles = {"timestamp", "open", "high", "low", "close"}   one array each, all securities
+    offsets = [0, n_0, n_0 + n_1, ...]                         security k: offsets[k] .. offsets[k + 1] - 1
+
+zone_arrays_ragged computes candle features and impulse / base masks once
+over all candles. It then runs the zone scan for every security in one
+kernel call (compiled with backend="numba"), and retest_arrays_ragged
+resolves every zone within its own security. No base run, zone or retest
+crosses a security boundary, so each security's rows equal a separate run.
+The result is one retests table tagged by security_id.
+
+Example:
+    >>> from universe_detect import universe_arrays, detect_universe
+    >>> candles, offsets, ids = universe_arrays(get_candle_store().securities())
+    >>> retests = detect_universe(candles, offsets, ids, "RBR", backend="numba")
+    python universe_detect.py --spec RBR --backend numba --out-csv universe.csv
+"""
+
+import argparse
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from candle_store import COLUMNS, CandleStore, get_candle_store
+from corporate_actions import adjusted_arrays
+from detector_core import SPECS, frames_from_arrays, retest_arrays_ragged, zone_arrays_ragged
+
+
+def universe_arrays(
+    security_ids: Sequence[str],
+    store: Optional[CandleStore] = None,
+    adjusted: bool = True,
+) -> Tuple[Dict[str, np.ndarray], np.ndarray, List[str]]:
+    """Concatenated candle columns, offsets and security ids of stored securities.
+
+    adjusted: read the corporate-action adjusted series (corporate_actions.py).
+    """
+    store = store or get_candle_store()
+    ids = [str(s) for s in security_ids]
+    if adjusted:
+        series = [adjusted_arrays(sid, store) for sid in ids]
+    else:
+        series = [store.arrays(sid) for sid in ids]
+    lengths = [len(a["timestamp"]) for a in series]
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    candles = {
+        col: np.concatenate([a[col] for a in series]) if series else np.empty(0, dtype=dtype)
+        for col, dtype in COLUMNS.items()
+    }
+    return candles, offsets, ids
+
+
+def detect_universe(
+    candles: Dict[str, np.ndarray],
+    offsets: np.ndarray,
+    security_ids: Sequence[str],
+    spec_name: str = "RBR",
+    max_bases: int = 4,
+    body_threshold: float = 0.65,
+    wick_threshold: float = 0.35,
+    backend: str = "python",
+) -> pd.DataFrame:
+    """Zones and retests of every security in one pass, tagged by security_id.
+
+    Parameters:
+      candles: concatenated "timestamp", "open", "high", "low", "close" arrays
+      offsets: len(security_ids) + 1 start positions (last one = total length)
+      security_ids: one id per series, in layout order
+      spec_name / max_bases / thresholds / backend: as for detect_zones
+
+    Returns:
+      the detect_retests schema of the spec plus security_id (index columns
+      such as rally2_idx are positions within the security's own series)
+    """
+    spec = SPECS[spec_name]
+    offsets = np.asarray(offsets, dtype=np.int64)
+    if len(offsets) != len(security_ids) + 1 or offsets[0] != 0 or offsets[-1] != len(candles["timestamp"]):
+        raise ValueError("offsets must have len(security_ids) + 1 entries, from 0 to the number of candles")
+    o, h, l, c = (np.asarray(candles[col], dtype=np.float64) for col in ("open", "high", "low", "close"))
+    ts = np.asarray(candles["timestamp"], dtype=np.int64)
+    zones, _ = zone_arrays_ragged(o, h, l, c, offsets, spec, max_bases, body_threshold, wick_threshold, backend)
+    m = len(zones["first_idx"])
+    if m == 0:
+        return pd.DataFrame()
+    r = retest_arrays_ragged(h, l, zones, offsets, spec, backend)
+
+    first, second, series = zones["first_idx"], zones["second_idx"], zones["series"]
+    ids = np.asarray([str(s) for s in security_ids], dtype=object)
+    dates = (ts[first + 1], ts[np.where(r["signal"], r["retest_idx"], 0)])
+    # positions within each security's own series, as a per-security run reports them
+    local = {**zones, "first_idx": first - offsets[series], "second_idx": second - offsets[series]}
+    _, out = frames_from_arrays(dates, spec, local, r)
+    out["security_id"] = ids[series]
+    return out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Detect zones across every stored security in one pass.")
+    parser.add_argument("--spec", default="RBR", choices=sorted(SPECS))
+    parser.add_argument("--backend", default="auto", choices=("python", "numba", "auto"))
+    parser.add_argument("--max-securities", type=int, default=None)
+    parser.add_argument("--raw", action="store_true", help="skip corporate-action adjustment")
+    parser.add_argument("--out-csv", default=None)
+    args = parser.parse_args()
+
+    universe = get_candle_store().securities()[:args.max_securities]
+    all_candles, all_offsets, all_ids = universe_arrays(universe, adjusted=not args.raw)
+    found = detect_universe(all_candles, all_offsets, all_ids, args.spec, backend=args.backend)
+    print(f"{len(found)} zones across {len(all_ids)} securities ({len(all_candles['timestamp'])} candles)")
+    if args.out_csv and not found.empty:
+        found.to_csv(args.out_csv, index=False)
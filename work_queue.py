@@ -0,0 +1,272 @@
+"""Persistent SQLite work queue for scan jobs.
+
+One row per (run, security) job. Jobs move pending -> running -> done
+(or failed once the attempts are exhausted). Because the state lives in
+SQLite, a scan interrupted half-way leaves its remaining jobs pending or
+running. `recover()` puts the running ones back, and the next process
+continues where the last one stopped.
+
+Lower `priority` values are claimed first. A security that already has a
+pending or running job of the same kind (scheduler tier) in the same run is
+not enqueued again, so a slow run is not stacked with a second copy of
+itself. Jobs left over from an older run do not block the security in a new
+run.
+
+Jobs can also be leased, for workers on several hosts (distributed_scan.py).
+A claim with an `owner` sets a lease expiry, and the worker extends it with
+`renew` while it works. `requeue_expired` returns the jobs of workers that
+stopped renewing to pending. Unlike `recover`, it does not touch live leases.
+Unit jobs (`enqueue_units`) carry a JSON payload, and their `security_id`
+column holds the unit key. WAL mode needs every process on one host; for a
+queue file on a shared filesystem pass journal_mode="DELETE".
+
+Example:
+    >>> from work_queue import WorkQueue
+    >>> q = WorkQueue(".cache/scan_queue.sqlite")
+    >>> q.enqueue(["21238", "1333"], run_id="daily-2024-06-01", priority=10)
+    >>> for job in q.claim(8):
+    ...     q.complete(job["id"])
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+QUEUE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "scan_queue.sqlite")
+MAX_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL,
+    kind TEXT NOT NULL DEFAULT 'scan',
+    security_id TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 10,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    enqueued_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, priority, id);
+CREATE INDEX IF NOT EXISTS jobs_run ON jobs (run_id, status);
+CREATE INDEX IF NOT EXISTS jobs_security ON jobs (security_id, kind, status);
+"""
+# columns added after the first release; older queue files are migrated on open
+LEASE_COLUMNS = {"payload": "TEXT", "lease_owner": "TEXT", "lease_expires": "REAL"}
+LEASE_SECONDS = 300.0
+
+
+class WorkQueue:
+    """SQLite-backed job queue shared by threads (and processes) on one machine."""
+
+    def __init__(self, path: str = QUEUE_PATH, max_attempts: int = MAX_ATTEMPTS, journal_mode: str = "WAL"):
+        self.path = path
+        self.max_attempts = max_attempts
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute(f"PRAGMA journal_mode={journal_mode}")
+            self._conn.executescript(SCHEMA)
+            have = {r["name"] for r in self._conn.execute("PRAGMA table_info(jobs)")}
+            for col, decl in LEASE_COLUMNS.items():
+                if col not in have:
+                    self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {col} {decl}")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _write(self, sql: str, params=()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    # ----- producing -----
+    def enqueue(self, security_ids: Iterable[str], run_id: str, priority: int = 10, kind: str = "scan") -> int:
+        """Add one job per security unless the run already has it pending/running; returns jobs added."""
+        now = time.time()
+        added = 0
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for sid in security_ids:
+                    cur = self._conn.execute(
+                        "INSERT INTO jobs (run_id, kind, security_id, priority, enqueued_at) "
+                        "SELECT ?, ?, ?, ?, ? WHERE NOT EXISTS ("
+                        "  SELECT 1 FROM jobs WHERE run_id = ? AND security_id = ? AND kind = ? "
+                        "  AND status IN ('pending', 'running'))",
+                        (run_id, kind, str(sid), int(priority), now, run_id, str(sid), kind),
+                    )
+                    added += cur.rowcount
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return added
+
+    def enqueue_units(self, units: Dict[str, dict], run_id: str, priority: int = 10, kind: str = "unit") -> int:
+        """Add one job per work unit ({unit key: JSON-able payload}) unless already queued; returns jobs added."""
+        now = time.time()
+        added = 0
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for key, payload in units.items():
+                    cur = self._conn.execute(
+                        "INSERT INTO jobs (run_id, kind, security_id, priority, enqueued_at, payload) "
+                        "SELECT ?, ?, ?, ?, ?, ? WHERE NOT EXISTS ("
+                        "  SELECT 1 FROM jobs WHERE run_id = ? AND security_id = ? AND kind = ?)",
+                        (run_id, kind, str(key), int(priority), now, json.dumps(payload), run_id, str(key), kind),
+                    )
+                    added += cur.rowcount
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return added
+
+    def has_run(self, run_id: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM jobs WHERE run_id = ? LIMIT 1", (run_id,)).fetchone() is not None
+
+    # ----- consuming -----
+    def claim(self, limit: int = 1, kind: Union[str, Sequence[str], None] = None, owner: Optional[str] = None,
+              lease_seconds: float = LEASE_SECONDS) -> List[Dict]:
+        """Atomically mark up to `limit` pending jobs running and return them (best priority first).
+
+        `kind` restricts the claim to one kind or a sequence of kinds (None: any kind).
+        With `owner`, the jobs are leased to it until now + lease_seconds
+        (see renew / requeue_expired). Payloads are decoded into job["payload"].
+        """
+        now = time.time()
+        expires = now + lease_seconds if owner is not None else None
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                sql = "SELECT * FROM jobs WHERE status = 'pending'"
+                params: list = []
+                if kind is not None:
+                    kinds = [kind] if isinstance(kind, str) else list(kind)
+                    sql += f" AND kind IN ({', '.join('?' * len(kinds))})"
+                    params.extend(kinds)
+                sql += " ORDER BY priority, id LIMIT ?"
+                params.append(int(limit))
+                rows = [dict(r) for r in self._conn.execute(sql, params).fetchall()]
+                for r in rows:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ?, "
+                        "lease_owner = ?, lease_expires = ? WHERE id = ?",
+                        (now, owner, expires, r["id"]),
+                    )
+                    r.update(status="running", attempts=r["attempts"] + 1, started_at=now,
+                             lease_owner=owner, lease_expires=expires,
+                             payload=json.loads(r["payload"]) if r["payload"] else None)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return rows
+
+    def complete(self, job_ids, owner: Optional[str] = None) -> int:
+        """Mark job(s) done; with `owner`, only jobs it still holds the lease on. Returns jobs updated."""
+        ids = [job_ids] if isinstance(job_ids, int) else list(job_ids)
+        now = time.time()
+        sql = "UPDATE jobs SET status = 'done', finished_at = ?, error = NULL, lease_expires = NULL WHERE id = ?"
+        params = [(now, i) for i in ids]
+        if owner is not None:
+            sql += " AND status = 'running' AND lease_owner = ?"
+            params = [(now, i, owner) for i in ids]
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(sql, params)
+            return self._conn.total_changes - before
+
+    def renew(self, job_ids, owner: str, lease_seconds: float = LEASE_SECONDS) -> int:
+        """Extend the leases `owner` still holds; returns how many (fewer means a lease was lost)."""
+        ids = [job_ids] if isinstance(job_ids, int) else list(job_ids)
+        expires = time.time() + lease_seconds
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "UPDATE jobs SET lease_expires = ? WHERE id = ? AND status = 'running' AND lease_owner = ?",
+                [(expires, i, owner) for i in ids],
+            )
+            return self._conn.total_changes - before
+
+    def requeue_expired(self, now: Optional[float] = None) -> int:
+        """Return running jobs whose lease expired to pending (failed after max_attempts); returns how many."""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = 'lease expired', finished_at = ?, lease_owner = NULL "
+                    "WHERE status = 'running' AND lease_expires < ? AND attempts >= ?",
+                    (now, now, self.max_attempts),
+                )
+                n = self._conn.execute(
+                    "UPDATE jobs SET status = 'pending', lease_owner = NULL, lease_expires = NULL "
+                    "WHERE status = 'running' AND lease_expires < ?",
+                    (now,),
+                ).rowcount
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return n
+
+    def fail(self, job_id: int, error: str) -> str:
+        """Record an error; the job goes back to pending until max_attempts. Returns the new status."""
+        with self._lock:
+            row = self._conn.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            status = "failed" if row is None or row["attempts"] >= self.max_attempts else "pending"
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ?, lease_owner = NULL, lease_expires = NULL "
+                "WHERE id = ?",
+                (status, str(error)[:500], time.time(), job_id),
+            )
+        return status
+
+    def recover(self) -> int:
+        """Return jobs left running by an interrupted process to pending; returns how many.
+
+        Single-host use only: leased jobs of live workers are reset too.
+        """
+        return self._write("UPDATE jobs SET status = 'pending' WHERE status = 'running'").rowcount
+
+    # ----- inspection -----
+    def counts(self, run_id: Optional[str] = None) -> Dict[str, int]:
+        sql = "SELECT status, COUNT(*) AS n FROM jobs"
+        params: tuple = ()
+        if run_id is not None:
+            sql += " WHERE run_id = ?"
+            params = (run_id,)
+        with self._lock:
+            rows = self._conn.execute(sql + " GROUP BY status", params).fetchall()
+        out = {"pending": 0, "running": 0, "done": 0, "failed": 0}
+        out.update({r["status"]: r["n"] for r in rows})
+        return out
+
+    def failures(self, run_id: Optional[str] = None) -> List[Dict]:
+        """Jobs that exhausted their attempts: id, run_id, security_id (unit key), attempts, error."""
+        sql = "SELECT id, run_id, security_id, attempts, error FROM jobs WHERE status = 'failed'"
+        params: tuple = ()
+        if run_id is not None:
+            sql += " AND run_id = ?"
+            params = (run_id,)
+        with self._lock:
+            return [dict(r) for r in self._conn.execute(sql + " ORDER BY id", params).fetchall()]
+
+    def purge(self, older_than_days: float = 7.0) -> int:
+        """Delete finished jobs older than the given age; returns how many."""
+        cutoff = time.time() - older_than_days * 86400
+        return self._write(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?", (cutoff,)
+        ).rowcount
@@ -0,0 +1,258 @@
+"""Result cache for zone detection + retest resolution.
+
+Entries are keyed by (security_id, spec, body_threshold, wick_threshold,
+max_bases) and remember a fingerprint of the candles they were computed from:
+
+  - same candles (content hash matches)      -> cached frames, no work
+  - only new bars appended (prefix matches)  -> scan resumes at the first
+    position that depended on the old end of the series, and only zones that
+    were still open (not invalidated) are re-checked, over the new bars only
+  - anything else (history revised, fewer bars, new thresholds) -> full run
+
+A bounded in-memory LRU sits in front of an on-disk pickle tier under
+.cache/zones/, so results survive app restarts and are shared with CLI scans.
+Each computed entry also updates the pattern statistics (zone_stats.py); a
+tail update only adds the change from the new bars.
+
+Example:
+    >>> from zone_cache import analyze_cached
+    >>> zones, retests = analyze_cached("21238", df, "RBR", max_bases=4)
+"""
+
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from detector_core import SPECS, candle_arrays, retest_arrays, retests_frame, zone_arrays, zones_frame
+from zone_stats import StatsStore, add_counts, get_stats_store, zone_counts
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "zones")
+MAX_MEMORY_ENTRIES = 512
+
+
+def candle_fingerprint(df: pd.DataFrame, n: Optional[int] = None) -> str:
+    """Content hash of the first `n` candles (all candles when n is None)."""
+    h = hashlib.blake2b(digest_size=16)
+    for col in ("timestamp", "open", "high", "low", "close"):
+        values = df[col].to_numpy()
+        if n is not None:
+            values = values[:n]
+        h.update(np.ascontiguousarray(values, dtype=np.int64 if col == "timestamp" else np.float64).tobytes())
+    return h.hexdigest()
+
+
+def _concat(a: Dict[str, np.ndarray], b: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    return {k: np.concatenate([a[k], b[k]]) for k in a}
+
+
+class ZoneCache:
+    """LRU memory cache + pickle disk tier for detector results."""
+
+    def __init__(self, max_entries: int = MAX_MEMORY_ENTRIES, cache_dir: Optional[str] = CACHE_DIR,
+                 stats_store: Optional[StatsStore] = None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        # statistics go to the default store for disk-backed caches, unless one is given
+        self.stats_store = stats_store
+        self._entries: "OrderedDict[tuple, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.tail_updates = 0
+        self.misses = 0
+
+    # ----- storage -----
+    def _path(self, key: tuple) -> str:
+        name = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{name}.pkl")
+
+    def _get(self, key: tuple) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._path(key), "rb") as f:
+                entry = pickle.load(f)
+        except (OSError, pickle.PickleError, EOFError, AttributeError):
+            return None
+        self._remember(key, entry)
+        return entry
+
+    def _remember(self, key: tuple, entry: dict) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _put(self, key: tuple, entry: dict) -> None:
+        self._remember(key, entry)
+        if not self.cache_dir:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._path(key)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"Could not write zone cache entry: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self.cache_dir and os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".pkl"):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits,
+                "tail_updates": self.tail_updates, "misses": self.misses}
+
+    # ----- computation -----
+    def analyze(
+        self,
+        security_id: str,
+        df: pd.DataFrame,
+        spec_name: str,
+        max_bases: int = 4,
+        body_threshold: float = 0.65,
+        wick_threshold: float = 0.35,
+        backend: str = "python",
+        scores: bool = False,
+        features: Optional[Dict[str, np.ndarray]] = None,
+    ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Zones and retests for `df`, reusing cached work where possible.
+
+        Returns (zones, retests) as detect_zones / detect_retests would; retests
+        is an empty DataFrame when there are no zones. With scores, both carry
+        the detector_core quality columns (cached separately). features:
+        precomputed per-candle columns for `df` (feature_store), if available.
+        """
+        spec = SPECS[spec_name]
+        key = (str(security_id), spec_name, float(body_threshold), float(wick_threshold), int(max_bases))
+        if scores:
+            key += ("scores",)
+        n = len(df)
+        fingerprint = candle_fingerprint(df)
+        entry = self._get(key)
+        if entry is not None and entry["fingerprint"] == fingerprint:
+            self.hits += 1
+            return entry["zones_df"], entry["retests_df"]
+
+        o, h, l, c = candle_arrays(df)
+        ts = np.asarray(df["timestamp"].to_numpy(), dtype=np.int64)
+        resumable = (
+            entry is not None
+            and not spec.drop_broken
+            and entry["n"] < n
+            and candle_fingerprint(df, entry["n"]) == entry["fingerprint"]
+        )
+        if resumable:
+            self.tail_updates += 1
+            zones, retests, resume, counts = self._extend(entry, o, h, l, c, ts, spec, max_bases, body_threshold,
+                                                          wick_threshold, backend, scores, features)
+        else:
+            self.misses += 1
+            zones, resume = zone_arrays(o, h, l, c, spec, max_bases, body_threshold, wick_threshold, backend,
+                                        scores=scores, features=features)
+            retests = retest_arrays(h, l, zones, spec, backend)
+            counts = zone_counts(zones, retests, ts)
+
+        zones_df = zones_frame(df, spec, zones) if n >= 3 else pd.DataFrame([])
+        retests_df = retests_frame(df, zones_df, spec, retests) if not zones_df.empty else pd.DataFrame()
+        self._put(key, {
+            "n": n,
+            "fingerprint": fingerprint,
+            "resume": resume,
+            "zones": zones,
+            "retests": retests,
+            "zones_df": zones_df,
+            "retests_df": retests_df,
+            "counts": counts,
+        })
+        self._record_stats(key, counts, n, int(ts[-1]) if n else None)
+        return zones_df, retests_df
+
+    def _record_stats(self, key: tuple, counts: Dict[str, int], n: int, last_timestamp: Optional[int]) -> None:
+        store = self.stats_store
+        if store is None and self.cache_dir:
+            store = get_stats_store()
+        if store is None:
+            return
+        try:
+            store.put(*key[:5], counts, n, last_timestamp)
+        except Exception as e:
+            print(f"Could not update pattern stats: {e}")
+
+    def _extend(self, entry, o, h, l, c, ts, spec, max_bases, body_threshold, wick_threshold, backend, scores=False,
+                features=None):
+        n_old = entry["n"]
+        old_zones = entry["zones"]
+        old = {k: v.copy() for k, v in entry["retests"].items()}
+
+        # zones decided before `resume` never looked past the old last bar
+        # (scores use past-only ATR, so cached zones keep theirs; freshness is set by zones_frame)
+        new_zones, resume = zone_arrays(o, h, l, c, spec, max_bases, body_threshold, wick_threshold,
+                                        backend, start=entry["resume"], scores=scores, features=features)
+
+        # zones still open at the old last bar continue on the new bars only
+        if spec.retest_order == "break_first":
+            open_ = ~(old["invalidated"] | old["signal"])
+        else:
+            open_ = ~old["invalidated"]
+        idx = np.flatnonzero(open_)
+        before = zone_counts(old_zones, entry["retests"], ts, idx)
+        if len(idx):
+            tail = {
+                "zone_low": old_zones["zone_low"][idx],
+                "zone_high": old_zones["zone_high"][idx],
+                "second_idx": np.full(len(idx), n_old - 1, dtype=np.int64),
+            }
+            upd = retest_arrays(h, l, tail, spec, backend)
+            fresh = ~old["signal"][idx] & upd["signal"]
+            old["signal"][idx[fresh]] = True
+            old["price"][idx[fresh]] = upd["price"][fresh]
+            old["retest_idx"][idx[fresh]] = upd["retest_idx"][fresh]
+            old["invalidated"][idx] |= upd["invalidated"]
+
+        new_retests = retest_arrays(h, l, new_zones, spec, backend)
+        # statistics: only the zones that were open (and the new ones) can have changed
+        counts = entry.get("counts") or zone_counts(old_zones, entry["retests"], ts)
+        counts = add_counts(add_counts(counts, before, -1), zone_counts(old_zones, old, ts, idx))
+        counts = add_counts(counts, zone_counts(new_zones, new_retests, ts))
+        return _concat(old_zones, new_zones), _concat(old, new_retests), resume, counts
+
+
+_default_cache = ZoneCache()
+
+
+def analyze_cached(
+    security_id: str,
+    df: pd.DataFrame,
+    spec_name: str,
+    max_bases: int = 4,
+    body_threshold: float = 0.65,
+    wick_threshold: float = 0.35,
+    backend: str = "python",
+    scores: bool = False,
+    features: Optional[Dict[str, np.ndarray]] = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """ZoneCache.analyze on the process-wide default cache."""
+    return _default_cache.analyze(security_id, df, spec_name, max_bases, body_threshold, wick_threshold, backend,
+                                  scores, features)
+
+
+def get_default_cache() -> ZoneCache:
+    return _default_cache
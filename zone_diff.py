@@ -0,0 +1,314 @@
+"""Run-to-run diff of detected zones, for change alerts.
+
+Every zone gets a stable identity, `zone_id`: a 64-bit hash of (security,
+pattern type, base date, zone low, zone high). A snapshot of a run is one row
+per zone with its id and state:
+
+    state = 1 * retested + 2 * invalidated        (0: still open)
+
+plus a digest per security: the row count and the XOR of the mixed
+(zone_id, state) values. Those digests are all that is read of the previous
+snapshot up front. Only securities whose digest changed are loaded (Parquet
+row groups are pruned on security_id) and hash-joined on zone_id, so the
+work beyond the digest comparison grows with the number of changes, not the
+number of zones. The change log has one row per event:
+
+    new          zone not in the previous run
+    retested     zone gained its retest signal
+    invalidated  zone got invalidated
+    removed      zone no longer reported (history revised, or a drop_broken spec)
+
+Snapshots live under results/.snapshots/<name>/ (dot-prefixed, so
+load_results skips them). Each run writes a new snapshot directory and then
+swaps a CURRENT pointer, so a crashed run leaves the previous snapshot as
+it was. Each run's change log goes to
+results/.snapshots/<name>/changes/<run id>.parquet, where the run id is
+"<run_date>-<epoch ms>-<random>" and also names the run's snapshot. A second
+run on the same day adds a log instead of overwriting the first.
+
+Example:
+    >>> from zone_diff import ZoneDiffer
+    >>> changes = ZoneDiffer("RBR").advance(final, pattern_type="RBR")
+    >>> changes[changes.change == "retested"]
+    python zone_diff.py show --name RBR
+    python zone_diff.py runs --run-date 2024-06-01
+"""
+
+import argparse
+import datetime as dt
+import json
+import os
+import shutil
+import time
+import uuid
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from results_store import RESULTS_DIR, TIMEZONE
+
+SNAPSHOT_DIR = os.path.join(RESULTS_DIR, ".snapshots")
+ROW_GROUP_SIZE = 8192
+CHANGE_KINDS = ("new", "retested", "invalidated", "removed")
+RETESTED, INVALIDATED = 1, 2
+SNAPSHOT_COLUMNS = ["security_id", "zone_id", "state", "pattern_type", "symbol_name",
+                    "date_base", "zone_low", "zone_high", "retest_date"]
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _epoch(values: pd.Series) -> np.ndarray:
+    """Dates (tz-aware, naive or epoch seconds) -> int64 epoch seconds, -1 for missing."""
+    if pd.api.types.is_integer_dtype(values):
+        return values.fillna(-1).to_numpy(dtype=np.int64)
+    stamps = pd.to_datetime(values, errors="coerce", utc=True)
+    secs = stamps.astype("datetime64[ns, UTC]").astype("int64").to_numpy() // 10**9
+    return np.where(stamps.isna().to_numpy(), -1, secs)
+
+
+def _edges(frame: pd.DataFrame):
+    low = "zone_low" if "zone_low" in frame.columns else "demand_zone_low"
+    high = "zone_high" if "zone_high" in frame.columns else "demand_zone_high"
+    return frame[low].to_numpy(dtype=np.float64), frame[high].to_numpy(dtype=np.float64)
+
+
+def _flag(frame: pd.DataFrame, columns: Iterable[str]) -> np.ndarray:
+    out = np.zeros(len(frame), dtype=bool)
+    for col in columns:
+        if col in frame.columns:
+            out |= frame[col].astype("boolean").fillna(False).to_numpy(dtype=bool)
+    return out
+
+
+def zone_ids(frame: pd.DataFrame, pattern_type: Optional[str] = None) -> np.ndarray:
+    """Stable int64 zone ids for aggregated results (security_id, pattern_type, date_base, edges).
+
+    pattern_type: used when `frame` has no pattern_type column.
+    """
+    low, high = _edges(frame)
+    pattern = frame["pattern_type"].astype(str).to_numpy() if "pattern_type" in frame.columns \
+        else np.full(len(frame), pattern_type, dtype=object)
+    key = pd.DataFrame({
+        "security_id": frame["security_id"].astype(str).to_numpy(dtype=object),
+        "pattern_type": pattern.astype(object),
+        "date_base": _epoch(frame["date_base"]),
+        # rounded so ids survive float formatting round trips (CSV copies)
+        "low": np.round(low, 6),
+        "high": np.round(high, 6),
+    })
+    return pd.util.hash_pandas_object(key, index=False).to_numpy().view(np.int64)
+
+
+# ---------- Snapshots ----------
+class Snapshot:
+    """Zone ids and states of one run, with a digest per security.
+
+    Either held in memory (`frame`) or read lazily from a snapshot directory.
+    """
+
+    def __init__(self, digests: Dict[str, str], frame: Optional[pd.DataFrame] = None, path: Optional[str] = None):
+        self.digests = digests
+        self._frame = frame
+        self._path = path
+
+    @classmethod
+    def from_results(cls, results: pd.DataFrame, pattern_type: Optional[str] = None) -> "Snapshot":
+        """Snapshot of aggregated results (run_analysis / load_results rows)."""
+        if results is None or results.empty:
+            return cls({}, pd.DataFrame({col: [] for col in SNAPSHOT_COLUMNS}))
+        low, high = _edges(results)
+        state = RETESTED * _flag(results, ("buy_signal", "sell_signal")) + INVALIDATED * _flag(results, ("invalidated",))
+        frame = pd.DataFrame({
+            "security_id": results["security_id"].astype(str).to_numpy(dtype=object),
+            "zone_id": zone_ids(results, pattern_type),
+            "state": state.astype(np.int8),
+            "pattern_type": results["pattern_type"].astype(str).to_numpy(dtype=object)
+            if "pattern_type" in results.columns else pattern_type,
+            "symbol_name": results["symbol_name"].astype(object).to_numpy()
+            if "symbol_name" in results.columns else None,
+            "date_base": _epoch(results["date_base"]),
+            "zone_low": low,
+            "zone_high": high,
+            "retest_date": _epoch(results["retest_date"]) if "retest_date" in results.columns else -1,
+        })
+        frame = frame.sort_values(["security_id", "zone_id"], kind="stable", ignore_index=True)
+        return cls(_digests(frame), frame)
+
+    def rows(self, security_ids: Iterable[str]) -> pd.DataFrame:
+        """Snapshot rows of the given securities only."""
+        ids = sorted(set(security_ids))
+        if self._frame is not None:
+            return self._frame[self._frame["security_id"].isin(ids)]
+        if not ids or self._path is None:
+            return pd.DataFrame({col: [] for col in SNAPSHOT_COLUMNS})
+        table = pq.read_table(os.path.join(self._path, "zones.parquet"), filters=[("security_id", "in", ids)])
+        return table.to_pandas()
+
+    def save(self, path: str) -> None:
+        os.makedirs(path, exist_ok=True)
+        table = pa.Table.from_pandas(self._frame, preserve_index=False)
+        pq.write_table(table, os.path.join(path, "zones.parquet"), row_group_size=ROW_GROUP_SIZE)
+        with open(os.path.join(path, "digests.json"), "w") as f:
+            json.dump(self.digests, f)
+
+
+def _digests(frame: pd.DataFrame) -> Dict[str, str]:
+    """{security_id: "count:xor"} over (zone_id, state); frame sorted by security_id."""
+    if frame.empty:
+        return {}
+    sid = frame["security_id"].to_numpy(dtype=object)
+    mixed = frame["zone_id"].to_numpy().view(np.uint64) * _MIX + frame["state"].to_numpy().astype(np.uint64)
+    starts = np.concatenate([[0], np.flatnonzero(sid[1:] != sid[:-1]) + 1])
+    xors = np.bitwise_xor.reduceat(mixed, starts)
+    counts = np.diff(np.append(starts, len(sid)))
+    return {sid[s]: f"{n}:{x:016x}" for s, n, x in zip(starts, counts, xors)}
+
+
+def changed_securities(previous: Snapshot, current: Snapshot) -> list:
+    """Securities whose zones or zone states differ between the snapshots."""
+    prev, cur = previous.digests, current.digests
+    return sorted({s for s, d in cur.items() if prev.get(s) != d} | (prev.keys() - cur.keys()))
+
+
+def diff_snapshots(previous: Snapshot, current: Snapshot) -> pd.DataFrame:
+    """Change log between two snapshots: one row per (zone, event), see CHANGE_KINDS."""
+    changed = changed_securities(previous, current)
+    old = previous.rows(changed)
+    new = current.rows(changed)
+    joined = new.merge(old[["zone_id", "state"]], on="zone_id", how="outer", suffixes=("", "_prev"), indicator=True)
+    is_new = (joined["_merge"] == "left_only").to_numpy()
+    both = (joined["_merge"] == "both").to_numpy()
+    state = joined["state"].fillna(0).to_numpy(dtype=np.int64)
+    prev_state = joined["state_prev"].fillna(0).to_numpy(dtype=np.int64)
+    gained = state & ~prev_state
+
+    parts = [joined[is_new].assign(change="new"),
+             joined[both & (gained & RETESTED > 0)].assign(change="retested"),
+             joined[both & (gained & INVALIDATED > 0)].assign(change="invalidated")]
+    removed_ids = joined.loc[(joined["_merge"] == "right_only").to_numpy(), "zone_id"]
+    if len(removed_ids):
+        parts.append(old[old["zone_id"].isin(removed_ids)].assign(change="removed"))
+    changes = pd.concat(parts, ignore_index=True)
+    if changes.empty:
+        return pd.DataFrame({col: [] for col in ["change"] + SNAPSHOT_COLUMNS})
+    changes = changes[["change"] + SNAPSHOT_COLUMNS]
+    changes["state"] = changes["state"].astype(np.int8)
+    return changes.sort_values(["security_id", "change"], kind="stable", ignore_index=True)
+
+
+def dated_changes(changes: pd.DataFrame) -> pd.DataFrame:
+    """Change log with epoch-second dates turned back into tz-aware timestamps."""
+    out = changes.copy()
+    for col in ("date_base", "retest_date"):
+        secs = out[col].astype("int64")
+        out[col] = pd.to_datetime(secs.where(secs >= 0), unit="s", utc=True).dt.tz_convert(TIMEZONE)
+    return out
+
+
+# ---------- Run history ----------
+class ZoneDiffer:
+    """Keeps the latest snapshot of a named run series and diffs each new run against it."""
+
+    def __init__(self, name: str = "RBR", root: str = SNAPSHOT_DIR):
+        self.name = name
+        self.dir = os.path.join(root, name)
+
+    def _pointer(self) -> str:
+        return os.path.join(self.dir, "CURRENT")
+
+    def previous(self) -> Snapshot:
+        """The last saved snapshot (empty when there is none); only its digests are read."""
+        try:
+            with open(self._pointer()) as f:
+                path = os.path.join(self.dir, f.read().strip())
+            with open(os.path.join(path, "digests.json")) as f:
+                return Snapshot(json.load(f), path=path)
+        except (OSError, ValueError):
+            return Snapshot({})
+
+    def advance(self, results: pd.DataFrame, pattern_type: Optional[str] = None,
+                run_date: Optional[str] = None) -> pd.DataFrame:
+        """Diff `results` against the previous run, save the change log and the new snapshot.
+
+        Parameters:
+          results: aggregated zones/retests of the run (one row per zone)
+          pattern_type: used when `results` has no pattern_type column
+          run_date: prefix of the run id that names the change log and snapshot (default: today)
+
+        Returns:
+          the change log (see diff_snapshots)
+        """
+        previous = self.previous()
+        current = Snapshot.from_results(results, pattern_type)
+        changes = diff_snapshots(previous, current)
+        run_date = run_date or dt.date.today().isoformat()
+        run_id = f"{run_date}-{time.time_ns() // 1_000_000:013d}-{uuid.uuid4().hex[:8]}"
+
+        os.makedirs(os.path.join(self.dir, "changes"), exist_ok=True)
+        changes.to_parquet(os.path.join(self.dir, "changes", f"{run_id}.parquet"), index=False)
+        name = f"snap-{run_id}"
+        current.save(os.path.join(self.dir, name))
+        tmp = f"{self._pointer()}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(name)
+        os.replace(tmp, self._pointer())
+        for entry in os.listdir(self.dir):
+            if entry.startswith("snap-") and entry != name:
+                shutil.rmtree(os.path.join(self.dir, entry), ignore_errors=True)
+        return changes
+
+    def runs(self, run_date: Optional[str] = None) -> list:
+        """Run ids with a saved change log, oldest first (only those of run_date when given)."""
+        folder = os.path.join(self.dir, "changes")
+        names = os.listdir(folder) if os.path.isdir(folder) else []
+        # logs of older releases are named by run date alone and sort first within their day
+        ids = sorted(n[:-len(".parquet")] for n in names if n.endswith(".parquet"))
+        return [i for i in ids if run_date is None or i[:10] == run_date]
+
+    def changes(self, run_date: Optional[str] = None, run_id: Optional[str] = None) -> pd.DataFrame:
+        """A saved change log, with parsed dates.
+
+        run_id picks one run; otherwise the latest run of run_date (or the latest run overall).
+        """
+        if run_id is None:
+            ids = self.runs(run_date)
+            if not ids:
+                return pd.DataFrame()
+            run_id = ids[-1]
+        path = os.path.join(self.dir, "changes", f"{run_id}.parquet")
+        return dated_changes(pd.read_parquet(path)) if os.path.exists(path) else pd.DataFrame()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Zone changes between scan runs.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    show = sub.add_parser("show", help="print a saved change log")
+    show.add_argument("--run-date", default=None)
+    show.add_argument("--run-id", default=None, help="one run (see the runs command)")
+    runs = sub.add_parser("runs", help="list the run ids with a saved change log")
+    runs.add_argument("--run-date", default=None)
+    diff = sub.add_parser("diff", help="diff a stored results run against the last snapshot")
+    diff.add_argument("run_date")
+    diff.add_argument("--results-dir", default=RESULTS_DIR)
+    for p in (show, runs, diff):
+        p.add_argument("--name", default="RBR", help="run series (snapshot) name")
+        p.add_argument("--snapshot-dir", default=SNAPSHOT_DIR)
+    args = parser.parse_args()
+
+    differ = ZoneDiffer(args.name, args.snapshot_dir)
+    if args.command == "diff":
+        from results_store import load_results
+
+        run = load_results(args.results_dir, run_date=args.run_date, pattern_type=args.name, parse_dates=False)
+        log = dated_changes(differ.advance(run, pattern_type=args.name, run_date=args.run_date))
+    elif args.command == "runs":
+        log = None
+        print("\n".join(differ.runs(args.run_date)) or "No runs")
+    else:
+        log = differ.changes(args.run_date, args.run_id)
+    if log is not None:
+        print(log["change"].value_counts().to_dict() if not log.empty else "No changes")
+        if not log.empty:
+            print(log.to_string(index=False, max_rows=50))
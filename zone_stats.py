@@ -0,0 +1,160 @@
+"""Materialized per-symbol pattern statistics.
+
+Historical retest hit rate, invalidation rate and average time to retest
+used to be recomputed by re-running the retest scan over the whole history
+and aggregating in pandas. Instead, one SQLite row per (security, pattern
+spec, threshold set) holds the running counts:
+
+    zones, retested, invalidated, open, retest_bars, retest_seconds
+
+zone_cache keeps them up to date as it works. A full run writes counts over
+all zones. A tail update adds the new zones, plus the change in the zones
+that were still open at the old last bar; zones that were already resolved
+cannot change, so they are not revisited. Reading a symbol's statistics is
+one primary-key lookup.
+
+Example:
+    >>> from zone_stats import get_stats_store
+    >>> get_stats_store().get("21238", "RBR_LEGACY", 0.65, 0.35, 4)
+    {'zones': 41, 'retested': 30, 'hit_rate': 0.73, 'avg_retest_days': 18.2, ...}
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+STATS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "zone_stats.sqlite")
+COUNT_COLUMNS = ("zones", "retested", "invalidated", "open", "retest_bars", "retest_seconds")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pattern_stats (
+    security_id TEXT NOT NULL,
+    spec TEXT NOT NULL,
+    body_threshold REAL NOT NULL,
+    wick_threshold REAL NOT NULL,
+    max_bases INTEGER NOT NULL,
+    zones INTEGER NOT NULL,
+    retested INTEGER NOT NULL,
+    invalidated INTEGER NOT NULL,
+    open INTEGER NOT NULL,
+    retest_bars INTEGER NOT NULL,
+    retest_seconds INTEGER NOT NULL,
+    bars INTEGER NOT NULL,
+    last_timestamp INTEGER,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (security_id, spec, body_threshold, wick_threshold, max_bases)
+);
+"""
+
+
+def zone_counts(zones: Dict[str, np.ndarray], retests: Dict[str, np.ndarray], timestamps: np.ndarray,
+                idx: Optional[np.ndarray] = None) -> Dict[str, int]:
+    """Counts over zone / retest arrays (only the zones at `idx`, when given)."""
+    second, signal, invalid = zones["second_idx"], retests["signal"], retests["invalidated"]
+    retest_idx = retests["retest_idx"]
+    if idx is not None:
+        second, signal, invalid, retest_idx = second[idx], signal[idx], invalid[idx], retest_idx[idx]
+    hit_second, hit_retest = second[signal], retest_idx[signal]
+    return {
+        "zones": int(len(second)),
+        "retested": int(signal.sum()),
+        "invalidated": int(invalid.sum()),
+        "open": int((~signal & ~invalid).sum()),
+        "retest_bars": int((hit_retest - hit_second).sum()),
+        "retest_seconds": int((timestamps[hit_retest] - timestamps[hit_second]).sum()),
+    }
+
+
+def add_counts(a: Dict[str, int], b: Dict[str, int], sign: int = 1) -> Dict[str, int]:
+    return {k: a[k] + sign * b[k] for k in COUNT_COLUMNS}
+
+
+def derived(counts: Dict[str, int]) -> Dict[str, Optional[float]]:
+    """Rates and averages from raw counts (None when there is nothing to divide by)."""
+    zones, retested = counts["zones"], counts["retested"]
+    return {
+        "hit_rate": retested / zones if zones else None,
+        "invalidation_rate": counts["invalidated"] / zones if zones else None,
+        "avg_retest_bars": counts["retest_bars"] / retested if retested else None,
+        "avg_retest_days": counts["retest_seconds"] / retested / 86400 if retested else None,
+    }
+
+
+class StatsStore:
+    """SQLite table of pattern statistics, one row per (security, spec, thresholds)."""
+
+    def __init__(self, path: str = STATS_PATH):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+
+    @staticmethod
+    def _key(security_id, spec_name, body_threshold, wick_threshold, max_bases) -> tuple:
+        return str(security_id), spec_name, float(body_threshold), float(wick_threshold), int(max_bases)
+
+    def put(self, security_id: str, spec_name: str, body_threshold: float, wick_threshold: float, max_bases: int,
+            counts: Dict[str, int], bars: int, last_timestamp: Optional[int] = None) -> None:
+        """Store the counts for a key (absolute values, so rewriting the same state is harmless)."""
+        row = self._key(security_id, spec_name, body_threshold, wick_threshold, max_bases)
+        row += tuple(int(counts[k]) for k in COUNT_COLUMNS) + (int(bars), last_timestamp, time.time())
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO pattern_stats VALUES ({', '.join('?' * len(row))})", row)
+
+    def get(self, security_id: str, spec_name: str, body_threshold: float = 0.65, wick_threshold: float = 0.35,
+            max_bases: int = 4) -> Optional[dict]:
+        """Counts plus hit_rate / invalidation_rate / avg_retest_bars / avg_retest_days, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM pattern_stats WHERE security_id = ? AND spec = ? AND body_threshold = ?"
+                " AND wick_threshold = ? AND max_bases = ?",
+                self._key(security_id, spec_name, body_threshold, wick_threshold, max_bases)).fetchone()
+        if row is None:
+            return None
+        out = dict(row)
+        out.update(derived(out))
+        return out
+
+    def for_security(self, security_id: str) -> List[dict]:
+        """All stored rows for a security (every spec and threshold set)."""
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM pattern_stats WHERE security_id = ? ORDER BY spec",
+                                      (str(security_id),)).fetchall()
+        return [{**dict(r), **derived(dict(r))} for r in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_store: Optional[StatsStore] = None
+_store_lock = threading.Lock()
+
+
+def get_stats_store() -> StatsStore:
+    """Process-wide StatsStore on the default path."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = StatsStore()
+        return _store
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Show stored pattern statistics for a security.")
+    parser.add_argument("security_id")
+    args = parser.parse_args()
+    for stats in get_stats_store().for_security(args.security_id):
+        print(stats)